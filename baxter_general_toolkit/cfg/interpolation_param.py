@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+Dynamic reconfigure parameter shared by the joint trajectory action
+server configs, which import it from beside them
+"""
+
+from dynamic_reconfigure.parameter_generator_catkin import str_t
+
+# 'server' and source_code.INTERPOLATION_MODES, with their descriptions
+MODES = (
+    ('server', "Interpolation mode the server was started with"),
+    ('bezier', "C2 Bezier spline through all trajectory points"),
+    ('cubic_hermite', "Cubic segments through the supplied velocities"),
+    ('linear', "Straight segments, for points at the control rate"),
+    ('auto', "Linear or cubic Hermite for dense points, else Bezier"),
+)
+
+
+def add_interpolation(gen):
+    """
+    Adds the interpolation mode parameter, overriding the mode the
+    server was started with
+
+    @param gen: ParameterGenerator of the config
+    """
+    interpolation = gen.enum(
+        [gen.const(mode, str_t, mode, description)
+         for (mode, description) in MODES],
+        "Interpolation of the trajectory points")
+    gen.add(
+        'interpolation', str_t, 0,
+        "Interpolation of the trajectory points",
+        'server', edit_method=interpolation,
+    )
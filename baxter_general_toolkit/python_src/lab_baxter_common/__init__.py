@@ -1,3 +1,3 @@
-import camera_toolkit
-import general_toolkit
-import traj_playback
\ No newline at end of file
+# Subpackages are imported on use, e.g.
+# from lab_baxter_common.general_toolkit import solve_IK, so that the ROS
+# free modules of traj_playback import without a ROS workspace
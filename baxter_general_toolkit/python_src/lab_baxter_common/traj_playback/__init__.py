@@ -1,4 +1,10 @@
-from .playback import (
-    record,
-    playback
-)
\ No newline at end of file
+try:
+    from .playback import (
+        record,
+        playback,
+        warm_cache,
+    )
+except ImportError:
+    # Without baxter_interface and rospkg only the modules that do not
+    # talk to the robot are importable, e.g. bezier, retime and waypoints
+    pass
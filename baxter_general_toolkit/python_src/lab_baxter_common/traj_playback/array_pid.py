@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+try:
+    from rospy import get_time
+except ImportError:
+    # Outside of ROS, e.g. in the unit tests, on the wall clock
+    from time import time as get_time
+
+
+class ArrayPID(object):
+    def __init__(self, kp=0.0, ki=0.0, kd=0.0):
+        """
+        PID controller over a vector of joints, updated in one numpy step
+
+        Follows the discrete form of baxter_control.PID: the integral term
+        accumulates error * dt and the derivative term is the error
+        difference over dt, taken from a previous error of zero on the
+        first update after initialize().
+
+        @param kp: proportional gains, scalar or one per joint
+        @param ki: integral gains, scalar or one per joint
+        @param kd: derivative gains, scalar or one per joint
+        """
+        self.set_gains(kp, ki, kd)
+        self.initialize()
+
+    def set_gains(self, kp, ki, kd):
+        """
+        Sets the gains of all joints
+
+        @param kp: proportional gains, scalar or one per joint
+        @param ki: integral gains, scalar or one per joint
+        @param kd: derivative gains, scalar or one per joint
+        """
+        self._kp = np.asarray(kp, dtype=float)
+        self._ki = np.asarray(ki, dtype=float)
+        self._kd = np.asarray(kd, dtype=float)
+
+    def initialize(self):
+        """
+        Clears the integral and derivative state, e.g. at the start of a goal
+        """
+        self._prev_time = get_time()
+        self._prev_err = 0.0
+        self._ci = 0.0
+
+    def compute_output(self, error):
+        """
+        Computes the control output of all joints
+
+        @param error: current error of each joint, copied so the caller
+                      may refill its buffer for the next update
+        @return: numpy array of outputs, one per joint
+        """
+        cur_time = get_time()
+        dt = cur_time - self._prev_time
+        error = np.array(error, dtype=float)
+        self._ci = self._ci + error * dt
+        if dt > 0.0:
+            cd = (error - self._prev_err) / dt
+        else:
+            cd = 0.0
+        self._prev_time = cur_time
+        self._prev_err = error
+        return self._kp * error + self._ki * self._ci + self._kd * cd
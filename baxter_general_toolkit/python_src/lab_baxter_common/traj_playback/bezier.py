@@ -81,9 +81,50 @@ ax.set_zlabel("Z")
 ax.legend(["Bezier Curve", "Control Points"], loc=2)
 plt.show()
 """
+import bisect
+from copy import copy
+
 import numpy as np
 
 
+def _solve_tridiagonal(lower, diag, upper, rhs):
+    """
+    Internal convenience function for solving a tridiagonal
+    system with the Thomas algorithm. Every column of rhs is
+    eliminated in the same pass. No pivoting is performed, so
+    the system should be diagonally dominant, which holds for
+    the de Boor systems built below.
+
+    params:
+        lower: sub-diagonal, lower[0] is unused
+            numpy.array of size n
+        diag: main diagonal
+            numpy.array of size n
+        upper: super-diagonal, upper[n-1] is unused
+            numpy.array of size n
+        rhs: right hand side, one column per dimension
+            numpy.array of size n by k
+
+    returns:
+        solution: numpy.array of size n by k
+    """
+    n = len(diag)
+    c_prime = np.zeros(n)
+    solution = np.array(rhs, dtype=float)
+    c_prime[0] = upper[0] / diag[0]
+    solution[0] /= diag[0]
+    # Forward elimination
+    for i in range(1, n):
+        denom = diag[i] - lower[i]*c_prime[i-1]
+        c_prime[i] = upper[i] / denom
+        solution[i] -= lower[i]*solution[i-1]
+        solution[i] /= denom
+    # Back substitution
+    for i in range(n-2, -1, -1):
+        solution[i] -= c_prime[i]*solution[i+1]
+    return solution
+
+
 def de_boor_control_pts(points_array, d0=None,
                         dN=None, natural=True):
     """
@@ -115,58 +156,52 @@ def de_boor_control_pts(points_array, d0=None,
     # so it is only necessary to find N+1 pts, dpts_(0) to to dpts_(N)
     (rows, k) = np.shape(points_array)
     N = rows - 1  # minus 1 because list includes x_(0)
-    # Compute A matrix
-    if natural:
-        if N > 2:
-            A = np.zeros((N-1, N-1))
-            A[np.ix_([0], [0, 1])] = [4, 1]
-            A[np.ix_([N-2], [N-3, N-2])] = [1, 4]
+    d_pts = np.zeros((N+3, k))
+    if N > 2:
+        # The A matrix is tridiagonal, so only its three bands are stored
+        # and every column is solved at once in O(N)
+        lower = np.ones(N-1)
+        diag = np.full(N-1, 4.0)
+        upper = np.ones(N-1)
+        x = 6.0*points_array[1:N, :]
+        # Compute start / end conditions
+        if natural:
+            x[0, :] -= points_array[0, :]
         else:
-            A = 4.0
-    else:
-        if N > 2:
-            A = np.zeros((N-1, N-1))
-            A[np.ix_([0], [0, 1])] = [3.5, 1]
-            A[np.ix_([N-2], [N-3, N-2])] = [1, 3.5]
+            diag[0] = 3.5
+            x[0, :] -= 1.5*d0[0, :]
+        if natural:
+            x[N-2, :] -= points_array[-1, :]
         else:
-            A = 3.5
-    for i in range(1, N-2):
-        A[np.ix_([i], [i-1, i, i+1])] = [1, 4, 1]
-    # Construct de Boor Control Points from A matrix
-    d_pts = np.zeros((N+3, k))
-    for col in range(0, k):
-        x = np.zeros((max(N-1, 1), 1))
-        if N > 2:
+            diag[N-2] = 3.5
+            x[N-2, :] -= 1.5*dN[0, :]
+        # Solve bezier interpolation
+        d_pts[2:N+1, :] = _solve_tridiagonal(lower, diag, upper, x)
+    else:
+        A = 4.0 if natural else 3.5
+        for col in range(0, k):
+            x = np.zeros((1, 1))
             # Compute start / end conditions
             if natural:
-                x[N-2, 0] = 6*points_array[-2, col] - points_array[-1, col]
                 x[0, 0] = 6*points_array[1, col] - points_array[0, col]
             else:
-                x[N-2, 0] = 6*points_array[-2, col] - 1.5*dN[0, col]
                 x[0, 0] = 6*points_array[1, col] - 1.5*d0[0, col]
-            x[range(1, N-3+1), 0] = 6*points_array[range(2, N-2+1), col]
             # Solve bezier interpolation
-            d_pts[2:N+1, col] = np.linalg.solve(A, x).T
-        else:
-            # Compute start / end conditions
-            if natural:
-                x[0, 0] = 6*points_array[1, col] - points_array[0, col]
-            else:
-                x[0, 0] = 6*points_array[1, col] - 1.5*d0[col]
-            # Solve bezier interpolation
-            d_pts[2, col] = x / A
+            d_pts[2, col] = x[0, 0] / A
     # Store off start and end positions
     d_pts[0, :] = points_array[0, :]
     d_pts[-1, :] = points_array[-1, :]
     # Compute the second to last de Boor point based on end conditions
+    one_third = (1.0/3.0)
+    two_thirds = (2.0/3.0)
     if natural:
-        one_third = (1.0/3.0)
-        two_thirds = (2.0/3.0)
         d_pts[1, :] = (two_thirds)*points_array[0, :] + (one_third)*d_pts[2, :]
+    else:
+        d_pts[1, :] = d0
+    if natural:
         d_pts[N+1, :] = ((one_third)*d_pts[-3, :] +
                          (two_thirds)*points_array[-1, :])
     else:
-        d_pts[1, :] = d0
         d_pts[N+1, :] = dN
     return d_pts
 
@@ -201,45 +236,187 @@ def bezier_coefficients(points_array, d_pts):
     (rows, k) = np.shape(points_array)
     N = rows - 1  # N minus 1 because points array includes x_0
     b_coeffs = np.zeros(shape=(k, N, 4))
-    for i in range(0, N):
-        points_array_i = i+1
-        d_pts_i = i + 2
-        if i == 0:
-            for axis_pos in range(0, k):
-                b_coeffs[axis_pos, i, 0] = points_array[points_array_i - 1,
-                                                        axis_pos]
-                b_coeffs[axis_pos, i, 1] = d_pts[d_pts_i - 1, axis_pos]
-                b_coeffs[axis_pos, i, 2] = (0.5 * d_pts[d_pts_i - 1, axis_pos]
-                                            + 0.5 * d_pts[d_pts_i, axis_pos])
-                b_coeffs[axis_pos, i, 3] = points_array[points_array_i,
-                                                        axis_pos]
-        elif i == N-1:
-            for axis_pos in range(0, k):
-                b_coeffs[axis_pos, i, 0] = points_array[points_array_i - 1,
-                                                        axis_pos]
-                b_coeffs[axis_pos, i, 1] = (0.5 * d_pts[d_pts_i - 1, axis_pos]
-                                            + 0.5 * d_pts[d_pts_i, axis_pos])
-                b_coeffs[axis_pos, i, 2] = d_pts[d_pts_i, axis_pos]
-                b_coeffs[axis_pos, i, 3] = points_array[points_array_i,
-                                                        axis_pos]
-        else:
-            for axis_pos in range(0, k):
-                b_coeffs[axis_pos, i, 0] = points_array[points_array_i - 1,
-                                                        axis_pos]
-                b_coeffs[axis_pos, i, 1] = (2.0/3.0 * d_pts[d_pts_i - 1,
-                                                            axis_pos]
-                                            + 1.0/3.0 * d_pts[d_pts_i,
-                                                              axis_pos])
-                b_coeffs[axis_pos, i, 2] = (1.0/3.0 * d_pts[d_pts_i - 1,
-                                                            axis_pos]
-                                            + 2.0/3.0 * d_pts[d_pts_i,
-                                                              axis_pos])
-                b_coeffs[axis_pos, i, 3] = points_array[points_array_i,
-                                                        axis_pos]
+    # Segment i runs from points_array[i] to points_array[i+1]
+    b_coeffs[:, :, 0] = points_array[0:N, :].T
+    b_coeffs[:, :, 3] = points_array[1:N+1, :].T
+    # Interior segments i use de Boor points i+1 and i+2
+    d_start = d_pts[1:N+1, :].T
+    d_end = d_pts[2:N+2, :].T
+    b_coeffs[:, :, 1] = 2.0/3.0 * d_start + 1.0/3.0 * d_end
+    b_coeffs[:, :, 2] = 1.0/3.0 * d_start + 2.0/3.0 * d_end
+    # The last and first segments border the end condition points
+    b_coeffs[:, N-1, 1] = 0.5 * d_pts[N, :] + 0.5 * d_pts[N+1, :]
+    b_coeffs[:, N-1, 2] = d_pts[N+1, :]
+    b_coeffs[:, 0, 1] = d_pts[1, :]
+    b_coeffs[:, 0, 2] = 0.5 * d_pts[1, :] + 0.5 * d_pts[2, :]
+    return b_coeffs
+
 
+def linear_coefficients(points_array):
+    """
+    Bezier coefficients of straight segments between the
+    user-supplied control points, without any solve. Velocities
+    jump at every point, which only stays smooth for points as
+    dense as the control rate.
+
+    params:
+        points_array: array of user-supplied control points
+            numpy.array of size N+1 by k
+
+    returns:
+        b_coeffs: k-dimensional array of 4 Bezier coefficients
+            for every segment
+            numpy.array of size k by N by 4
+    """
+    points_array = np.asarray(points_array, dtype=float)
+    start = points_array[:-1].T
+    step = (points_array[1:] - points_array[:-1]).T
+    b_coeffs = np.empty(step.shape + (4,))
+    b_coeffs[:, :, 0] = start
+    b_coeffs[:, :, 1] = start + step / 3.0
+    b_coeffs[:, :, 2] = start + 2.0 / 3.0 * step
+    b_coeffs[:, :, 3] = start + step
+    return b_coeffs
+
+
+def hermite_tangents(points_array, pnt_times):
+    """
+    Estimates the time derivative at every control point from
+    its neighbours, weighting the slopes of the two adjacent
+    segments by the duration of the other one. The end points
+    take the slope of their only segment.
+
+    params:
+        points_array: array of user-supplied control points
+            numpy.array of size N+1 by k
+        pnt_times: time of every control point, non-decreasing
+            sequence of size N+1
+
+    returns:
+        tangents: numpy.array of size N+1 by k
+    """
+    points_array = np.asarray(points_array, dtype=float)
+    durations = np.diff(np.asarray(pnt_times, dtype=float))[:, np.newaxis]
+    steps = np.diff(points_array, axis=0)
+    # Points at the same time contribute a zero slope
+    slopes = np.where(durations > 0.0, steps /
+                      np.where(durations > 0.0, durations, 1.0), 0.0)
+    tangents = np.empty_like(points_array)
+    tangents[0] = slopes[0]
+    tangents[-1] = slopes[-1]
+    span = durations[:-1] + durations[1:]
+    tangents[1:-1] = np.where(
+        span > 0.0,
+        (durations[1:] * slopes[:-1] + durations[:-1] * slopes[1:]) /
+        np.where(span > 0.0, span, 1.0), 0.0)
+    return tangents
+
+
+def hermite_coefficients(points_array, pnt_times, tangents):
+    """
+    Bezier coefficients of the cubic Hermite segments through
+    the user-supplied control points with the given time
+    derivatives. Every segment only depends on its two end
+    points, so unlike de_boor_control_pts there is no system to
+    solve, and the curve is C1 instead of C2.
+
+    params:
+        points_array: array of user-supplied control points
+            numpy.array of size N+1 by k
+        pnt_times: time of every control point, non-decreasing
+            sequence of size N+1
+        tangents: time derivative at every control point, e.g.
+            supplied velocities or hermite_tangents
+            numpy.array of size N+1 by k
+
+    returns:
+        b_coeffs: k-dimensional array of 4 Bezier coefficients
+            for every segment
+            numpy.array of size k by N by 4
+    """
+    points_array = np.asarray(points_array, dtype=float)
+    tangents = np.asarray(tangents, dtype=float)
+    # A cubic Bezier segment leaves b0 with 3 * (b1 - b0) and reaches
+    # b3 with 3 * (b3 - b2) per segment duration
+    durations = np.diff(np.asarray(pnt_times, dtype=float))[:, np.newaxis]
+    b_coeffs = np.empty((points_array.shape[1], len(durations), 4))
+    b_coeffs[:, :, 0] = points_array[:-1].T
+    b_coeffs[:, :, 1] = (points_array[:-1] +
+                         durations / 3.0 * tangents[:-1]).T
+    b_coeffs[:, :, 2] = (points_array[1:] -
+                         durations / 3.0 * tangents[1:]).T
+    b_coeffs[:, :, 3] = points_array[1:].T
     return b_coeffs
 
 
+def extend_bezier_coefficients(points_array, d_pts, b_coeffs, new_points,
+                               window=12):
+    """
+    Appends control points to a spline fit with natural end
+    conditions, re-solving only a bounded tail of the de Boor
+    points instead of the whole system.
+
+    The de Boor points more than window points before the old end
+    are kept. The influence of the new end condition decays by a
+    factor of about 0.27 per point, so the kept points differ from a
+    full refit by roughly 0.27^window. To keep C2 continuity where
+    the kept and re-solved de Boor points meet, that one control
+    point is placed on the spline through its neighbouring de Boor
+    points instead of exactly on the user-supplied point.
+
+    params:
+        points_array: array of user-supplied control points
+            numpy.array of size N by k
+        d_pts: de Boor control points of points_array
+            numpy.array of size N+2 by k
+        b_coeffs: Bezier coefficients of points_array
+            numpy.array of size k by N-1 by 4
+        new_points: control points to append
+            numpy.array of size M by k
+        window: number of existing de Boor points to re-solve
+            int > 0
+
+    returns:
+        (points_array, d_pts, b_coeffs) for the extended spline
+            numpy.arrays of size N+M by k, N+M+2 by k and
+            k by N+M-1 by 4
+    """
+    new_points = np.asarray(new_points, dtype=float)
+    points_array = np.vstack((points_array, new_points))
+    N = len(points_array) - 1 - len(new_points)
+    N2 = len(points_array) - 1
+    # First de Boor point to re-solve, counted like the rows of the
+    # natural A matrix
+    s = N - window
+    if s < 3 or len(new_points) == 0:
+        # Too short to keep a prefix, refit everything
+        d_pts = de_boor_control_pts(points_array)
+        return (points_array, d_pts,
+                bezier_coefficients(points_array, d_pts))
+    # Unknowns d_pts[s+1:N2+1], with d_pts[s] and the new end point
+    # moved to the right hand side
+    n = N2 - s
+    x = 6.0*points_array[s:N2, :]
+    x[0, :] -= d_pts[s, :]
+    x[n-1, :] -= points_array[-1, :]
+    d_tail = _solve_tridiagonal(np.ones(n), np.full(n, 4.0), np.ones(n), x)
+    d_pts = np.vstack((d_pts[:s+1, :], d_tail,
+                       (1.0/3.0)*d_tail[-1:, :]
+                       + (2.0/3.0)*points_array[-1:, :],
+                       points_array[-1:, :]))
+    # Coefficients from segment s-1 on depend on re-solved points
+    b_tail = bezier_coefficients(points_array[s-1:, :], d_pts[s-1:, :])
+    # ...but segment s-1 is interior, not the first of the spline
+    b_tail[:, 0, 1] = 2.0/3.0 * d_pts[s, :] + 1.0/3.0 * d_pts[s+1, :]
+    b_tail[:, 0, 2] = 1.0/3.0 * d_pts[s, :] + 2.0/3.0 * d_pts[s+1, :]
+    b_coeffs = np.concatenate((b_coeffs[:, :s-1, :], b_tail), axis=1)
+    # Join point on the C2 spline through the neighbouring de Boor points
+    join = (d_pts[s-1, :] + 4.0*d_pts[s, :] + d_pts[s+1, :]) / 6.0
+    b_coeffs[:, s-2, 3] = join
+    b_coeffs[:, s-1, 0] = join
+    return (points_array, d_pts, b_coeffs)
+
+
 def _cubic_spline_point(b_coeff, t):
     """
     Internal convenience function for calculating
@@ -255,17 +432,21 @@ def _cubic_spline_point(b_coeff, t):
             b_coeff is a numpy array of size k by 4
             k is the number of dimensions for each
             coefficient
+            Any number of leading axes may be used, as
+            long as the last axis holds b0...b3
         t: percentage of time elapsed for this segment
             0 <= int <= 1.0
+            may also be a numpy.array that broadcasts
+            against b_coeff[..., 0]
 
     returns:
         current position in k dimensions
             numpy.array of size 1 by k
     """
-    return (pow((1-t), 3)*b_coeff[:, 0] +
-            3*pow((1-t), 2)*t*b_coeff[:, 1] +
-            3*(1-t)*pow(t, 2)*b_coeff[:, 2] +
-            pow(t, 3)*b_coeff[:, 3]
+    return (pow((1-t), 3)*b_coeff[..., 0] +
+            3*pow((1-t), 2)*t*b_coeff[..., 1] +
+            3*(1-t)*pow(t, 2)*b_coeff[..., 2] +
+            pow(t, 3)*b_coeff[..., 3]
             )
 
 
@@ -280,6 +461,9 @@ def bezier_point(b_coeffs, b_index, t):
             numpy.array of size k by N by 4
             N is the number of control points
             k is the number of dimensions for each point
+            Extra leading axes are evaluated together, e.g.
+            a numpy.array of size j by k by N by 4 for j
+            joints returns a j by k array in one call
         b_index: index position out between two of
             the N b_coeffs for this point in time
             int
@@ -292,13 +476,13 @@ def bezier_point(b_coeffs, b_index, t):
             numpy.array of size 1 by k
     """
     if b_index <= 0:
-        b_point = b_coeffs[:, 0, 0]
-    elif b_index > b_coeffs.shape[1]:
-        b_point = b_coeffs[:, -1, -1]
+        b_point = b_coeffs[..., 0, 0]
+    elif b_index > b_coeffs.shape[-2]:
+        b_point = b_coeffs[..., -1, -1]
     else:
         t = 0.0 if t < 0.0 else t
         t = 1.0 if t > 1.0 else t
-        b_coeff_set = b_coeffs[:, b_index-1, range(4)]
+        b_coeff_set = b_coeffs[..., b_index-1, :]
         b_point = _cubic_spline_point(b_coeff_set, t)
     return b_point
 
@@ -331,11 +515,415 @@ def bezier_curve(b_coeffs, num_intervals):
     b_curve = np.zeros((num_bpts*num_intervals+1, num_axes))
     # Copy out initial point
     b_curve[0, :] = b_coeffs[:, 0, 0]
-    for current_bpt in range(num_bpts):
-            b_coeff_set = b_coeffs[:, current_bpt, range(4)]
-            for iteration, t in enumerate(np.linspace(interval, 1,
-                                                      num_intervals)):
-                b_curve[(current_bpt *
-                         num_intervals +
-                         iteration+1), :] = _cubic_spline_point(b_coeff_set, t)
+    # Evaluate every segment at every interval at once:
+    # segments x intervals x axes
+    t = np.linspace(interval, 1, num_intervals).reshape(1, num_intervals, 1)
+    b_coeff_sets = np.transpose(b_coeffs, (1, 0, 2))[:, np.newaxis, :, :]
+    b_curve[1:, :] = _cubic_spline_point(b_coeff_sets, t).reshape(
+        num_bpts*num_intervals, num_axes)
     return b_curve
+
+
+def bezier_points(b_coeffs, b_indices, t):
+    """
+    Finds the k values that describe the position along
+    the bezier curve for an arbitrary set of samples at once.
+    Each sample follows the same conventions as bezier_point.
+
+    params:
+        b_coeffs: k-dimensional array
+            for every control point with 4 Bezier coefficients
+            numpy.array of size k by N by 4
+            N is the number of control points
+            k is the number of dimensions for each point
+        b_indices: index position out between two of
+            the N b_coeffs for each sample
+            numpy.array of ints of size M
+        t: percentage of time that has passed between
+            the two control points for each sample
+            numpy.array of size M, 0 <= t <= 1.0
+
+    returns:
+        b_points: positions in k dimensions for every sample
+            numpy.array of size M by k
+    """
+    num_bpts = b_coeffs.shape[1]
+    b_indices = np.asarray(b_indices, dtype=int)
+    t = np.clip(np.asarray(t, dtype=float), 0.0, 1.0)
+    # Samples before the first or past the last coefficient
+    # hold the start or end position
+    t = np.where(b_indices <= 0, 0.0, t)
+    t = np.where(b_indices > num_bpts, 1.0, t)
+    segments = np.clip(b_indices - 1, 0, num_bpts - 1)
+    b_coeff_sets = np.transpose(b_coeffs[:, segments, :], (1, 0, 2))
+    return _cubic_spline_point(b_coeff_sets, t[:, np.newaxis])
+
+
+class CompiledSpline(object):
+    """
+    A Bezier spline converted once into power-basis polynomials,
+    so that it can be evaluated repeatedly at arbitrary times
+    without re-deriving the Bernstein terms.
+
+    Each segment is stored as a3*u^3 + a2*u^2 + a1*u + a0, where u
+    is the percentage of time elapsed for that segment, and is
+    evaluated with Horner's rule. Times before the first point or
+    past the last point hold the start or end position, matching
+    bezier_point.
+
+    The first and second time derivatives are available analytically
+    through the order argument. The spline is only C2 in u, so when
+    neighbouring segments have different durations the derivatives
+    with respect to time step at the shared control point.
+    """
+    def __init__(self, b_coeffs, pnt_times):
+        """
+        params:
+            b_coeffs: array of 4 Bezier coefficients for every
+                segment, with any number of leading axes
+                numpy.array of size ... by N by 4
+                N is the number of segments
+            pnt_times: time of every control point
+                list or numpy.array of size N+1
+        """
+        b_coeffs = np.asarray(b_coeffs, dtype=float)
+        self._shape = b_coeffs.shape[:-2]
+        num_segments = b_coeffs.shape[-2]
+        # segments x values x 4, with the segment axis first so that
+        # a single segment is one contiguous block
+        b = np.rollaxis(b_coeffs, b_coeffs.ndim-2, 0).reshape(
+            num_segments, -1, 4)
+        (b0, b1, b2, b3) = (b[:, :, 0], b[:, :, 1], b[:, :, 2], b[:, :, 3])
+        (a3, a2, a1, a0) = (b3 - b0 + 3*(b1 - b2),
+                            3*(b0 - 2*b1 + b2),
+                            3*(b1 - b0),
+                            b0)
+        times = np.asarray(pnt_times, dtype=float)
+        durations = np.diff(times)
+        self._starts = np.ascontiguousarray(times[:-1])
+        # Repeated times produce empty segments that hold their start
+        self._inv_durations = np.where(
+            durations > 0.0, 1.0 / np.where(durations > 0.0, durations, 1.0),
+            0.0)
+        # Power-basis coefficients of the position, velocity and
+        # acceleration, highest order first for Horner's rule. The
+        # derivatives are scaled from u to time per segment.
+        inv_h = self._inv_durations[:, np.newaxis]
+        self._coeffs = [
+            np.array([a3, a2, a1, a0]),
+            np.array([3*a3, 2*a2, a1]) * inv_h,
+            np.array([6*a3, 2*a2]) * inv_h**2,
+        ]
+        self._coeffs = [np.ascontiguousarray(np.transpose(c, (1, 0, 2)))
+                        for c in self._coeffs]
+        self._start_list = self._starts.tolist()
+        self._inv_duration_list = self._inv_durations.tolist()
+        self._num_segments = num_segments
+        self._start_time = times[0]
+        self._end_time = times[-1]
+
+    @property
+    def shape(self):
+        """Shape of the value returned for a single time"""
+        return self._shape
+
+    @property
+    def start_time(self):
+        """Time of the first control point"""
+        return self._start_time
+
+    @property
+    def end_time(self):
+        """Time of the last control point"""
+        return self._end_time
+
+    @property
+    def nbytes(self):
+        """Memory held by the compiled coefficients"""
+        return (sum(c.nbytes for c in self._coeffs) + self._starts.nbytes
+                + self._inv_durations.nbytes)
+
+    def evaluate(self, time, order=0):
+        """
+        Evaluates the spline at a single time.
+
+        params:
+            time: time at which to evaluate the spline
+                float
+            order: 0 for the value, 1 for the first and 2 for
+                the second derivative with respect to time
+                int
+
+        returns:
+            values of the spline at the given time
+                numpy.array of size ... (the leading axes of b_coeffs)
+        """
+        if order and (time < self._start_time or time > self._end_time):
+            # Held start and end positions are stationary
+            return np.zeros(self._shape)
+        # Scalar lookups on plain lists are much cheaper than numpy calls
+        segment = bisect.bisect(self._start_list, time) - 1
+        segment = min(max(segment, 0), self._num_segments - 1)
+        u = ((time - self._start_list[segment])
+             * self._inv_duration_list[segment])
+        u = min(max(u, 0.0), 1.0)
+        c = self._coeffs[order][segment]
+        if order == 0:
+            value = ((c[0]*u + c[1])*u + c[2])*u + c[3]
+        elif order == 1:
+            value = (c[0]*u + c[1])*u + c[2]
+        else:
+            value = c[0]*u + c[1]
+        return value.reshape(self._shape)
+
+    def evaluate_many(self, times, order=0):
+        """
+        Evaluates the spline at many times in one call.
+
+        params:
+            times: times at which to evaluate the spline
+                numpy.array of size M
+            order: 0 for the value, 1 for the first and 2 for
+                the second derivative with respect to time
+                int
+
+        returns:
+            values of the spline at every time
+                numpy.array of size M by ... (the leading axes of b_coeffs)
+        """
+        times = np.asarray(times, dtype=float)
+        segments = np.clip(np.searchsorted(self._starts, times, side='right')
+                           - 1, 0, self._num_segments - 1)
+        u = np.clip((times - self._starts[segments])
+                    * self._inv_durations[segments], 0.0, 1.0)
+        u = u[:, np.newaxis]
+        c = self._coeffs[order][segments]
+        values = c[:, 0]
+        for i in range(1, c.shape[1]):
+            values = values*u + c[:, i]
+        if order:
+            # Held start and end positions are stationary
+            values[(times < self._start_time) | (times > self._end_time)] = 0.0
+        return values.reshape((len(times),) + self._shape)
+
+    def scaled(self, time_scale, value_scale=1.0):
+        """
+        Returns the spline stretched in time and scaled in value,
+        without refitting it. The derivatives scale accordingly.
+
+        params:
+            time_scale: factor applied to every control point time
+                float > 0
+            value_scale: factor applied to the values, broadcast
+                against the leading axes of b_coeffs
+                float or numpy.array
+
+        returns:
+            the scaled spline
+                CompiledSpline
+        """
+        value_scale = (np.ones(self._shape) * value_scale).reshape(-1)
+        spline = copy(self)
+        spline._coeffs = [c * (value_scale / time_scale**order)
+                          for (order, c) in enumerate(self._coeffs)]
+        spline._starts = self._starts * time_scale
+        spline._inv_durations = self._inv_durations / time_scale
+        spline._start_list = spline._starts.tolist()
+        spline._inv_duration_list = spline._inv_durations.tolist()
+        spline._start_time = self._start_time * time_scale
+        spline._end_time = self._end_time * time_scale
+        return spline
+
+
+class SampledSpline(object):
+    """
+    A spline sampled once at a fixed rate into a dense table, so that
+    evaluating it is an index lookup and a linear interpolation
+    between two rows, independent of the number of control points.
+
+    Offers the same evaluate interface as CompiledSpline for the
+    orders that were sampled.
+    """
+    def __init__(self, spline, rate, orders=(0,)):
+        """
+        params:
+            spline: the spline to sample
+                CompiledSpline
+            rate: number of samples per second
+                float > 0
+            orders: derivative orders to sample, see
+                CompiledSpline.evaluate
+                sequence of int
+        """
+        self._rate = float(rate)
+        self._start_time = spline.start_time
+        self._end_time = spline.end_time
+        self._shape = spline.shape
+        # Sample up to the first sample at or past the end time
+        num_samples = int(np.ceil(
+            (self._end_time - self._start_time) * self._rate)) + 1
+        times = self._start_time + np.arange(num_samples) / self._rate
+        self._last_row = num_samples - 1
+        self._tables = dict((order, spline.evaluate_many(times, order))
+                            for order in orders)
+
+    @property
+    def shape(self):
+        """Shape of the value returned for a single time"""
+        return self._shape
+
+    @property
+    def start_time(self):
+        """Time of the first control point"""
+        return self._start_time
+
+    @property
+    def end_time(self):
+        """Time of the last control point"""
+        return self._end_time
+
+    @property
+    def nbytes(self):
+        """Memory held by the sample tables"""
+        return sum(table.nbytes for table in self._tables.values())
+
+    def evaluate(self, time, order=0):
+        """
+        Interpolates the sampled spline at a single time.
+
+        params:
+            time: time at which to evaluate the spline
+                float
+            order: derivative order, must be one of the sampled orders
+                int
+
+        returns:
+            values of the spline at the given time
+                numpy.array of size ... (the leading axes of b_coeffs)
+        """
+        if order and (time < self._start_time or time > self._end_time):
+            # Held start and end positions are stationary
+            return np.zeros(self._shape)
+        table = self._tables[order]
+        row = (time - self._start_time) * self._rate
+        if row <= 0.0:
+            return table[0]
+        if row >= self._last_row:
+            return table[-1]
+        idx = int(row)
+        fraction = row - idx
+        return table[idx] + fraction * (table[idx+1] - table[idx])
+
+
+class SplicedSpline(object):
+    """
+    Splines joined in time, each one evaluated from the time it takes
+    over until the next one does. Neither spline is refit or copied,
+    so a long spline is continued by another one in constant time.
+
+    Offers the same evaluate interface as CompiledSpline, for the
+    orders all of the joined splines support.
+    """
+    def __init__(self, splines, switch_times, offsets):
+        """
+        params:
+            splines: the joined splines, all of the same shape
+                list of CompiledSpline, SampledSpline or SplicedSpline
+            switch_times: time at which each spline after the first
+                takes over
+                non-decreasing list of size len(splines)-1
+            offsets: time at which the time of each spline starts
+                list of size len(splines)
+        """
+        self._splines = list(splines)
+        self._switch_times = list(switch_times)
+        self._offsets = list(offsets)
+        self._shape = self._splines[0].shape
+
+    @property
+    def shape(self):
+        """Shape of the value returned for a single time"""
+        return self._shape
+
+    @property
+    def start_time(self):
+        """Time of the first control point"""
+        return self._splines[0].start_time + self._offsets[0]
+
+    @property
+    def end_time(self):
+        """Time of the last control point"""
+        return self._splines[-1].end_time + self._offsets[-1]
+
+    @property
+    def nbytes(self):
+        """Memory held by the joined splines"""
+        return sum(spline.nbytes for spline in self._splines)
+
+    def evaluate(self, time, order=0):
+        """
+        Evaluates the spline that is in charge at a single time.
+
+        params:
+            time: time at which to evaluate the spline
+                float
+            order: derivative order, see CompiledSpline.evaluate
+                int
+
+        returns:
+            values of the spline at the given time
+                numpy.array of size ... (the leading axes of b_coeffs)
+        """
+        idx = bisect.bisect(self._switch_times, time)
+        return self._splines[idx].evaluate(time - self._offsets[idx], order)
+
+    def evaluate_many(self, times, order=0):
+        """
+        Evaluates the splines in charge at many times in one call.
+
+        params:
+            times: times at which to evaluate the spline
+                numpy.array of size M
+            order: derivative order, see CompiledSpline.evaluate
+                int
+
+        returns:
+            values of the spline at every time
+                numpy.array of size M by ... (the leading axes of b_coeffs)
+        """
+        times = np.asarray(times, dtype=float)
+        pieces = np.searchsorted(self._switch_times, times, side='right')
+        values = np.empty((len(times),) + self._shape)
+        for idx in np.unique(pieces):
+            at = pieces == idx
+            values[at] = self._splines[idx].evaluate_many(
+                times[at] - self._offsets[idx], order)
+        return values
+
+
+def splice_splines(spline, time, tail, offset=0.0):
+    """
+    Continues a spline with another one from a given time on. Splices
+    stay flat, pieces of a SplicedSpline that would only be in charge
+    after time are dropped.
+
+    params:
+        spline: the spline in charge until time
+            CompiledSpline, SampledSpline or SplicedSpline
+        time: time from which tail is in charge
+            float
+        tail: the continuing spline
+            CompiledSpline, SampledSpline or SplicedSpline
+        offset: time at which the time of tail starts
+            float
+
+    returns:
+        the joined spline
+            SplicedSpline
+    """
+    if isinstance(spline, SplicedSpline):
+        keep = bisect.bisect(spline._switch_times, time) + 1
+        return SplicedSpline(spline._splines[:keep] + [tail],
+                             spline._switch_times[:keep-1] + [time],
+                             spline._offsets[:keep] + [offset])
+    return SplicedSpline([spline, tail], [time], [0.0, offset])
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import threading
+
+
+class TrajectoryPlan(object):
+    def __init__(self, goal):
+        """
+        A goal validated and fit ahead of its execution
+
+        @param goal: FollowJointTrajectoryGoal the plan was prepared from
+        """
+        self.goal = goal
+        self.joint_names = goal.trajectory.joint_names
+        self.trajectory_points = []
+        self.dimensions_dict = None
+        self.fit_dimensions = None
+        self.spline = None
+        self.cmd_spline = None
+        # Interpolation mode the spline was fit with
+        self.interpolation = None
+        # Set when the goal cannot be executed, the plan is unusable
+        self.error = None
+        # The first point is the limb position at preparation time
+        self.from_current_position = False
+        # Seconds spent preparing the plan
+        self.latency = 0.0
+
+
+class GoalPreparer(object):
+    def __init__(self, prepare, on_ready=None):
+        """
+        Prepares goals on a worker thread, so a new goal can be fit
+        while the control thread keeps executing the current one.
+        Only the most recently submitted goal is kept.
+
+        @param prepare: function taking a goal and returning its
+                        TrajectoryPlan
+        @param on_ready: called without arguments when a plan is ready
+        """
+        self._prepare = prepare
+        self._on_ready = on_ready
+        self._lock = threading.Lock()
+        self._goal = None
+        self._plan = None
+        self._done = threading.Event()
+
+    def submit(self, goal):
+        """
+        Starts preparing goal, unless it is already being prepared
+
+        @param goal: FollowJointTrajectoryGoal to prepare
+        """
+        with self._lock:
+            if goal is self._goal:
+                return
+            self._goal = goal
+            self._plan = None
+            self._done = threading.Event()
+            done = self._done
+        worker = threading.Thread(target=self._run, args=(goal, done))
+        worker.daemon = True
+        worker.start()
+
+    def ready(self, goal):
+        """
+        @return True if the plan of goal is prepared
+        """
+        with self._lock:
+            return goal is self._goal and self._done.is_set()
+
+    def take(self, goal):
+        """
+        Waits for the plan of goal, preparing it first if needed
+
+        @param goal: FollowJointTrajectoryGoal to execute
+        @return TrajectoryPlan of goal
+        """
+        self.submit(goal)
+        with self._lock:
+            done = self._done
+        done.wait()
+        with self._lock:
+            plan = self._plan
+            self._goal = None
+            self._plan = None
+        return plan
+
+    def _run(self, goal, done):
+        plan = self._prepare(goal)
+        with self._lock:
+            if goal is not self._goal:
+                return
+            self._plan = plan
+            done.set()
+        if self._on_ready is not None:
+            self._on_ready()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import rospy
+from sim_limb import (
+    SimulatedLimb,
+    SimulatedEnable,
+    SimulatedDigitalIO,
+    LocalActionServer,
+    LocalPublisher,
+    LocalSubscriber,
+    LocalService,
+)
+
+
+class BaxterBackend(object):
+    def __init__(self, limb):
+        """
+        Robot interfaces and ROS endpoints of a JointTrajectoryActionServer
+        on the robot or in the Gazebo simulator. baxter_interface and
+        actionlib are only imported here, so that SimulatedBackend works
+        without them.
+
+        @param limb: limb name, 'left' or 'right'
+        """
+        import baxter_interface
+        self.limb = baxter_interface.Limb(limb)
+        self.enable = baxter_interface.RobotEnable()
+        self.cuff = baxter_interface.DigitalIO('%s_lower_cuff' % (limb,))
+
+    def action_server(self, ns, action_spec, execute_cb, goal_cb=None):
+        import actionlib
+        if goal_cb is None:
+            return actionlib.SimpleActionServer(ns, action_spec,
+                                                execute_cb=execute_cb,
+                                                auto_start=False)
+
+        class NotifyingActionServer(actionlib.SimpleActionServer):
+            # A SimpleActionServer with an execute callback only exposes
+            # new goals by polling, this one also reports each goal once
+            # it is queued
+            def internal_goal_callback(self, goal):
+                actionlib.SimpleActionServer.internal_goal_callback(self,
+                                                                    goal)
+                goal_cb()
+
+        return NotifyingActionServer(ns, action_spec, execute_cb=execute_cb,
+                                     auto_start=False)
+
+    def publisher(self, topic, msg_type, **kwargs):
+        return rospy.Publisher(topic, msg_type, **kwargs)
+
+    def subscriber(self, topic, msg_type, callback, **kwargs):
+        return rospy.Subscriber(topic, msg_type, callback, **kwargs)
+
+    def service(self, name, srv_type, handler):
+        return rospy.Service(name, srv_type, handler)
+
+    def set_param(self, name, value):
+        rospy.set_param(name, value)
+
+
+class SimulatedBackend(object):
+    def __init__(self, limb, lag=0.05, noise=0.0, start=None, seed=None):
+        """
+        In-process robot interfaces and ROS endpoints, so that a
+        JointTrajectoryActionServer runs without a robot, ROS master,
+        baxter_interface or actionlib. rospy and the message and config
+        modules of a built workspace are still needed.
+        Action servers, publishers, subscribers and services are kept by
+        name for the caller to drive and inspect.
+
+        @param limb: limb name, 'left' or 'right'
+        @param lag: time constant of the simulated joints in seconds
+        @param noise: standard deviation of the measured joint angles in
+                      radians
+        @param start: initial joint angles, zeros by default
+        @param seed: seed of the measurement noise
+        """
+        self.limb = SimulatedLimb(limb, lag, noise, start, seed)
+        self.enable = SimulatedEnable()
+        self.cuff = SimulatedDigitalIO('%s_lower_cuff' % (limb,))
+        self.action_servers = dict()
+        self.publishers = dict()
+        self.subscribers = dict()
+        self.services = dict()
+        self.params = dict()
+
+    def action_server(self, ns, action_spec, execute_cb, goal_cb=None):
+        self.action_servers[ns] = LocalActionServer(execute_cb, goal_cb)
+        return self.action_servers[ns]
+
+    def publisher(self, topic, msg_type, **kwargs):
+        self.publishers[topic] = LocalPublisher(topic)
+        return self.publishers[topic]
+
+    def subscriber(self, topic, msg_type, callback, **kwargs):
+        self.subscribers[topic] = LocalSubscriber(topic, callback)
+        return self.subscribers[topic]
+
+    def service(self, name, srv_type, handler):
+        self.services[name] = LocalService(name, handler)
+        return self.services[name]
+
+    def set_param(self, name, value):
+        self.params[name] = value
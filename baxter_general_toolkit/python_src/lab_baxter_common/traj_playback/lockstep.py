@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import threading
+import rospy
+from scheduler import DeadlineScheduler
+
+
+class LockstepDriver(object):
+    def __init__(self, enable, rate=100.0, deadline_scheduler=False):
+        """
+        Runs the goals of several JointTrajectoryActionServers from one
+        control thread. Every tick polls the robot enable state once and
+        then steps each active goal, so both arms are commanded in the
+        same cycle and stay phase aligned. The thread sleeps while no
+        goal is active.
+
+        @param enable: robot enable interface of the servers' backend,
+                       e.g. BaxterBackend.enable
+        @param rate: control rate in Hz
+        @param deadline_scheduler: pace ticks with a DeadlineScheduler
+                                   instead of rospy.Rate
+        """
+        self._rate = rate
+        self.scheduler = (DeadlineScheduler(rate)
+                          if deadline_scheduler else None)
+        self._enable = enable
+        self.enabled = self._enable.state().enabled
+        self._cond = threading.Condition()
+        self._pending = []
+        self._active = []
+        self._alive = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def execute(self, steps):
+        """
+        Queues a goal for the control thread and blocks until it is done
+
+        @param steps: generator running one control tick per iteration
+        """
+        done = threading.Event()
+        with self._cond:
+            self._pending.append((steps, done))
+            self._cond.notify()
+        # Wait in slices so the calling thread still sees shutdown
+        while not done.wait(1.0):
+            if not self._alive or rospy.is_shutdown():
+                return
+
+    def stop(self):
+        with self._cond:
+            self._alive = False
+            self._cond.notify()
+
+    def _run(self):
+        control_rate = None
+        while self._alive and not rospy.is_shutdown():
+            with self._cond:
+                if not self._active and not self._pending:
+                    # Restart pacing when the next goal arrives
+                    control_rate = None
+                    self._cond.wait()
+                self._active.extend(self._pending)
+                del self._pending[:]
+            if not self._active:
+                continue
+            if control_rate is None:
+                if self.scheduler is not None:
+                    control_rate = self.scheduler
+                    control_rate.reset()
+                else:
+                    control_rate = rospy.Rate(self._rate)
+            # One combined command cycle for all limbs
+            self.enabled = self._enable.state().enabled
+            for entry in list(self._active):
+                steps, done = entry
+                try:
+                    next(steps)
+                except StopIteration:
+                    self._active.remove(entry)
+                    done.set()
+                except Exception as ex:
+                    rospy.logerr("Lockstep trajectory execution failed "
+                                 "with error \"%s: %s\"" %
+                                 (type(ex).__name__, ex))
+                    self._active.remove(entry)
+                    done.set()
+            control_rate.sleep()
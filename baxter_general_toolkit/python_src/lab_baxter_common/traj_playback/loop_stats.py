@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import bisect
+
+
+class LoopStats(object):
+    # Sections of a control tick that are timed separately
+    SECTIONS = ('spline', 'command', 'feedback')
+    # Tick period histogram bin edges, as multiples of the nominal period
+    BIN_EDGES = (0.5, 0.9, 1.1, 1.5, 2.0, 3.0)
+    # A tick later than this many nominal periods missed its deadline
+    MISSED_FACTOR = 1.5
+
+    def __init__(self, rate):
+        """
+        Timing statistics of a fixed rate control loop
+
+        @param rate: nominal loop rate in Hz
+        """
+        self._period = 1.0 / rate
+        self._edges = [edge * self._period for edge in self.BIN_EDGES]
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all statistics, e.g. at the start of a goal
+        """
+        self.ticks = 0
+        self.missed = 0
+        self.worst_latency = 0.0
+        self.worst_compute = 0.0
+        self.histogram = [0] * (len(self._edges) + 1)
+        self.compute = dict((section, 0.0) for section in self.SECTIONS)
+        self._first_tick = None
+        self._last_tick = None
+        self._tick_compute = 0.0
+
+    def tick(self, now):
+        """
+        Records the start of a control tick
+
+        @param now: start time of the tick in seconds
+        """
+        if self._last_tick is None:
+            self._first_tick = now
+        else:
+            period = now - self._last_tick
+            self.histogram[bisect.bisect(self._edges, period)] += 1
+            self.worst_latency = max(self.worst_latency, period - self._period)
+            if period > self.MISSED_FACTOR * self._period:
+                self.missed += 1
+        self.worst_compute = max(self.worst_compute, self._tick_compute)
+        self._tick_compute = 0.0
+        self._last_tick = now
+        self.ticks += 1
+
+    def add(self, section, duration):
+        """
+        Adds compute time spent in one section of the current tick
+
+        @param section: one of SECTIONS
+        @param duration: time spent in seconds
+        """
+        self.compute[section] += duration
+        self._tick_compute += duration
+
+    def summary(self):
+        """
+        @return summary: dictionary of the statistics, times in ms
+        """
+        worst_compute = max(self.worst_compute, self._tick_compute)
+        elapsed = 0.0
+        if self._last_tick is not None:
+            elapsed = self._last_tick - self._first_tick
+        summary = {
+            'ticks': self.ticks,
+            'realized_rate': (self.ticks - 1) / elapsed if elapsed > 0 else 0.0,
+            'missed_deadlines': self.missed,
+            'worst_latency_ms': 1000.0 * self.worst_latency,
+            'worst_compute_ms': 1000.0 * worst_compute,
+        }
+        for section in self.SECTIONS:
+            summary['mean_%s_ms' % (section,)] = (
+                1000.0 * self.compute[section] / self.ticks
+                if self.ticks else 0.0)
+        labels = (['<%.1f' % (self.BIN_EDGES[0],)] +
+                  ['%.1f-%.1f' % edges for edges in
+                   zip(self.BIN_EDGES[:-1], self.BIN_EDGES[1:])] +
+                  ['>%.1f' % (self.BIN_EDGES[-1],)])
+        for label, count in zip(labels, self.histogram):
+            summary['period_x%s' % (label,)] = count
+        return summary
+
+    def format_summary(self):
+        """
+        @return text: one line summary for the log
+        """
+        return ("%(ticks)d ticks at %(realized_rate).1f Hz, "
+                "%(missed_deadlines)d missed deadlines, "
+                "worst latency %(worst_latency_ms).2f ms, "
+                "worst compute %(worst_compute_ms).2f ms, "
+                "mean spline/command/feedback "
+                "%(mean_spline_ms).3f/%(mean_command_ms).3f/"
+                "%(mean_feedback_ms).3f ms" % self.summary())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+# Bumped whenever the cached arrays change meaning, older caches are rebuilt
+_CACHE_VERSION = 1
+# The logger rospy.logwarn writes to, so warnings reach rosout in a node
+# while the parse and its cache work without rospy
+_logger = logging.getLogger('rosout')
+
+
+def read_csv(filename):
+    """
+    Reads a recorded file into one array, converting all rows at once
+    unless a cell is not a number
+
+    @param filename: input filename
+
+    @return header: column names of the first line
+    @return values: rows x columns array of the recorded values
+    @return valid: rows x columns booleans, False where a cell is
+                   blank, not a number or missing from a short row
+    """
+    with open(filename, 'r') as f:
+        header = f.readline().rstrip().split(',')
+        rows = [line.rstrip().split(',') for line in f]
+    width = len(header)
+    try:
+        values = np.array(rows, dtype=float).reshape(len(rows), -1)
+    except ValueError:
+        #ragged rows or cells that are not numbers
+        values = None
+    if values is not None and values.shape[1] >= width:
+        #cells past the header are ignored
+        values = values[:, :width]
+        return (header, values, np.ones(values.shape, dtype=bool))
+    #convert cell by cell, leaving the invalid ones out
+    values = np.zeros((len(rows), width))
+    valid = np.zeros((len(rows), width), dtype=bool)
+    for row, cells in enumerate(rows):
+        for col, cell in enumerate(cells[:width]):
+            try:
+                values[row, col] = float(cell)
+            except ValueError:
+                continue
+            valid[row, col] = True
+    return (header, values, valid)
+
+
+def cache_path(filename):
+    """
+    @return path: hidden .npz file beside filename holding its parse
+    """
+    (directory, name) = os.path.split(filename)
+    return os.path.join(directory, '.' + name + '.npz')
+
+
+def _source_key(filename):
+    # Path, size and modification time identifying the parsed file
+    stat = os.stat(filename)
+    return (os.path.realpath(filename), stat.st_size, stat.st_mtime)
+
+
+def _load_cache(filename, key):
+    # The cached parse of filename if it was made from the file as
+    # described by key, otherwise None
+    try:
+        with np.load(cache_path(filename)) as cache:
+            if (int(cache['version']) != _CACHE_VERSION or
+                    (str(cache['path']), int(cache['size']),
+                     float(cache['mtime'])) != key):
+                return None
+            return (cache['header'].tolist(), cache['values'],
+                    cache['valid'])
+    except (IOError, OSError, ValueError, KeyError, zipfile.BadZipfile):
+        #missing, unreadable or from an incompatible version
+        return None
+
+
+def _save_cache(filename, key, header, values, valid):
+    # Written to a temporary file first, so a concurrent load never sees
+    # a partial cache
+    path = cache_path(filename)
+    (directory, name) = os.path.split(path)
+    tmp_path = None
+    try:
+        (handle, tmp_path) = tempfile.mkstemp(dir=directory or '.',
+                                              prefix=name, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, version=_CACHE_VERSION, path=key[0], size=key[1],
+                     mtime=key[2], header=np.array(header), values=values,
+                     valid=valid)
+        #readable like the recordings, not only by the deploying user
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as ex:
+        _logger.warning("Could not cache the parse of %s: %s" % (filename, ex))
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def load_csv(filename, use_cache=True):
+    """
+    Recorded file as read by read_csv, from the cache beside it when the
+    file is unchanged since it was cached. Otherwise the file is read and
+    the cache rebuilt.
+
+    @param filename: input filename
+    @param use_cache: False always reads the file and leaves the cache
+
+    @return header, values, valid: as returned by read_csv
+    """
+    if not use_cache:
+        return read_csv(filename)
+    key = _source_key(filename)
+    cached = _load_cache(filename, key)
+    if cached is not None:
+        return cached
+    parsed = read_csv(filename)
+    _save_cache(filename, key, *parsed)
+    return parsed
+
+
+def warm(directory):
+    """
+    Builds the missing and outdated caches of all recorded files in a
+    directory, e.g. the playback library at deploy time. Files whose
+    first column is not 'time' are not recordings and are skipped.
+
+    @param directory: directory of the recorded files
+
+    @return cached: names of the files whose cache was rebuilt
+    @return current: names of the files whose cache was up to date
+    @return failed: names of the recordings that could not be cached
+    """
+    cached = []
+    current = []
+    failed = []
+    for name in sorted(os.listdir(directory)):
+        filename = os.path.join(directory, name)
+        if name.startswith('.') or not os.path.isfile(filename):
+            continue
+        try:
+            with open(filename, 'rb') as f:
+                if f.readline().split(b',')[0].strip() != b'time':
+                    continue
+            key = _source_key(filename)
+            if _load_cache(filename, key) is not None:
+                current.append(name)
+                continue
+            if _save_cache(filename, key, *read_csv(filename)):
+                cached.append(name)
+            else:
+                failed.append(name)
+        except (IOError, OSError) as ex:
+            _logger.warning("Could not read %s: %s" % (filename, ex))
+            failed.append(name)
+    return (cached, current, failed)
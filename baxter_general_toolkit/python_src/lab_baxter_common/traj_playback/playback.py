@@ -2,6 +2,7 @@
 
 from recorder import JointRecorder
 from trajectory import Trajectory
+import parse_cache
 import baxter_interface
 import rospkg
 import rospy
@@ -11,18 +12,22 @@ import actionlib
 from dynamic_reconfigure.server import Server
 from baxter_interface import CHECK_VERSION
 
+def _library_dir():
+    """The library folder, defined either in rosparam:`/baxter/playback_library_dir` or if doesn't
+    exist. Defaults to 'baxter_general_toolkit/trajectory_playback_library'
+    """
+    return rospy.get_param('/baxter/playback_library_dir',
+        os.path.join(rospkg.RosPack().get_path('baxter_general_toolkit'), 'trajectory_playback_library'))
+
+
 def _search_path(file_path):
     """Completes the file path if given a filename and not a directory. If only given a file name and 
-    not a directory, the system will search for it in the library folder. The library folder is defined
-    either in rosparam:`/baxter/playback_library_dir` or if doesn't exist. Defaults to 
-    'baxter_general_toolkit/trajectory_playback_library'
+    not a directory, the system will search for it in the library folder, see _library_dir.
     """
 
     if os.path.split(file_path)[0] == "":
         #This means that this isn't a directory
-        playback_directory = rospy.get_param('/baxter/playback_library_dir', 
-            os.path.join(rospkg.RosPack().get_path('baxter_general_toolkit'), 'trajectory_playback_library'))
-        file_path = os.path.join(playback_directory, file_path)
+        file_path = os.path.join(_library_dir(), file_path)
     return file_path
 
 
@@ -47,14 +52,18 @@ def record(file_path, rate=100.0):
     recorder.record()
 
 
-def playback(file_path, loops=1):
+def playback(file_path, loops=1, tolerance=None, speed_scale=None):
 
     file_path = _search_path(file_path)
     if not os.path.isfile(file_path):
         raise RuntimeError("Playback file doesn't exist")
 
     traj = Trajectory()
-    traj.parse_file(file_path)
+    traj.parse_file(file_path, tolerance, speed_scale)
+    # Played more than once, send the trajectories once and every loop
+    # only their handles, a single run sends them in full
+    if loops != 1:
+        traj.upload()
 
     
     # for safe interrupt handling
@@ -74,6 +83,17 @@ def playback(file_path, loops=1):
     rospy.logdebug("Exiting - File Playback Complete")
 
 
+def warm_cache(directory=None):
+    """Parses every recording of the library folder, or of directory, into the cache beside it, so
+    that playback() loads them without parsing. Caches that are up to date are kept.
+
+    @return cached, current, failed: file names, see parse_cache.warm
+    """
+    if directory is None:
+        directory = _library_dir()
+    return parse_cache.warm(directory)
+
+
 if __name__ == '__main__':
     filename = raw_input("Enter desired full name of .txt file: ")
     while filename == '':
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+
+def segment_durations(positions, max_velocity, max_acceleration=None,
+                      speed_scale=1.0, min_durations=None):
+    """
+    Fastest timing of a waypoint path under per-joint velocity and
+    acceleration limits, starting and ending at rest.
+
+    Without acceleration limits every segment moves its slowest joint at
+    full velocity. With them the path is parameterized by waypoint index
+    s, and the largest path speed ds/dt at each waypoint follows from a
+    forward pass that accelerates as hard as the joints allow and a
+    backward pass that leaves room to decelerate, the numerical
+    integration form of time-optimal path parameterization. Joints that
+    reverse at a waypoint are bounded by the path curvature, and the
+    result is checked against finite differences of the retimed
+    waypoints, slowing the path around any waypoint that still exceeds
+    a limit. On sparse waypoints the timing is conservative.
+
+    @param positions: waypoints x joints positions
+    @param max_velocity: velocity limits, scalar or one per joint
+    @param max_acceleration: acceleration limits, scalar or one per joint,
+                             None only limits velocities
+    @param speed_scale: fraction of the velocity limits to use, the
+                        acceleration limits are scaled by its square
+    @param min_durations: shortest duration of each segment, not scaled
+                          by speed_scale, e.g. to keep a pause; the path
+                          stops before and after these segments
+    @return: duration of each segment, 0 for segments that neither move
+             nor have a minimum duration
+    """
+    positions = np.asarray(positions, dtype=float)
+    positions = positions.reshape(len(positions), -1)
+    num_joints = positions.shape[1]
+    deltas = np.diff(positions, axis=0)
+    durations = np.zeros(len(deltas))
+    if min_durations is None:
+        min_durations = durations
+    min_durations = np.asarray(min_durations, dtype=float)
+    moving = np.flatnonzero(np.any(deltas != 0.0, axis=1) |
+                            (min_durations > 0.0))
+    if not len(moving):
+        return durations
+    max_velocity = (speed_scale * np.asarray(max_velocity, dtype=float) *
+                    np.ones(num_joints))
+    steps = np.fabs(deltas[moving])
+    if max_acceleration is None:
+        durations[moving] = np.maximum((steps / max_velocity).max(axis=1),
+                                       min_durations[moving])
+        return durations
+    max_acceleration = (speed_scale ** 2 *
+                        np.asarray(max_acceleration, dtype=float) *
+                        np.ones(num_joints))
+
+    # Repeated waypoints are skipped, the rest form the grid of the path
+    # parameter with first and second derivatives by finite differences
+    grid = np.concatenate(([moving[0]], moving + 1))
+    q = positions[grid]
+    chords = np.diff(q, axis=0)
+    dq = np.empty_like(q)
+    dq[1:-1] = 0.5 * (chords[1:] + chords[:-1])
+    dq[0] = chords[0]
+    dq[-1] = chords[-1]
+    ddq = np.zeros_like(q)
+    ddq[1:-1] = np.diff(chords, axis=0)
+
+    # Joint accelerations are dq * u + ddq * x for x = (ds/dt)^2 and
+    # u = d^2s/dt^2, so each joint allows u in [-c - e * x, c - e * x]
+    still = dq == 0.0
+    # A joint whose chords around a waypoint point in opposite directions
+    # reverses within the grid step, its dq is close to zero and the
+    # tangent term cannot be relied on, so it is bounded like a joint
+    # that does not move along the path
+    reverse = still.copy()
+    reverse[1:-1] |= chords[1:] * chords[:-1] < 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = np.where(still, np.inf, max_acceleration / np.fabs(dq))
+        e = np.where(still, 0.0, ddq / dq)
+        # Largest x from the velocity limits along both chords around
+        # each waypoint
+        span = np.fabs(np.vstack((chords[:1], chords)))
+        span = np.maximum(span, np.fabs(np.vstack((chords, chords[-1:]))))
+        x_max = ((max_velocity / span) ** 2).min(axis=1)
+        # Largest x at which some u satisfies every joint, pairwise
+        # -c_j - e_j * x <= c_k - e_k * x, and for joints that do not
+        # move along the path |ddq| * x <= max_acceleration
+        spread = e[:, np.newaxis, :] - e[:, :, np.newaxis]
+        reach = c[:, :, np.newaxis] + c[:, np.newaxis, :]
+        pairs = np.where(spread > 0.0, reach / spread, np.inf)
+        x_max = np.minimum(x_max, pairs.min(axis=(1, 2)))
+        x_max = np.minimum(x_max, np.where(
+            reverse & (ddq != 0.0), max_acceleration / np.fabs(ddq),
+            np.inf).min(axis=1))
+    x_max = np.minimum(x_max, 1e12)
+    x_max[0] = x_max[-1] = 0.0
+    # The path comes to rest around segments with a minimum duration
+    slow = np.flatnonzero(min_durations[moving] > 0.0)
+    x_max[slow] = x_max[slow + 1] = 0.0
+
+    # Rest segments move bang-bang, or trapezoidal once the velocity
+    # limit is reached
+    ramp = max_velocity ** 2 / max_acceleration
+    rest_durations = np.where(steps >= ramp,
+                              steps / max_velocity +
+                              max_velocity / max_acceleration,
+                              2.0 * np.sqrt(steps / max_acceleration)
+                              ).max(axis=1)
+    rest_durations = np.maximum(rest_durations, min_durations[moving])
+    zero = np.zeros((1, num_joints))
+    # The finite differences of the timing are checked against the limits.
+    # The acceleration at a waypoint only depends on the speeds at it and
+    # its neighbours and scales with x, so where it is too high x at all
+    # three is lowered by the excess and the passes run again. Waypoints
+    # at rest cannot be slowed further and are left out.
+    for _ in range(100):
+        x = _integrate_path_speed(x_max, c, e)
+        speed = np.sqrt(x)
+        with np.errstate(divide='ignore'):
+            dt = 2.0 / (speed[:-1] + speed[1:])
+        # Segments at rest on both ends
+        rest = ~np.isfinite(dt)
+        dt[rest] = rest_durations[rest]
+        dt = np.maximum(dt, min_durations[moving])
+        velocities = np.vstack((zero, chords / dt[:, np.newaxis], zero))
+        spans = np.concatenate(([0.0], dt, [0.0]))
+        spans = spans[1:] + spans[:-1]
+        accelerations = (2.0 * np.diff(velocities, axis=0) /
+                         spans[:, np.newaxis])
+        excess = (np.fabs(accelerations) / max_acceleration).max(axis=1)
+        over = np.flatnonzero(excess > 1.0 + 1e-6)
+        if not len(over):
+            break
+        for shift in (-1, 0, 1):
+            near = np.clip(over + shift, 0, len(x) - 1)
+            slower = x[near] > 0.0
+            np.minimum.at(x_max, near[slower],
+                          x[near[slower]] / excess[over[slower]])
+    else:
+        # Not settled, slowing the whole path down by the largest excess
+        # scales every acceleration below its limit
+        dt *= np.sqrt(excess[over].max())
+    durations[moving] = dt
+    return durations
+
+
+def _integrate_path_speed(x_max, c, e):
+    # Largest x = (ds/dt)^2 at each grid point below x_max, from a forward
+    # pass that accelerates as hard as the joints allow and a backward
+    # pass that leaves room to decelerate
+    x = x_max.copy()
+    for idx in range(len(x) - 1):
+        u_max = (c[idx] - e[idx] * x[idx]).min()
+        x[idx + 1] = min(x[idx + 1], max(x[idx] + 2.0 * u_max, 0.0))
+    for idx in range(len(x) - 1, 0, -1):
+        u_min = (-c[idx] - e[idx] * x[idx]).max()
+        x[idx - 1] = min(x[idx - 1], max(x[idx] - 2.0 * u_min, 0.0))
+    return x
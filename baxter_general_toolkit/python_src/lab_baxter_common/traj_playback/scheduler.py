@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import ctypes
+import os
+import time
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no monotonic clock, read CLOCK_MONOTONIC directly
+    class _timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    _CLOCK_MONOTONIC = 1
+    _clock_gettime = ctypes.CDLL('librt.so.1', use_errno=True).clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+    def monotonic():
+        """
+        @return seconds: current time of the monotonic clock
+        """
+        now = _timespec()
+        if _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(now)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return now.tv_sec + now.tv_nsec * 1e-9
+
+
+class DeadlineScheduler(object):
+    def __init__(self, rate):
+        """
+        Fixed rate scheduler on absolute deadlines of the monotonic
+        clock. Deadlines are start + n * period, so late wakeups do not
+        accumulate into drift, and deadlines that have already passed
+        are skipped rather than run back to back.
+
+        Offers the sleep() interface of rospy.Rate.
+
+        @param rate: loop rate in Hz
+        """
+        self._period = 1.0 / rate
+        self.reset()
+
+    def reset(self):
+        """
+        Restarts the schedule with the first deadline one period from now
+        """
+        self._start = monotonic()
+        self._next = self._start + self._period
+        self.ticks = 0
+        self.skipped = 0
+
+    def sleep(self):
+        """
+        Sleeps until the next deadline that has not yet passed
+        """
+        now = monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        else:
+            missed = int((now - self._next) / self._period)
+            self.skipped += missed
+            self._next += missed * self._period
+        self._next += self._period
+        self.ticks += 1
+
+    @property
+    def realized_rate(self):
+        """Completed ticks per second since reset()"""
+        elapsed = monotonic() - self._start
+        return self.ticks / elapsed if elapsed > 0 else 0.0
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 import source_code
+from lockstep import LockstepDriver
+from limb_backend import BaxterBackend
 import rospy
 import actionlib
 from dynamic_reconfigure.server import Server
@@ -10,7 +12,13 @@ from baxter_general_toolkit.cfg import (
     PositionFFJointTrajectoryActionServerConfig,
 )
 
-def start_server(limb="both", rate=100.0, mode="position_w_id"):
+def start_server(limb="both", rate=100.0, mode="position_w_id",
+                 analytic_derivatives=False, spline_cache_mb=64.0,
+                 discretize=False, feedback_rate=20.0,
+                 deadline_scheduler=False, lockstep=False, blend=False,
+                 prepare_async=False, waypoint_tolerance=None, hold_rate=None,
+                 interpolation='bezier', streaming=False,
+                 upload_store_mb=256.0, hold_on_success=True):
     print("Initializing joint trajectory action server...")
 
     if mode == 'velocity':
@@ -22,16 +30,37 @@ def start_server(limb="both", rate=100.0, mode="position_w_id"):
     else:
         dyn_cfg_srv = Server(PositionFFJointTrajectoryActionServerConfig,
                              lambda config, level: config)
+    # Every server argument after the mode, by keyword
+    options = dict(analytic_derivatives=analytic_derivatives,
+                   spline_cache_mb=spline_cache_mb, discretize=discretize,
+                   feedback_rate=feedback_rate,
+                   deadline_scheduler=deadline_scheduler, blend=blend,
+                   prepare_async=prepare_async,
+                   waypoint_tolerance=waypoint_tolerance,
+                   hold_rate=hold_rate, interpolation=interpolation,
+                   streaming=streaming, upload_store_mb=upload_store_mb,
+                   hold_on_success=hold_on_success)
     jtas = []
+    driver = None
     if limb == 'both':
-        jtas.append(source_code.JointTrajectoryActionServer('right', dyn_cfg_srv,
-                                                rate, mode))
-        jtas.append(source_code.JointTrajectoryActionServer('left', dyn_cfg_srv,
-                                                rate, mode))
+        backends = [('right', BaxterBackend('right')),
+                    ('left', BaxterBackend('left'))]
+        if lockstep:
+            # Both limbs stepped from one control thread, the robot enable
+            # state is the same through either backend
+            driver = LockstepDriver(backends[0][1].enable, rate,
+                                    deadline_scheduler)
+        for (name, backend) in backends:
+            jtas.append(source_code.JointTrajectoryActionServer(
+                name, dyn_cfg_srv, rate, mode, lockstep=driver,
+                backend=backend, **options))
     else:
-        jtas.append(source_code.JointTrajectoryActionServer(limb, dyn_cfg_srv, rate, mode))
+        jtas.append(source_code.JointTrajectoryActionServer(
+            limb, dyn_cfg_srv, rate, mode, **options))
 
     def cleanup():
+        if driver is not None:
+            driver.stop()
         for j in jtas:
             j.clean_shutdown()
 
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""
+Offline harness of the trajectory server on a SimulatedBackend.
+
+Runs without a robot, a ROS master, baxter_interface or actionlib, but
+not in a plain Python environment: the server still needs rospy and the
+message, service and dynamic reconfigure modules of a built workspace
+(control_msgs, trajectory_msgs, diagnostic_msgs and
+baxter_general_toolkit's own). The unit tests in test/ that do not drive
+the server only need numpy.
+"""
+
+import argparse
+import logging
+import math
+import time
+import numpy as np
+import rospy
+import source_code
+from limb_backend import SimulatedBackend
+from scheduler import monotonic
+
+from baxter_general_toolkit.cfg import (
+    PositionJointTrajectoryActionServerConfig,
+    VelocityJointTrajectoryActionServerConfig,
+    PositionFFJointTrajectoryActionServerConfig,
+)
+from control_msgs.msg import (
+    FollowJointTrajectoryGoal,
+)
+from trajectory_msgs.msg import (
+    JointTrajectory,
+    JointTrajectoryPoint,
+)
+
+
+class DefaultConfig(object):
+    def __init__(self, mode):
+        """
+        Stands in for the dynamic reconfigure server, with the defaults
+        of the mode's config
+
+        @param mode: joint control mode of the trajectory server
+        """
+        if mode == 'velocity':
+            cfg = VelocityJointTrajectoryActionServerConfig
+        elif mode == 'position':
+            cfg = PositionJointTrajectoryActionServerConfig
+        else:
+            cfg = PositionFFJointTrajectoryActionServerConfig
+        self.config = dict(cfg.defaults)
+
+
+def swing_goal(joint_names, duration, amplitude, num_points):
+    """
+    Goal that swings every joint out and back from zero, with a larger
+    amplitude on the joints closer to the shoulder
+
+    @param joint_names: joints of the goal
+    @param duration: length of the trajectory in seconds
+    @param amplitude: largest joint excursion in radians
+    @param num_points: number of trajectory points
+    @return: FollowJointTrajectoryGoal
+    """
+    goal = FollowJointTrajectoryGoal()
+    goal.trajectory.joint_names = list(joint_names)
+    scales = np.linspace(1.0, 0.5, len(joint_names))
+    for idx in range(1, num_points + 1):
+        point = JointTrajectoryPoint()
+        fraction = float(idx) / num_points
+        point.positions = (amplitude * scales *
+                           math.sin(math.pi * fraction) ** 2).tolist()
+        point.time_from_start = rospy.Duration.from_sec(duration * fraction)
+        goal.trajectory.points.append(point)
+    return goal
+
+
+def run_goal(backend, server_ns, goal, rate, timeout=None):
+    """
+    Sends one goal to a trajectory server on a SimulatedBackend and
+    measures its execution from the simulated limb's side
+
+    @param backend: SimulatedBackend of the server
+    @param server_ns: namespace of the server's follow_joint_trajectory action
+    @param goal: FollowJointTrajectoryGoal
+    @param rate: control rate of the server in Hz
+    @param timeout: maximum wait for the result in seconds
+    @return: dictionary of measurements
+    """
+    action_server = backend.action_servers[server_ns]
+    errors = []
+    action_server.feedback_cb = (
+        lambda fdbk: errors.append(list(fdbk.error.positions)))
+    limb = backend.limb
+    first_command = len(limb.command_times)
+    start = monotonic()
+    state, result = action_server.send_goal(goal).wait(timeout)
+    end = monotonic()
+    action_server.feedback_cb = None
+    commands = [stamp for stamp in limb.command_times[first_command:]
+                if stamp <= end]
+    periods = np.diff(commands)
+    errors = np.fabs(np.array(errors)) if errors else np.zeros((1, 1))
+    return {
+        'state': state,
+        'error_code': getattr(result, 'error_code', None),
+        'duration': end - start,
+        'ticks': len(commands),
+        'ticks_per_sec': (len(commands) / (commands[-1] - commands[0])
+                          if len(commands) > 1 else 0.0),
+        'start_latency': commands[0] - start if commands else None,
+        'worst_tick_latency': (periods.max() - 1.0 / rate
+                               if len(periods) else 0.0),
+        'rms_error': math.sqrt(np.mean(errors ** 2)),
+        'max_error': errors.max(),
+    }
+
+
+def run_stream(backend, limb_ns, goal, rate, timeout):
+    """
+    Streams the points of a goal as setpoints to a trajectory server on a
+    SimulatedBackend, each one at its time from start, and measures their
+    execution from the simulated limb's side
+
+    @param backend: SimulatedBackend of the server
+    @param limb_ns: namespace of the server's limb, e.g. 'robot/limb/left'
+    @param goal: FollowJointTrajectoryGoal
+    @param rate: control rate of the server in Hz
+    @param timeout: silence in seconds after which the server ends a stream
+    @return: dictionary of measurements
+    """
+    setpoints = backend.subscribers[limb_ns + '/stream_setpoints']
+    feedback = backend.publishers[limb_ns + '/stream_feedback']
+    errors = []
+    feedback.callback = (
+        lambda fdbk: errors.append(list(fdbk.error.positions)))
+    limb = backend.limb
+    first_command = len(limb.command_times)
+    first_feedback = feedback.count
+    start = monotonic()
+    for point in goal.trajectory.points:
+        delay = start + point.time_from_start.to_sec() - monotonic()
+        if delay > 0.0:
+            time.sleep(delay)
+        # A zero stamp is the time of arrival
+        msg = JointTrajectory()
+        msg.joint_names = goal.trajectory.joint_names
+        msg.points = [JointTrajectoryPoint(positions=point.positions)]
+        setpoints.publish(msg)
+    # Wait for the server to end the stream, feedback stops with it
+    count = None
+    while count != feedback.count:
+        count = feedback.count
+        time.sleep(timeout + 2.0 / rate)
+    feedback.callback = None
+    commands = limb.command_times[first_command:]
+    commands = commands[:feedback.count - first_feedback]
+    periods = np.diff(commands)
+    errors = np.fabs(np.array(errors)) if errors else np.zeros((1, 1))
+    return {
+        'state': 'ended',
+        'error_code': None,
+        'duration': commands[-1] - start if commands else 0.0,
+        'ticks': len(commands),
+        'ticks_per_sec': (len(commands) / (commands[-1] - commands[0])
+                          if len(commands) > 1 else 0.0),
+        'start_latency': commands[0] - start if commands else None,
+        'worst_tick_latency': (periods.max() - 1.0 / rate
+                               if len(periods) else 0.0),
+        'rms_error': math.sqrt(np.mean(errors ** 2)),
+        'max_error': errors.max(),
+    }
+
+
+def format_run(run):
+    """
+    Formats the measurements of run_goal for printing
+
+    @param run: dictionary returned by run_goal
+    @return: multi-line string
+    """
+    lines = [
+        "result: %s%s after %.3f s" %
+        (run['state'], ' (error code %s)' % (run['error_code'],)
+         if run['error_code'] is not None else '', run['duration']),
+        "ticks: %d at %.1f ticks/s, worst tick latency %.2f ms" %
+        (run['ticks'], run['ticks_per_sec'],
+         1000.0 * run['worst_tick_latency']),
+        "start latency: %s" %
+        ('%.2f ms' % (1000.0 * run['start_latency'],)
+         if run['start_latency'] is not None else 'no commands'),
+        "tracking error: rms %.5f rad, max %.5f rad" %
+        (run['rms_error'], run['max_error']),
+    ]
+    return '\n'.join('  ' + line for line in lines)
+
+
+def main():
+    """
+    Runs trajectory goals against a simulated arm without a robot or
+    ROS master and prints control rate, latency and tracking error.
+    Needs rospy and the built messages and dynamic reconfigure configs
+    of the workspace, but not baxter_interface or actionlib.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('-l', '--limb', default='left',
+                        choices=['left', 'right'])
+    parser.add_argument('-m', '--mode', default='position_w_id',
+                        choices=['position_w_id', 'position', 'velocity'])
+    parser.add_argument('-r', '--rate', type=float, default=100.0,
+                        help="control rate in Hz")
+    parser.add_argument('--lag', type=float, default=0.05,
+                        help="time constant of the simulated joints in s")
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help="joint angle measurement noise in rad")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the measurement noise")
+    parser.add_argument('-d', '--duration', type=float, default=2.0,
+                        help="length of each trajectory in s")
+    parser.add_argument('-a', '--amplitude', type=float, default=0.5,
+                        help="largest joint excursion in rad")
+    parser.add_argument('-p', '--points', type=int, default=20,
+                        help="number of points of each trajectory")
+    parser.add_argument('-g', '--goals', type=int, default=1,
+                        help="number of goals to run")
+    parser.add_argument('--deadline-scheduler', action='store_true',
+                        help="pace the control loop on monotonic deadlines")
+    parser.add_argument('--discretize', action='store_true',
+                        help="sample splines into tables at goal start")
+    parser.add_argument('--waypoint-tolerance', type=float, default=None,
+                        help="reduce goal waypoints to this tolerance in rad")
+    parser.add_argument('--hold-rate', type=float, default=None,
+                        help="command rate in Hz while holding between goals")
+    parser.add_argument('--release-on-success', action='store_true',
+                        help="do not hold the limb after a goal succeeds")
+    parser.add_argument('-i', '--interpolation', default='bezier',
+                        choices=source_code.INTERPOLATION_MODES,
+                        help="interpolation of the goal points")
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help="stream the goal points as setpoints instead")
+    parser.add_argument('--lookahead', type=float, default=0.02,
+                        help="look-ahead of streamed setpoints in s")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="print the server's log messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose
+                        else logging.WARNING)
+    # Wall clock time without a ROS master
+    rospy.rostime.set_rostime_initialized(True)
+
+    backend = SimulatedBackend(args.limb, args.lag, args.noise,
+                               seed=args.seed)
+    # Feedback on every tick so the tracking error covers all of them
+    server = source_code.JointTrajectoryActionServer(
+        args.limb, DefaultConfig(args.mode), args.rate, args.mode,
+        discretize=args.discretize, feedback_rate=0.0,
+        deadline_scheduler=args.deadline_scheduler, backend=backend,
+        waypoint_tolerance=args.waypoint_tolerance,
+        hold_rate=args.hold_rate, interpolation=args.interpolation,
+        hold_on_success=not args.release_on_success,
+        streaming=args.stream, stream_lookahead=args.lookahead)
+    limb_ns = 'robot/limb/%s' % (args.limb,)
+    goal = swing_goal(backend.limb.joint_names(), args.duration,
+                      args.amplitude, args.points)
+    print("Simulated %s arm, %s mode at %.1f Hz (lag %.3f s, noise %.4f rad)"
+          % (args.limb, args.mode, args.rate, args.lag, args.noise))
+    for idx in range(args.goals):
+        print("goal %d:" % (idx + 1,))
+        if args.stream:
+            run = run_stream(backend, limb_ns, goal, args.rate, 0.2)
+        else:
+            run = run_goal(backend, limb_ns + '/follow_joint_trajectory',
+                           goal, args.rate, args.duration + 10.0)
+        print(format_run(run))
+    server.clean_shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+
+import math
+import threading
+import numpy as np
+from scheduler import monotonic
+
+
+# Baxter arm joints, prefixed with the limb name
+JOINTS = ('s0', 's1', 'e0', 'e1', 'w0', 'w1', 'w2')
+
+
+class SimulatedLimb(object):
+    def __init__(self, limb, lag=0.05, noise=0.0, start=None, seed=None):
+        """
+        In-process arm with the baxter_interface.Limb calls used by the
+        trajectory server. Each joint follows its position or velocity
+        command as a first-order system, advanced on every call from the
+        time elapsed since the previous one.
+
+        @param limb: limb name, 'left' or 'right'
+        @param lag: time constant of the joint response in seconds,
+                    0 follows commands instantly
+        @param noise: standard deviation of the measured joint angles in
+                      radians
+        @param start: initial joint angles, zeros by default
+        @param seed: seed of the measurement noise
+        """
+        self._names = ['%s_%s' % (limb, joint) for joint in JOINTS]
+        self._index = dict((name, idx) for idx, name in enumerate(self._names))
+        num_joints = len(self._names)
+        self._pos = (np.zeros(num_joints) if start is None
+                     else np.array(start, dtype=float))
+        self._vel = np.zeros(num_joints)
+        self._target = self._pos.copy()
+        self._velocity_mode = False
+        self._lag = lag
+        self._noise = noise
+        self._random = np.random.RandomState(seed)
+        self._lock = threading.Lock()
+        self._last = monotonic()
+        # Times of all position and velocity commands
+        self.command_times = []
+
+    def _advance(self):
+        now = monotonic()
+        dt = now - self._last
+        self._last = now
+        if dt <= 0.0:
+            return
+        alpha = 1.0 - math.exp(-dt / self._lag) if self._lag > 0.0 else 1.0
+        if self._velocity_mode:
+            self._vel += alpha * (self._target - self._vel)
+            self._pos += self._vel * dt
+        else:
+            step = alpha * (self._target - self._pos)
+            self._pos += step
+            self._vel = step / dt
+
+    def _measure(self, value):
+        if self._noise > 0.0:
+            return value + self._random.normal(0.0, self._noise)
+        return value
+
+    def joint_names(self):
+        return list(self._names)
+
+    def joint_angle(self, joint):
+        with self._lock:
+            self._advance()
+            return self._measure(self._pos[self._index[joint]])
+
+    def joint_angles(self):
+        return dict((name, self.joint_angle(name)) for name in self._names)
+
+    def joint_velocity(self, joint):
+        with self._lock:
+            self._advance()
+            return self._vel[self._index[joint]]
+
+    def joint_velocities(self):
+        return dict((name, self.joint_velocity(name)) for name in self._names)
+
+    def set_joint_positions(self, positions, raw=False):
+        with self._lock:
+            self._advance()
+            if self._velocity_mode:
+                self._target = self._pos.copy()
+                self._velocity_mode = False
+            for name, position in positions.items():
+                self._target[self._index[name]] = position
+            self.command_times.append(self._last)
+
+    def set_joint_velocities(self, velocities):
+        with self._lock:
+            self._advance()
+            if not self._velocity_mode:
+                self._target = self._vel.copy()
+                self._velocity_mode = True
+            for name, velocity in velocities.items():
+                self._target[self._index[name]] = velocity
+            self.command_times.append(self._last)
+
+    def exit_control_mode(self, timeout=0.2):
+        # Hold the current position, like the robot's position mode
+        with self._lock:
+            self._advance()
+            self._target = self._pos.copy()
+            self._velocity_mode = False
+
+
+class SimulatedEnable(object):
+    class _State(object):
+        def __init__(self, enabled):
+            self.enabled = enabled
+
+    def __init__(self, enabled=True):
+        """
+        Robot enable state with the baxter_interface.RobotEnable calls
+        used by the trajectory server
+
+        @param enabled: initial enable state
+        """
+        self._enabled = enabled
+
+    def state(self):
+        return self._State(self._enabled)
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+
+class Signal(object):
+    def __init__(self):
+        """
+        Callback list with the baxter_dataflow.Signal calls used by the
+        trajectory server
+        """
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def __call__(self, *args, **kwargs):
+        for callback in self._callbacks:
+            callback(*args, **kwargs)
+
+
+class SimulatedDigitalIO(object):
+    def __init__(self, component_id):
+        """
+        Digital input with the baxter_interface.DigitalIO calls used by
+        the trajectory server
+
+        @param component_id: name of the input, e.g. 'left_lower_cuff'
+        """
+        self.name = component_id
+        self.state = False
+        self.state_changed = Signal()
+
+    def set_state(self, value):
+        """
+        Changes the input as if it was pressed or released
+
+        @param value: new input state
+        """
+        if value != self.state:
+            self.state = value
+            self.state_changed(value)
+
+
+class LocalGoalHandle(object):
+    def __init__(self, goal):
+        """
+        Goal sent to a LocalActionServer and its final state
+
+        @param goal: action goal message
+        """
+        self._goal = goal
+        self.state = 'pending'
+        self.result = None
+        self.done = threading.Event()
+
+    def get_goal(self):
+        return self._goal
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the goal is finished
+
+        @param timeout: maximum wait in seconds, None waits forever
+        @return: final state, or None on timeout, and the result message
+        """
+        if not self.done.wait(timeout):
+            return None, None
+        return self.state, self.result
+
+
+class LocalActionServer(object):
+    def __init__(self, execute_cb, goal_cb=None):
+        """
+        In-process action server with the actionlib.SimpleActionServer
+        calls used by the trajectory server. Goals run one at a time on
+        a worker thread, a goal sent while another one runs requests its
+        preemption and becomes the next goal.
+
+        @param execute_cb: called with each goal on the worker thread
+        @param goal_cb: called without arguments after each goal is queued
+        """
+        self._execute_cb = execute_cb
+        self._goal_cb = goal_cb
+        self._lock = threading.Lock()
+        self._current = None
+        self.next_goal = None
+        self._preempt = False
+        self._next_preempt = False
+        # Called with each published feedback message
+        self.feedback_cb = None
+
+    def start(self):
+        pass
+
+    def send_goal(self, goal):
+        """
+        Sends a goal as an action client would
+
+        @param goal: action goal message
+        @return: LocalGoalHandle of the goal
+        """
+        handle = LocalGoalHandle(goal)
+        with self._lock:
+            if self._current is None:
+                self._current = handle
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+            else:
+                if self.next_goal is not None:
+                    self._finish(self.next_goal, 'recalled', None)
+                self.next_goal = handle
+                self._preempt = True
+                self._next_preempt = False
+        if self._goal_cb is not None:
+            self._goal_cb()
+        return handle
+
+    def cancel(self, handle):
+        """
+        Cancels a goal as an action client would. As with a
+        SimpleActionServer, the executing goal gets a preemption request
+        and a queued goal gets one once it is accepted.
+
+        @param handle: LocalGoalHandle returned by send_goal
+        """
+        with self._lock:
+            if handle is self._current:
+                self._preempt = True
+            elif handle is self.next_goal:
+                self._next_preempt = True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                handle = self._current
+                handle.state = 'active'
+            self._execute_cb(handle.get_goal())
+            with self._lock:
+                handle = self._current
+                if handle.state == 'active':
+                    # The execute callback must finish its goal
+                    self._finish(handle, 'aborted', None)
+                if self.next_goal is None:
+                    self._current = None
+                    return
+                self._current = self.next_goal
+                self.next_goal = None
+                self._preempt = self._next_preempt
+                self._next_preempt = False
+
+    def _finish(self, handle, state, result):
+        handle.state = state
+        handle.result = result
+        handle.done.set()
+
+    def is_new_goal_available(self):
+        return self.next_goal is not None
+
+    def is_preempt_requested(self):
+        return self._preempt
+
+    def accept_new_goal(self):
+        with self._lock:
+            if self._current.state == 'active':
+                self._finish(self._current, 'preempted', None)
+            self._current = self.next_goal
+            self._current.state = 'active'
+            self.next_goal = None
+            self._preempt = self._next_preempt
+            self._next_preempt = False
+            return self._current.get_goal()
+
+    def set_succeeded(self, result=None, text=''):
+        self._finish(self._current, 'succeeded', result)
+
+    def set_aborted(self, result=None, text=''):
+        self._finish(self._current, 'aborted', result)
+
+    def set_preempted(self, result=None, text=''):
+        self._finish(self._current, 'preempted', result)
+
+    def publish_feedback(self, feedback):
+        if self.feedback_cb is not None:
+            self.feedback_cb(feedback)
+
+
+class LocalPublisher(object):
+    def __init__(self, topic):
+        """
+        Publisher that keeps the last message instead of sending it
+
+        @param topic: topic name
+        """
+        self.topic = topic
+        self.count = 0
+        self.last = None
+        # Called with each published message
+        self.callback = None
+
+    def publish(self, msg):
+        self.count += 1
+        self.last = msg
+        if self.callback is not None:
+            self.callback(msg)
+
+
+class LocalService(object):
+    def __init__(self, name, handler):
+        """
+        Service that is called in-process instead of over ROS
+
+        @param name: service name
+        @param handler: called with each request, returns the response
+        """
+        self.name = name
+        self._handler = handler
+
+    def call(self, request):
+        return self._handler(request)
+
+
+class LocalSubscriber(object):
+    def __init__(self, topic, callback):
+        """
+        Subscriber whose messages are published in-process instead of
+        over ROS
+
+        @param topic: topic name
+        @param callback: called with each message
+        """
+        self.topic = topic
+        self._callback = callback
+
+    def publish(self, msg):
+        """
+        Delivers a message as if it was published on the topic, the
+        callback runs on the calling thread
+
+        @param msg: message
+        """
+        self._callback(msg)
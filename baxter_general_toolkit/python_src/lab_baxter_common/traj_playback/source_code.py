@@ -1,32 +1,21 @@
 #!/usr/bin/env python
 
 import threading
-import sys
-import rospkg
 import rospy
-import os
-import bisect
 from copy import deepcopy, copy
-import math
-import operator
 import numpy as np
 import bezier
-import actionlib
-import baxter_interface
-import baxter_control
-import baxter_dataflow
-from pprint import pprint
-from baxter_interface import CHECK_VERSION
-from baxter_core_msgs.msg import NavigatorState
-from dynamic_reconfigure.server import Server
-
-from baxter_general_toolkit.cfg import (
-    PositionJointTrajectoryActionServerConfig,
-    VelocityJointTrajectoryActionServerConfig,
-    PositionFFJointTrajectoryActionServerConfig,
-)
+from spline_cache import SplineCache, TrajectoryStore, trajectory_key
+from loop_stats import LoopStats
+from scheduler import DeadlineScheduler, monotonic
+from goal_preparer import GoalPreparer, TrajectoryPlan
+from array_pid import ArrayPID
+from limb_backend import BaxterBackend
+from waypoints import reduce_points
+from streaming import SetpointStream
 
 from trajectory_msgs.msg import (
+    JointTrajectory,
     JointTrajectoryPoint,
 )
 
@@ -37,27 +26,137 @@ from control_msgs.msg import (
     FollowJointTrajectoryGoal,
 )
 
+from baxter_general_toolkit.msg import (
+    ExecuteTrajectoryAction,
+    ExecuteTrajectoryFeedback,
+    ExecuteTrajectoryResult,
+)
+
+from baxter_general_toolkit.srv import (
+    UploadTrajectory,
+    UploadTrajectoryResponse,
+)
+
 from std_msgs.msg import (
     UInt16,
 )
+
+from diagnostic_msgs.msg import (
+    DiagnosticArray,
+    DiagnosticStatus,
+    KeyValue,
+)
             
 
+# Interpolation of goal points: a C2 Bezier spline through all of them,
+# C1 cubic Hermite segments on the supplied velocities, straight segments
+# for points as dense as the control rate, or chosen from point density
+INTERPOLATION_MODES = ('bezier', 'cubic_hermite', 'linear', 'auto')
+# Modes whose segments only depend on their own end points, so goal
+# waypoints can be reduced before fitting them. The Bezier fit is
+# parameterized by point index and overshoots between unevenly spaced
+# points.
+REDUCIBLE_MODES = ('cubic_hermite', 'linear')
+# Points on either side of the join of a blended goal that are refit,
+# the rest of both trajectories keeps its fitted spline
+BLEND_WINDOW = 4
+
+
 class JointTrajectoryActionServer(object):
     def __init__(self, limb, reconfig_server, rate=100.0,
-                 mode='position_w_id'):
+                 mode='position_w_id', analytic_derivatives=False,
+                 spline_cache_mb=64.0, discretize=False, feedback_rate=20.0,
+                 deadline_scheduler=False, lockstep=None, blend=False,
+                 prepare_async=False, backend=None, waypoint_tolerance=None,
+                 hold_rate=None, interpolation='bezier', streaming=False,
+                 stream_lookahead=0.02, stream_timeout=0.2,
+                 upload_store_mb=256.0, hold_on_success=True):
+        """
+        FollowJointTrajectory action server of one limb. Goals are fit
+        to a spline and commanded at the control rate, each one taking
+        over the limb from the goal or stream executing before it.
+
+        With blend, a goal received while another one executes is spliced
+        onto its end instead of preempting it: the executing goal finishes
+        at its last point without stopping and the new goal continues
+        from there. A new goal that cannot be blended preempts the
+        executing goal as without blend, the new goal then runs, or is
+        aborted, on its own. Blending is refused for goals with other
+        joints or dimensions, goals without points after the join, goals
+        whose plan fails, and goals whose first point is within a control
+        period of their start but further from the executing goal's last
+        point than its path tolerance.
+
+        Once a goal ends the limb is held at its last commanded position
+        until the next goal arrives, the cuff is grabbed or the robot is
+        disabled, as the server always did. Without hold_on_success, a
+        goal that succeeds returns the limb to the robot instead, only
+        preempted and aborted goals are held.
+
+        @param limb: limb name, 'left' or 'right'
+        @param reconfig_server: dynamic reconfigure server of the mode's
+                                config, provides the default tolerances,
+                                gains and interpolation mode
+        @param rate: control rate in Hz
+        @param mode: joint control mode, 'position_w_id', 'position' or
+                     'velocity'
+        @param analytic_derivatives: command velocities and accelerations
+                                     from the position spline's derivatives
+        @param spline_cache_mb: memory cap of the fitted spline cache
+        @param discretize: sample each goal's spline at the control rate
+                           when it is accepted
+        @param feedback_rate: action feedback rate in Hz, 0 every tick
+        @param deadline_scheduler: pace the control loop with a
+                                   DeadlineScheduler instead of rospy.Rate
+        @param lockstep: LockstepDriver stepping this and the other limb
+                         from one control thread, or None
+        @param blend: splice goals received during execution onto the
+                      executing one, see above
+        @param prepare_async: validate and fit new goals on a worker thread
+        @param backend: robot interfaces and ROS endpoints, BaxterBackend
+                        of the limb by default
+        @param waypoint_tolerance: drop goal waypoints reproduced within
+                                   this many radians, None keeps them all
+        @param hold_rate: command rate in Hz while holding the limb after
+                          a goal, None holds at the control rate
+        @param interpolation: one of INTERPOLATION_MODES
+        @param streaming: accept streamed setpoints on stream_setpoints
+        @param stream_lookahead: delay of streamed setpoints in seconds
+        @param stream_timeout: silence in seconds that ends a stream
+        @param upload_store_mb: memory cap of the uploaded trajectories
+        @param hold_on_success: hold the limb after a goal succeeds, see
+                                above
+        """
         self._dyn = reconfig_server
+        # Robot interfaces and ROS endpoints, BaxterBackend unless a
+        # simulated backend is given
+        self._backend = (backend if backend is not None
+                         else BaxterBackend(limb))
+        # Wakes an idle hold on a new goal, a ready plan, a cuff event
+        # or shutdown
+        self._wake = threading.Condition()
+        self._wake_pending = False
         self._ns = 'robot/limb/' + limb
         self._fjt_ns = self._ns + '/follow_joint_trajectory'
-        self._server = actionlib.SimpleActionServer(
+        self._server = self._backend.action_server(
             self._fjt_ns,
             FollowJointTrajectoryAction,
-            execute_cb=self._on_trajectory_action,
-            auto_start=False)
+            self._on_trajectory_action,
+            self._notify_wake)
+        # Goal state and feedback go to self._server, the server whose
+        # goal is executing. Goals of either server take over the limb
+        # from the other one through the execute lock.
+        self._fjt_server = self._server
+        self._execute_lock = threading.Lock()
+        # Number of goals and streams waiting for the execute lock, each
+        # one asks the executing goal to give up the limb
+        self._takeovers = 0
+        self._takeover_lock = threading.Lock()
         self._action_name = rospy.get_name()
-        self._limb = baxter_interface.Limb(limb)
-        self._enable = baxter_interface.RobotEnable()
+        self._limb = self._backend.limb
+        self._enable = self._backend.enable
         self._name = limb
-        self._cuff = baxter_interface.DigitalIO('%s_lower_cuff' % (limb,))
+        self._cuff = self._backend.cuff
         self._cuff.state_changed.connect(self._cuff_cb)
         # Verify joint control mode
         self._mode = mode
@@ -68,16 +167,78 @@ class JointTrajectoryActionServer(object):
                          "'position_w_id', 'position', 'velocity')" %
                     (self._action_name, self._mode,))
             return
+        # Verify interpolation mode
+        self._interpolation = interpolation
+        if self._interpolation not in INTERPOLATION_MODES:
+            rospy.logerr("%s: Action Server Creation Failed - "
+                         "Provided Invalid Interpolation Mode '%s' (Options: "
+                         "%s)" % (self._action_name, self._interpolation,
+                                  ", ".join("'%s'" % (interp,) for interp
+                                            in INTERPOLATION_MODES)))
+            return
+        # For clients reducing waypoints, see REDUCIBLE_MODES
+        self._backend.set_param(self._ns + '/interpolation',
+                                self._interpolation)
+        if (waypoint_tolerance is not None and
+                self._interpolation not in REDUCIBLE_MODES + ('auto',)):
+            rospy.logwarn("%s: Waypoints of %s arm goals are only reduced "
+                          "with %s interpolation" %
+                          (self._action_name, limb,
+                           " or ".join(REDUCIBLE_MODES)))
         self._server.start()
         self._alive = True
         self._cuff_state = False
         # Action Feedback/Result
         self._fdbk = FollowJointTrajectoryFeedback()
+        # Feedback is published at its own rate, 0 publishes every tick
+        self._feedback_period = 1.0 / feedback_rate if feedback_rate > 0 else 0.0
+        self._next_feedback_time = float('-inf')
         self._result = FollowJointTrajectoryResult()
 
         # Controller parameters from arguments, messages, and dynamic
         # reconfigure
         self._control_rate = rate  # Hz
+        # Derive velocities and accelerations from the position spline
+        # instead of fitting them as extra dimensions
+        self._analytic_derivatives = analytic_derivatives
+        # Sample each goal's spline into a table at the control rate
+        # when it is accepted, instead of evaluating it every tick
+        self._discretize = discretize
+        # Pace the control loops on monotonic deadlines instead of
+        # rospy.Rate, skipping ticks that were missed
+        self._scheduler = (DeadlineScheduler(self._control_rate)
+                           if deadline_scheduler else None)
+        # Shared dual-arm control thread, steps this limb's goals in
+        # lockstep with the other limb on its own schedule
+        self._lockstep = lockstep
+        if lockstep is not None:
+            self._scheduler = lockstep.scheduler
+        # Splice goals received during execution onto the active one
+        # instead of preempting it
+        self._blend = blend
+        # The pending goal being spliced and the goal prepared for the
+        # splice, the pending goal's preemption request is handled by the
+        # blend
+        self._blending = None
+        self._splice_goal = None
+        # The last pending goal that could not be blended
+        self._blend_rejected = None
+        # Validate and fit goals on a worker thread, a new goal only
+        # takes over once its plan is ready. Blended goals are always
+        # prepared there, off the control loop.
+        self._preparer = (GoalPreparer(self._prepare_goal, self._notify_wake)
+                          if prepare_async or blend else None)
+        # Once a goal ends, hold the limb with commands at this rate
+        # instead of every control tick. The shared dual-arm thread
+        # always holds at the control rate.
+        self._hold_period = (1.0 / hold_rate
+                             if hold_rate and lockstep is None else None)
+        self._hold_on_success = hold_on_success
+        self._prep_latency = 0.0
+        # Drop goal waypoints that the fitted spline reproduces within
+        # this many radians before fitting, None fits every waypoint. Only
+        # goals interpolated in one of REDUCIBLE_MODES are reduced.
+        self._waypoint_tolerance = waypoint_tolerance
         self._control_joints = []
         self._pid_gains = {'kp': dict(), 'ki': dict(), 'kd': dict()}
         self._goal_time = 0.0
@@ -85,36 +246,201 @@ class JointTrajectoryActionServer(object):
         self._goal_error = dict()
         self._path_thresh = dict()
 
-        # Create our PID controllers
-        self._pid = dict()
-        for joint in self._limb.joint_names():
-            self._pid[joint] = baxter_control.PID()
+        # Create our PID controller, one gain per joint of the active goal
+        self._pid = ArrayPID()
 
         # Create our spline coefficients
         self._coeff = [None] * len(self._limb.joint_names())
+        # Fitted splines of recent goals, keyed on trajectory content
+        self._spline_cache = SplineCache(int(spline_cache_mb * 1024 * 1024))
 
         # Set joint state publishing to specified control rate
-        self._pub_rate = rospy.Publisher(
+        self._pub_rate = self._backend.publisher(
             '/robot/joint_state_publish_rate',
              UInt16,
              queue_size=10)
         self._pub_rate.publish(self._control_rate)
 
-        self._pub_ff_cmd = rospy.Publisher(
+        self._pub_ff_cmd = self._backend.publisher(
             self._ns + '/inverse_dynamics_command',
             JointTrajectoryPoint,
             tcp_nodelay=True,
             queue_size=1)
+        # Reused for every command, publish() serializes it immediately
+        self._ff_pnt = JointTrajectoryPoint()
+
+        # Control loop timing, per goal and over the last diagnostics period
+        self._goal_stats = LoopStats(self._control_rate)
+        self._window_stats = LoopStats(self._control_rate)
+        self._diag_period = 1.0
+        self._next_diag_time = 0.0
+        self._pub_diag = self._backend.publisher(
+            '/diagnostics',
+            DiagnosticArray,
+            queue_size=1)
+
+        # Trajectories uploaded once, fit and stored for execution by
+        # handle. The least recently executed ones are evicted when the
+        # store is full, their clients upload them again.
+        self._uploads = TrajectoryStore(int(upload_store_mb * 1024 * 1024))
+        self._handle_server = self._backend.action_server(
+            self._ns + '/execute_trajectory',
+            ExecuteTrajectoryAction,
+            self._on_handle_action,
+            self._notify_wake)
+        self._action_msgs = {
+            self._fjt_server: (self._result, self._fdbk),
+            self._handle_server: (ExecuteTrajectoryResult(),
+                                  ExecuteTrajectoryFeedback()),
+        }
+        self._upload_srv = self._backend.service(
+            self._ns + '/upload_trajectory',
+            UploadTrajectory,
+            self._on_upload)
+        self._handle_server.start()
+
+        # Timestamped setpoints streamed on a topic, executed on their own
+        # thread and taking over the limb like the goals of a third server
+        self._stream = None
+        if streaming:
+            self._stream = SetpointStream(
+                stream_lookahead, stream_timeout,
+                self._backend.publisher(self._ns + '/stream_feedback',
+                                        FollowJointTrajectoryFeedback,
+                                        queue_size=1))
+            self._action_msgs[self._stream] = (FollowJointTrajectoryResult(),
+                                               FollowJointTrajectoryFeedback())
+            self._stream_sub = self._backend.subscriber(
+                self._ns + '/stream_setpoints', JointTrajectory,
+                self._on_setpoints, tcp_nodelay=True, queue_size=10)
+            stream_thread = threading.Thread(target=self._run_streams)
+            stream_thread.daemon = True
+            stream_thread.start()
+
+    def _stats_tick(self):
+        # Marks the start of a control tick, returns the start of its
+        # first timed section
+        now = monotonic()
+        if now >= self._next_diag_time:
+            self._publish_diagnostics()
+            self._window_stats.reset()
+            self._next_diag_time = now + self._diag_period
+        self._goal_stats.tick(now)
+        self._window_stats.tick(now)
+        return monotonic()
+
+    def _stats_add(self, section, since):
+        now = monotonic()
+        self._goal_stats.add(section, now - since)
+        self._window_stats.add(section, now - since)
+        return now
+
+    def _publish_diagnostics(self):
+        summary = self._window_stats.summary()
+        status = DiagnosticStatus()
+        status.name = "%s: %s arm trajectory control loop" % (
+            self._action_name, self._name)
+        status.hardware_id = self._name
+        if summary['missed_deadlines']:
+            status.level = DiagnosticStatus.WARN
+            status.message = "Missed control deadlines"
+        else:
+            status.level = DiagnosticStatus.OK
+            status.message = "OK"
+        status.values = [KeyValue(key, str(value))
+                         for key, value in sorted(summary.items())]
+        if self._scheduler is not None:
+            status.values.append(KeyValue('scheduler_skipped_ticks',
+                                          str(self._scheduler.skipped)))
+        status.values.append(KeyValue('preparation_ms',
+                                      str(1000.0 * self._prep_latency)))
+        # Spline cache counters at the diagnostics rate instead of on the
+        # parameter server with every goal
+        status.values.extend(
+            KeyValue('spline_cache_' + key, str(value))
+            for key, value in sorted(self._spline_cache.stats().items()))
+        status.values.extend(
+            KeyValue('upload_store_' + key, str(value))
+            for key, value in sorted(self._uploads.stats().items()))
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.Time.now()
+        msg.status = [status]
+        self._pub_diag.publish(msg)
+
+    def _loop_summary(self):
+        summary = self._goal_stats.format_summary()
+        if self._scheduler is not None:
+            summary += ", scheduler %.1f Hz realized, %d ticks skipped" % (
+                self._scheduler.realized_rate, self._scheduler.skipped)
+        return summary
 
     def robot_is_enabled(self):
+        if self._lockstep is not None:
+            # Polled once per tick for both limbs
+            return self._lockstep.enabled
         return self._enable.state().enabled
 
     def clean_shutdown(self):
         self._alive = False
+        self._notify_wake()
         self._limb.exit_control_mode()
 
     def _cuff_cb(self, value):
         self._cuff_state = value
+        self._notify_wake()
+
+    def _notify_wake(self):
+        with self._wake:
+            self._wake_pending = True
+            self._wake.notify_all()
+
+    def _wait_for_wake(self, timeout):
+        # Blocks for up to timeout seconds or until _notify_wake, including
+        # a notification that came before the wait
+        with self._wake:
+            if not self._wake_pending:
+                self._wake.wait(timeout)
+            self._wake_pending = False
+
+    def _hold_paced(self):
+        # Paces an idle hold between two commands. Returns True to leave
+        # the wait to the control loop's tick, otherwise waits here for
+        # the hold period, cut short by _notify_wake.
+        if self._hold_period is None:
+            return True
+        self._wait_for_wake(self._hold_period)
+        return False
+
+    def _new_goal_ready(self):
+        # A new goal takes over right away, or with asynchronous
+        # preparation once its plan is ready
+        if self._takeovers > 0:
+            return True
+        if not self._server.is_new_goal_available():
+            return False
+        if self._preparer is None or self._server is not self._fjt_server:
+            return True
+        goal = self._server.next_goal.get_goal()
+        self._preparer.submit(goal)
+        return self._preparer.ready(goal)
+
+    def _preempt_requested(self):
+        if self._takeovers > 0:
+            # A goal of the other action server is waiting
+            return True
+        if not self._server.is_preempt_requested():
+            return False
+        if (self._blending is not None and
+                self._server.is_new_goal_available() and
+                self._server.next_goal.get_goal() is self._blending):
+            # The pending goal is spliced on instead. A cancel of the
+            # executing goal cannot be told apart from it and waits for
+            # the blended goal to take over.
+            return False
+        if self._preparer is None or not self._server.is_new_goal_available():
+            return True
+        # Keep executing while the preempting goal is prepared
+        return self._new_goal_ready()
 
     def _get_trajectory_parameters(self, joint_names, goal):
         # For each input trajectory, if path, goal, or goal_time tolerances
@@ -137,7 +463,7 @@ class JointTrajectoryActionServer(object):
                     (self._action_name, jnt,))
                 self._result.error_code = self._result.INVALID_JOINTS
                 self._server.set_aborted(self._result)
-                return
+                return False
             # Path execution tolerance
             path_error = self._dyn.config[jnt + '_trajectory']
             if goal.path_tolerance:
@@ -163,10 +489,44 @@ class JointTrajectoryActionServer(object):
 
             # PID gains if executing using the velocity (integral) controller
             if self._mode == 'velocity':
-                self._pid[jnt].set_kp(self._dyn.config[jnt + '_kp'])
-                self._pid[jnt].set_ki(self._dyn.config[jnt + '_ki'])
-                self._pid[jnt].set_kd(self._dyn.config[jnt + '_kd'])
-                self._pid[jnt].initialize()
+                for gain in self._pid_gains:
+                    self._pid_gains[gain][jnt] = \
+                        self._dyn.config[jnt + '_' + gain]
+        return True
+
+    def _set_joint_map(self, joint_names):
+        # Per goal buffers in goal joint order, reused on every tick, and
+        # the permutation from goal order to limb order
+        num_joints = len(joint_names)
+        self._cur_pos = np.zeros(num_joints)
+        self._error = np.zeros(num_joints)
+        self._set_tolerances(joint_names)
+        self._cmd = dict.fromkeys(joint_names, 0.0)
+        if self._mode == 'velocity':
+            self._pid.set_gains(
+                *[[self._pid_gains[gain][jnt] for jnt in joint_names]
+                  for gain in ('kp', 'ki', 'kd')])
+            self._pid.initialize()
+        missing = [jnt for jnt in self._limb.joint_names()
+                   if jnt not in joint_names]
+        if missing and self._mode == 'position_w_id':
+            # The inverse dynamics command needs every joint of the limb
+            rospy.logerr(
+                "%s: Trajectory Aborted - Missing Joints %s" %
+                (self._action_name, ', '.join(missing),))
+            self._result.error_code = self._result.INVALID_JOINTS
+            self._server.set_aborted(self._result)
+            return False
+        self._ff_perm = [joint_names.index(jnt) for jnt in
+                         self._limb.joint_names() if jnt in joint_names]
+        return True
+
+    def _set_tolerances(self, joint_names):
+        # Path and goal tolerances of the goal in goal joint order
+        self._path_thresh_vec = np.array(
+            [self._path_thresh[jnt] for jnt in joint_names])
+        self._goal_error_vec = np.array(
+            [self._goal_error[jnt] for jnt in joint_names])
 
     def _get_current_position(self, joint_names):
         return [self._limb.joint_angle(joint) for joint in joint_names]
@@ -175,52 +535,56 @@ class JointTrajectoryActionServer(object):
         return [self._limb.joint_velocity(joint) for joint in joint_names]
 
     def _get_current_error(self, joint_names, set_point):
-        current = self._get_current_position(joint_names)
-        error = map(operator.sub, set_point, current)
-        return zip(joint_names, error)
+        # Fills and returns the preallocated error buffer, in goal order
+        for idx, joint in enumerate(joint_names):
+            self._cur_pos[idx] = self._limb.joint_angle(joint)
+        return np.subtract(set_point, self._cur_pos, out=self._error)
 
-    def _update_feedback(self, cmd_point, jnt_names, cur_time):
+    def _update_feedback(self, cmd_point, jnt_names, cur_time, force=False):
+        # Throttled to the feedback rate unless forced. The positions and
+        # errors read by the last command are reused and the preallocated
+        # message is filled in place, publishing serializes it right away.
+        if not force and cur_time < self._next_feedback_time:
+            return
+        self._next_feedback_time = cur_time + self._feedback_period
+        time_from_start = rospy.Duration.from_sec(cur_time)
         self._fdbk.header.stamp = rospy.Duration.from_sec(rospy.get_time())
         self._fdbk.joint_names = jnt_names
-        self._fdbk.desired = cmd_point
-        self._fdbk.desired.time_from_start = rospy.Duration.from_sec(cur_time)
-        self._fdbk.actual.positions = self._get_current_position(jnt_names)
-        self._fdbk.actual.time_from_start = rospy.Duration.from_sec(cur_time)
-        self._fdbk.error.positions = map(operator.sub,
-                                         self._fdbk.desired.positions,
-                                         self._fdbk.actual.positions
-                                        )
-        self._fdbk.error.time_from_start = rospy.Duration.from_sec(cur_time)
+        self._fdbk.desired.positions = cmd_point.positions
+        self._fdbk.desired.velocities = cmd_point.velocities
+        self._fdbk.desired.accelerations = cmd_point.accelerations
+        self._fdbk.desired.time_from_start = time_from_start
+        self._fdbk.actual.positions = self._cur_pos.tolist()
+        self._fdbk.actual.time_from_start = time_from_start
+        self._fdbk.error.positions = self._error.tolist()
+        self._fdbk.error.time_from_start = time_from_start
         self._server.publish_feedback(self._fdbk)
 
-    def _reorder_joints_ff_cmd(self, joint_names, point):
-	joint_name_order = self._limb.joint_names()
-	pnt = JointTrajectoryPoint()
-	pnt.time_from_start = point.time_from_start
-	pos_cmd = dict(zip(joint_names, point.positions))
-	for jnt_name in joint_name_order:
-	    pnt.positions.append(pos_cmd[jnt_name])
-        if point.velocities:
-	    vel_cmd = dict(zip(joint_names, point.velocities))
-	    for jnt_name in joint_name_order:
-	        pnt.velocities.append(vel_cmd[jnt_name])
-        if point.accelerations:
-	    accel_cmd = dict(zip(joint_names, point.accelerations))
-	    for jnt_name in joint_name_order:
-	        pnt.accelerations.append(accel_cmd[jnt_name])
+    def _reorder_joints_ff_cmd(self, point):
+        pnt = self._ff_pnt
+        pnt.time_from_start = point.time_from_start
+        perm = self._ff_perm
+        pnt.positions = [point.positions[idx] for idx in perm]
+        pnt.velocities = ([point.velocities[idx] for idx in perm]
+                          if point.velocities else [])
+        pnt.accelerations = ([point.accelerations[idx] for idx in perm]
+                             if point.accelerations else [])
         return pnt
 
     def _command_stop(self, joint_names, joint_angles, start_time, dimensions_dict):
+        # Generator, holds the limb until a new goal arrives, one control
+        # tick per iteration or, with a hold rate, waiting on this thread
         if self._mode == 'velocity':
             velocities = [0.0] * len(joint_names)
             cmd = dict(zip(joint_names, velocities))
-            while (not self._server.is_new_goal_available() and self._alive
+            while (not self._new_goal_ready() and self._alive
                    and self.robot_is_enabled()):
                 self._limb.set_joint_velocities(cmd)
                 if self._cuff_state:
                     self._limb.exit_control_mode()
                     break
-                rospy.sleep(1.0 / self._control_rate)
+                if self._hold_paced():
+                    yield
         elif self._mode == 'position' or self._mode == 'position_w_id':
             raw_pos_mode = (self._mode == 'position_w_id')
             if raw_pos_mode:
@@ -230,92 +594,360 @@ class JointTrajectoryActionServer(object):
                     pnt.velocities = [0.0] * len(joint_names)
                 if dimensions_dict['accelerations']:
                     pnt.accelerations = [0.0] * len(joint_names)
-            while (not self._server.is_new_goal_available() and self._alive
+            while (not self._new_goal_ready() and self._alive
                    and self.robot_is_enabled()):
                 self._limb.set_joint_positions(joint_angles, raw=raw_pos_mode)
                 # zero inverse dynamics feedforward command
                 if self._mode == 'position_w_id':
                     pnt.time_from_start = rospy.Duration(rospy.get_time() - start_time)
-                    ff_pnt = self._reorder_joints_ff_cmd(joint_names, pnt)
+                    ff_pnt = self._reorder_joints_ff_cmd(pnt)
                     self._pub_ff_cmd.publish(ff_pnt)
                 if self._cuff_state:
                     self._limb.exit_control_mode()
                     break
-                rospy.sleep(1.0 / self._control_rate)
+                if self._hold_paced():
+                    yield
 
     def _command_joints(self, joint_names, point, start_time, dimensions_dict):
-        if self._server.is_preempt_requested() or not self.robot_is_enabled():
+        if self._preempt_requested() or not self.robot_is_enabled():
             rospy.loginfo("%s: Trajectory Preempted" % (self._action_name,))
             self._server.set_preempted()
-            self._command_stop(joint_names, self._limb.joint_angles(), start_time, dimensions_dict)
             return False
-        velocities = []
         deltas = self._get_current_error(joint_names, point.positions)
-        for delta in deltas:
-            if ((math.fabs(delta[1]) >= self._path_thresh[delta[0]]
-                and self._path_thresh[delta[0]] >= 0.0)) or not self.robot_is_enabled():
-                rospy.logerr("%s: Exceeded Error Threshold on %s: %s" %
-                             (self._action_name, delta[0], str(delta[1]),))
-                self._result.error_code = self._result.PATH_TOLERANCE_VIOLATED
-                self._server.set_aborted(self._result)
-                self._command_stop(joint_names, self._limb.joint_angles(), start_time, dimensions_dict)
-                return False
-            if self._mode == 'velocity':
-                velocities.append(self._pid[delta[0]].compute_output(delta[1]))
+        exceeded = np.flatnonzero((np.fabs(deltas) >= self._path_thresh_vec)
+                                  & (self._path_thresh_vec >= 0.0))
+        if len(exceeded) or not self.robot_is_enabled():
+            jnt = exceeded[0] if len(exceeded) else 0
+            rospy.logerr("%s: Exceeded Error Threshold on %s: %s" %
+                         (self._action_name, joint_names[jnt], str(deltas[jnt]),))
+            self._result.error_code = self._result.PATH_TOLERANCE_VIOLATED
+            self._server.set_aborted(self._result)
+            return False
         if ((self._mode == 'position' or self._mode == 'position_w_id')
               and self._alive):
-            cmd = dict(zip(joint_names, point.positions))
+            # The command dictionary is reused, only its values change
+            self._cmd.update(zip(joint_names, point.positions))
             raw_pos_mode = (self._mode == 'position_w_id')
-            self._limb.set_joint_positions(cmd, raw=raw_pos_mode)
+            self._limb.set_joint_positions(self._cmd, raw=raw_pos_mode)
             if raw_pos_mode:
-                ff_pnt = self._reorder_joints_ff_cmd(joint_names, point)
+                ff_pnt = self._reorder_joints_ff_cmd(point)
                 self._pub_ff_cmd.publish(ff_pnt)
         elif self._alive:
-            cmd = dict(zip(joint_names, velocities))
-            self._limb.set_joint_velocities(cmd)
+            self._cmd.update(
+                zip(joint_names, self._pid.compute_output(deltas).tolist()))
+            self._limb.set_joint_velocities(self._cmd)
         return True
 
-    def _get_bezier_point(self, b_matrix, idx, t, cmd_time, dimensions_dict):
+    def _get_bezier_point(self, spline, cmd_time, dimensions_dict):
         pnt = JointTrajectoryPoint()
         pnt.time_from_start = rospy.Duration(cmd_time)
-        num_joints = b_matrix.shape[0]
-        pnt.positions = [0.0] * num_joints
+        # Evaluate all joints and dimensions at once: joints x dimensions
+        b_point = spline.evaluate(cmd_time)
+        # Positions at specified time
+        pnt.positions = b_point[:, 0].tolist()
+        if self._analytic_derivatives:
+            # Velocities and accelerations from the position derivatives
+            pnt.velocities = spline.evaluate(cmd_time, 1)[:, 0].tolist()
+            pnt.accelerations = spline.evaluate(cmd_time, 2)[:, 0].tolist()
+            return pnt
+        # Velocities at specified time
         if dimensions_dict['velocities']:
-            pnt.velocities = [0.0] * num_joints
+            pnt.velocities = b_point[:, 1].tolist()
+        # Accelerations at specified time
         if dimensions_dict['accelerations']:
-            pnt.accelerations = [0.0] * num_joints
-        for jnt in range(num_joints):
-            b_point = bezier.bezier_point(b_matrix[jnt, :, :, :], idx, t)
-            # Positions at specified time
-            pnt.positions[jnt] = b_point[0]
-            # Velocities at specified time
-            if dimensions_dict['velocities']:
-                pnt.velocities[jnt] = b_point[1]
-            # Accelerations at specified time
-            if dimensions_dict['accelerations']:
-                pnt.accelerations[jnt] = b_point[-1]
+            pnt.accelerations = b_point[:, -1].tolist()
         return pnt
 
-    def _compute_bezier_coeff(self, joint_names, trajectory_points, dimensions_dict):
-        # Compute Full Bezier Curve
-        num_joints = len(joint_names)
-        num_traj_pts = len(trajectory_points)
-        num_traj_dim = sum(dimensions_dict.values())
-        num_b_values = len(['b0', 'b1', 'b2', 'b3'])
-        b_matrix = np.zeros(shape=(num_joints, num_traj_dim, num_traj_pts-1, num_b_values))
-        for jnt in xrange(num_joints):
-            traj_array = np.zeros(shape=(len(trajectory_points), num_traj_dim))
-            for idx, point in enumerate(trajectory_points):
-                current_point = list()
-                current_point.append(point.positions[jnt])
-                if dimensions_dict['velocities']:
-                    current_point.append(point.velocities[jnt])
-                if dimensions_dict['accelerations']:
-                    current_point.append(point.accelerations[jnt])
-                traj_array[idx, :] = current_point
-            d_pts = bezier.de_boor_control_pts(traj_array)
-            b_matrix[jnt, :, :, :] = bezier.bezier_coefficients(traj_array, d_pts)
-        return b_matrix
+    def _get_trajectory_array(self, trajectory_points, dimensions_dict):
+        # Point values as a numpy array of points x joints x dimensions
+        values = [[pnt.positions for pnt in trajectory_points]]
+        if dimensions_dict['velocities']:
+            values.append([pnt.velocities for pnt in trajectory_points])
+        if dimensions_dict['accelerations']:
+            values.append([pnt.accelerations for pnt in trajectory_points])
+        return np.array(values, dtype=float).transpose((1, 2, 0))
+
+    def _compute_bezier_coeff(self, traj_array):
+        # Compute Full Bezier Curve, every joint and dimension is a column
+        # of the same banded solve
+        (num_traj_pts, num_joints, num_traj_dim) = traj_array.shape
+        columns = traj_array.reshape(num_traj_pts, num_joints * num_traj_dim)
+        d_pts = bezier.de_boor_control_pts(columns)
+        b_matrix = bezier.bezier_coefficients(columns, d_pts)
+        return b_matrix.reshape(num_joints, num_traj_dim, num_traj_pts-1, 4)
+
+    def _compute_hermite_coeff(self, traj_array, pnt_times, trajectory_points,
+                               fit_dimensions):
+        # Cubic Hermite segments, each fitted dimension takes its tangents
+        # from the next derivative the goal supplies, else from finite
+        # differences
+        (num_traj_pts, num_joints, num_traj_dim) = traj_array.shape
+        columns = traj_array.reshape(num_traj_pts, num_joints * num_traj_dim)
+        tangents = bezier.hermite_tangents(columns, pnt_times).reshape(
+            traj_array.shape)
+        supplied = self._determine_dimensions(trajectory_points)
+        dims = [dim for dim in ('positions', 'velocities', 'accelerations')
+                if fit_dimensions[dim]]
+        for (dim, derivative) in (('positions', 'velocities'),
+                                  ('velocities', 'accelerations')):
+            if dim in dims and supplied[derivative]:
+                tangents[:, :, dims.index(dim)] = [
+                    getattr(pnt, derivative) for pnt in trajectory_points]
+        b_matrix = bezier.hermite_coefficients(
+            columns, pnt_times, tangents.reshape(columns.shape))
+        return b_matrix.reshape(num_joints, num_traj_dim, num_traj_pts-1, 4)
+
+    def _compute_linear_coeff(self, traj_array):
+        (num_traj_pts, num_joints, num_traj_dim) = traj_array.shape
+        columns = traj_array.reshape(num_traj_pts, num_joints * num_traj_dim)
+        b_matrix = bezier.linear_coefficients(columns)
+        return b_matrix.reshape(num_joints, num_traj_dim, num_traj_pts-1, 4)
+
+    def _interpolation_mode(self, pnt_times, trajectory_points):
+        # Dynamic reconfigure overrides the server's interpolation mode.
+        # Automatically, points at most two control periods apart are
+        # connected directly, through their velocities when supplied,
+        # sparser points get the Bezier fit.
+        mode = self._dyn.config['interpolation']
+        if mode == 'server':
+            mode = self._interpolation
+        if mode != 'auto':
+            return mode
+        if (len(pnt_times) > 2 and
+                np.median(np.diff(pnt_times)) <= 2.0 / self._control_rate):
+            supplied = self._determine_dimensions(trajectory_points)
+            return 'cubic_hermite' if supplied['velocities'] else 'linear'
+        return 'bezier'
+
+    def _fit_spline(self, mode, pnt_times, trajectory_points, fit_dimensions):
+        # Spline of the trajectory points in the interpolation mode
+        traj_array = self._get_trajectory_array(trajectory_points,
+                                                fit_dimensions)
+        if mode == 'linear':
+            b_matrix = self._compute_linear_coeff(traj_array)
+        elif mode == 'cubic_hermite':
+            b_matrix = self._compute_hermite_coeff(traj_array, pnt_times,
+                                                   trajectory_points,
+                                                   fit_dimensions)
+        else:
+            b_matrix = self._compute_bezier_coeff(traj_array)
+        # Convert the coefficients once so each control cycle only
+        # needs a lookup and a Horner evaluation
+        return bezier.CompiledSpline(b_matrix, pnt_times)
+
+    def _fitted_positions(self, mode, trajectory_points, times):
+        # Positions at times of the spline fitted to the trajectory points
+        # as for execution, to check waypoint reduction against
+        pnt_times = [pnt.time_from_start.to_sec() for pnt in trajectory_points]
+        fit_dimensions = self._determine_dimensions(trajectory_points)
+        if self._analytic_derivatives:
+            fit_dimensions = {'positions': True,
+                              'velocities': False,
+                              'accelerations': False}
+        spline = self._fit_spline(mode, pnt_times, trajectory_points,
+                                  fit_dimensions)
+        return spline.evaluate_many(times)[:, :, 0]
+
+    def _trajectory_key(self, joint_names, pnt_times, trajectory_points,
+                        fit_dimensions, mode):
+        # Hermite tangents come from every supplied dimension, not only
+        # the fitted ones
+        if mode == 'cubic_hermite':
+            fit_dimensions = self._determine_dimensions(trajectory_points)
+        traj_array = self._get_trajectory_array(trajectory_points,
+                                                fit_dimensions)
+        return trajectory_key(joint_names, pnt_times, traj_array,
+                              self._analytic_derivatives, mode)
+
+    def _get_spline(self, joint_names, pnt_times, trajectory_points,
+                    dimensions_dict, mode='bezier', cache=True):
+        # Trajectories that start at the current position are fit without
+        # the cache, they would hardly ever be seen again
+        if not cache:
+            return self._fit_spline(mode, pnt_times, trajectory_points,
+                                    dimensions_dict)
+        key = self._trajectory_key(joint_names, pnt_times, trajectory_points,
+                                   dimensions_dict, mode)
+        spline = self._spline_cache.get(key)
+        if spline is None:
+            spline = self._fit_spline(mode, pnt_times, trajectory_points,
+                                      dimensions_dict)
+            self._spline_cache.put(key, spline, spline.nbytes)
+        return spline
+
+    def _get_command_spline(self, spline):
+        # The spline evaluated by the control loop
+        if self._discretize:
+            orders = (0, 1, 2) if self._analytic_derivatives else (0,)
+            return bezier.SampledSpline(spline, self._control_rate, orders)
+        return spline
+
+    def _blend_goal(self, joint_names, trajectory_points, points_offset,
+                    spline, cmd_spline, fit_dimensions, now_from_start):
+        # Splices the pending goal onto the executing one, to start where
+        # the executing one ends. The pending goal is prepared on the
+        # preparation thread like any other, starting from the executing
+        # goal's last point, and only the points around the join are refit
+        # here. Returns the pending goal, its plan's points, their time
+        # offset and the spliced spline and command spline once the plan
+        # is ready, otherwise None. A pending goal that cannot be blended
+        # is left to preempt the executing one.
+        if self._server is not self._fjt_server:
+            return None
+        pending = self._server.next_goal.get_goal()
+        if pending is self._blend_rejected:
+            return None
+        if pending is not self._blending:
+            self._blending = None
+            self._blend_rejected = pending
+            points = pending.trajectory.points
+            if (pending.trajectory.joint_names != joint_names or not points or
+                    (not self._analytic_derivatives and
+                     self._determine_dimensions(points) != fit_dimensions)):
+                return None
+            # Points within a control period of the start coincide with
+            # the executing goal's last point, which is kept
+            period = 1.0 / self._control_rate
+            first = 0
+            while (first < len(points) and
+                   points[first].time_from_start.to_sec() < period):
+                first += 1
+            if first == len(points):
+                return None
+            # and have to start there, a jump at the join would violate the
+            # path tolerance
+            gap = np.fabs(np.subtract(points[0].positions,
+                                      trajectory_points[-1].positions))
+            if first and np.any((self._path_thresh_vec >= 0.0) &
+                                (gap >= self._path_thresh_vec)):
+                rospy.logwarn("%s: Next goal for %s arm does not start at the "
+                              "end of the executing trajectory, preempting "
+                              "it instead of blending" %
+                              (self._action_name, self._name))
+                return None
+            self._blend_rejected = None
+            join = copy(trajectory_points[-1])
+            join.time_from_start = rospy.Duration(0.0)
+            self._splice_goal = FollowJointTrajectoryGoal()
+            self._splice_goal.trajectory.joint_names = joint_names
+            # Copies of the points that preparing the goal modifies
+            self._splice_goal.trajectory.points = (
+                [join] + points[first:-1] + [copy(points[-1])])
+            self._blending = pending
+        self._preparer.submit(self._splice_goal)
+        if not self._preparer.ready(self._splice_goal):
+            return None
+        plan = self._preparer.take(self._splice_goal)
+        if plan.error is not None:
+            # Preempts instead, its own preparation reports the error
+            self._blending = None
+            self._blend_rejected = pending
+            return None
+        # The join is refit from a point at least a control period ahead,
+        # the commands until then stay on the executing spline
+        end_time = (trajectory_points[-1].time_from_start.to_sec() +
+                    points_offset)
+        period = 1.0 / self._control_rate
+        tail = trajectory_points[-BLEND_WINDOW-1:]
+        join_start = max(tail[0].time_from_start.to_sec() + points_offset,
+                         now_from_start + period)
+        if end_time - join_start < period:
+            join_start = end_time
+        tail = [pnt for pnt in tail if join_start + period <=
+                pnt.time_from_start.to_sec() + points_offset <=
+                end_time - period]
+        (join_spline, join_end) = self._join_spline(
+            spline, join_start, tail, points_offset, end_time, plan,
+            fit_dimensions)
+        spliced_spline = bezier.splice_splines(
+            bezier.splice_splines(spline, join_start, join_spline),
+            join_end, plan.spline, end_time)
+        spliced_cmd_spline = bezier.splice_splines(
+            bezier.splice_splines(cmd_spline, join_start, join_spline),
+            join_end, plan.cmd_spline, end_time)
+        rospy.loginfo("%s: Blending the next goal into the %s arm "
+                      "trajectory from %.3f s (%s, prepared in %.1f ms)" %
+                      (self._action_name, self._name, join_start,
+                       plan.interpolation, 1000.0 * plan.latency))
+        return (pending, plan.trajectory_points, end_time, spliced_spline,
+                spliced_cmd_spline)
+
+    def _join_spline(self, spline, join_start, tail, points_offset,
+                     end_time, plan, fit_dimensions):
+        # Cubic Hermite segments from join_start on the executing spline
+        # through the executing goal's tail points, its last point at
+        # end_time and the first points of the blended goal's plan. The
+        # ends take the derivatives of both splines, so the spliced spline
+        # stays C1. Returns the spline and the time its end joins the plan.
+        plan_points = plan.trajectory_points[1:BLEND_WINDOW+1]
+        plan_end = plan_points[-1].time_from_start.to_sec()
+        points = list(tail)
+        times = [join_start] + [pnt.time_from_start.to_sec() + points_offset
+                                for pnt in tail]
+        join = None
+        if join_start < end_time:
+            join = len(times)
+            points.append(plan.trajectory_points[0])
+            times.append(end_time)
+        points.extend(plan_points)
+        times.extend(end_time + pnt.time_from_start.to_sec()
+                     for pnt in plan_points)
+        values = np.concatenate((
+            spline.evaluate(join_start)[np.newaxis],
+            self._get_trajectory_array(points, fit_dimensions)))
+        (num_points, num_joints, num_dims) = values.shape
+        if join is not None:
+            # The last point of the executing goal was prepared to stop,
+            # velocities and accelerations through it are estimated from
+            # its neighbours
+            for dim in range(1, num_dims):
+                values[join, :, dim] = bezier.hermite_tangents(
+                    values[:, :, dim - 1], times)[join]
+        columns = values.reshape(num_points, -1)
+        tangents = bezier.hermite_tangents(columns, times)
+        tangents[0] = spline.evaluate(join_start, 1).reshape(-1)
+        tangents[-1] = plan.spline.evaluate(plan_end, 1).reshape(-1)
+        b_matrix = bezier.hermite_coefficients(columns, times, tangents)
+        return (bezier.CompiledSpline(
+            b_matrix.reshape(num_joints, num_dims, num_points - 1, 4), times),
+                end_time + plan_end)
+
+    def _finish_blended(self, joint_names, last, past_end):
+        # Finishes the executing goal once the limb passes its last point
+        # within the goal tolerance, or aborts it if the goal time passes
+        # first, then accepts the blended goal without resetting the
+        # controller. The limb does not stop at the point, so the stopped
+        # velocity tolerance does not apply. Returns True once the blended
+        # goal is accepted.
+        errors = self._get_current_error(joint_names, last.positions)
+        exceeded = np.flatnonzero((self._goal_error_vec > 0)
+                                  & (self._goal_error_vec < np.fabs(errors)))
+        if len(exceeded) and past_end < self._goal_time:
+            return False
+        loop_summary = self._loop_summary()
+        if len(exceeded):
+            rospy.logerr("%s: Exceeded Goal Threshold Error %s for %s arm "
+                         "before blending into the next goal (%s)" %
+                         (self._action_name, joint_names[exceeded[0]],
+                          self._name, loop_summary))
+            self._result.error_code = self._result.GOAL_TOLERANCE_VIOLATED
+            self._server.set_aborted(self._result)
+        else:
+            rospy.loginfo("%s: Joint Trajectory Action Succeeded for %s arm, "
+                          "blending into the next goal (%s)" %
+                          (self._action_name, self._name, loop_summary))
+            self._result.error_code = self._result.SUCCESSFUL
+            self._server.set_succeeded(self._result)
+        self._blending = None
+        goal = self._server.accept_new_goal()
+        # Same joints, only the tolerances change
+        self._get_trajectory_parameters(joint_names, goal)
+        self._set_tolerances(joint_names)
+        self._next_feedback_time = float('-inf')
+        self._goal_stats.reset()
+        rospy.loginfo("%s: Executing requested joint trajectory, blended "
+                      "into the previous one" % (self._action_name,))
+        return True
 
     def _determine_dimensions(self, trajectory_points):
         # Determine dimensions supplied
@@ -329,20 +961,217 @@ class JointTrajectoryActionServer(object):
                 'accelerations':acceleration_flag}
 
     def _on_trajectory_action(self, goal):
+        if self._preparer is not None:
+            plan = self._preparer.take(goal)
+        else:
+            plan = self._prepare_goal(goal)
+        self._execute(self._fjt_server, goal, plan,
+                      goal.trajectory.header.stamp.to_sec())
+
+    def _on_handle_action(self, goal):
+        plan = self._uploads.get(goal.handle)
+        if plan is None:
+            rospy.logerr("%s: Trajectory Aborted - Unknown Trajectory "
+                         "Handle '%s'" % (self._action_name, goal.handle))
+            (result, _) = self._action_msgs[self._handle_server]
+            result.error_code = result.INVALID_GOAL
+            self._handle_server.set_aborted(result)
+            return
+        time_scale = goal.time_scale if goal.time_scale > 0.0 else 1.0
+        self._execute(self._handle_server, goal, plan,
+                      goal.start_time.to_sec(), time_scale)
+
+    def _on_upload(self, req):
+        goal = FollowJointTrajectoryGoal()
+        goal.trajectory = req.trajectory
         joint_names = goal.trajectory.joint_names
-        trajectory_points = goal.trajectory.points
+        for jnt in joint_names:
+            if jnt not in self._limb.joint_names():
+                rospy.logerr(
+                    "%s: Upload Rejected - Provided Invalid Joint Name %s" %
+                    (self._action_name, jnt,))
+                return UploadTrajectoryResponse('')
+        # Executed from their start, an uploaded trajectory cannot skip
+        # ahead or go back in time
+        upload_times = [pnt.time_from_start.to_sec()
+                        for pnt in goal.trajectory.points]
+        if (upload_times and upload_times[0] < 0.0 or
+                any(later <= earlier for earlier, later in
+                    zip(upload_times, upload_times[1:]))):
+            rospy.logerr(
+                "%s: Upload Rejected - Point times must be non-negative "
+                "and increasing" % (self._action_name,))
+            return UploadTrajectoryResponse('')
+        plan = self._prepare_goal(goal)
+        if plan.error is not None:
+            rospy.logerr(plan.error)
+            return UploadTrajectoryResponse('')
+        pnt_times = [pnt.time_from_start.to_sec()
+                     for pnt in plan.trajectory_points]
+        handle = self._trajectory_key(joint_names, pnt_times,
+                                      plan.trajectory_points,
+                                      plan.fit_dimensions, plan.interpolation)
+        nbytes = plan.spline.nbytes
+        if plan.cmd_spline is not plan.spline:
+            nbytes += plan.cmd_spline.nbytes
+        if not self._uploads.put(handle, plan, nbytes):
+            rospy.logerr("%s: Upload Rejected - Trajectory of %.1f MB "
+                         "exceeds the trajectory store of %s arm" %
+                         (self._action_name, nbytes / 1048576.0,
+                          self._name))
+            return UploadTrajectoryResponse('')
+        rospy.loginfo("%s: Stored %d point trajectory for %s arm as %s "
+                      "(prepared in %.1f ms)" %
+                      (self._action_name, len(plan.trajectory_points),
+                       self._name, handle, 1000.0 * plan.latency))
+        return UploadTrajectoryResponse(handle)
+
+    def _execute(self, server, goal, plan, start_time, time_scale=1.0):
+        # Runs the plan for the goal of server once it has the limb
+        self._take_limb(server, lambda: self._start_trajectory(
+            goal, plan, start_time, time_scale))
+
+    def _take_limb(self, server, start):
+        # Waits for the executing goal or stream to give up the limb, then
+        # makes server the active one and runs the generator returned by
+        # start, which returns None if it aborted
+        with self._takeover_lock:
+            self._takeovers += 1
+        self._notify_wake()
+        with self._execute_lock:
+            with self._takeover_lock:
+                self._takeovers -= 1
+            self._server = server
+            (self._result, self._fdbk) = self._action_msgs[server]
+            steps = start()
+            if steps is None:
+                return
+            if self._lockstep is not None:
+                # Blocks until the dual-arm control thread has run the goal
+                self._lockstep.execute(steps)
+                return
+            if self._scheduler is not None:
+                control_rate = self._scheduler
+                control_rate.reset()
+            else:
+                control_rate = rospy.Rate(self._control_rate)
+            for _ in steps:
+                control_rate.sleep()
+
+    def _on_setpoints(self, msg):
+        try:
+            if self._stream.add(msg, rospy.get_time()):
+                # Ends a paced hold of the previous stream right away
+                self._notify_wake()
+        except ValueError as ex:
+            rospy.logerr("%s: Setpoints Rejected - %s" %
+                         (self._action_name, ex))
+
+    def _run_streams(self):
+        # Executes each new stream of setpoints until shutdown
+        while self._alive and not rospy.is_shutdown():
+            if self._stream.wait(1.0):
+                self._take_limb(self._stream, self._start_stream)
+
+    def _start_stream(self):
+        # Activates the waiting stream. Returns the generator executing it
+        # one control tick per iteration, or None if it was aborted.
+        joint_names = self._stream.start()
+        # Tolerances and gains from dynamic reconfigure
+        if not (self._get_trajectory_parameters(joint_names,
+                                                FollowJointTrajectoryGoal())
+                and self._set_joint_map(joint_names)):
+            return None
+        rospy.loginfo("%s: Executing streamed setpoints for %s arm" %
+                      (self._action_name, self._name))
+        self._next_feedback_time = float('-inf')
+        self._goal_stats.reset()
+        return self._execute_stream(joint_names)
+
+    def _start_trajectory(self, goal, plan, start_time, time_scale=1.0):
+        # Activates the prepared plan of the goal. Returns the generator
+        # executing it one control tick per iteration, or None if the
+        # goal was aborted.
+        if plan.from_current_position:
+            # The limb has moved since, start from where it is now
+            plan = self._prepare_goal(plan.goal)
+        if time_scale != 1.0 and plan.error is None:
+            plan = self._scale_plan(plan, time_scale)
+        self._prep_latency = plan.latency
+        joint_names = plan.joint_names
         # Load parameters for trajectory
-        self._get_trajectory_parameters(joint_names, goal)
+        if not self._get_trajectory_parameters(joint_names, goal):
+            return None
+        if plan.error is not None:
+            rospy.logerr(plan.error)
+            self._server.set_aborted()
+            return None
+        if not self._set_joint_map(joint_names):
+            return None
+        rospy.loginfo("%s: Executing requested joint trajectory "
+                      "(%s, prepared in %.1f ms)" %
+                      (self._action_name, plan.interpolation,
+                       1000.0 * plan.latency))
+        self._next_feedback_time = float('-inf')
+        self._goal_stats.reset()
+        # Start at the specified execution time, if not provided use now
+        if start_time == 0.0:
+            start_time = rospy.get_time()
+        return self._execute_trajectory(joint_names, plan.trajectory_points,
+                                        plan.spline, plan.cmd_spline,
+                                        plan.fit_dimensions,
+                                        plan.dimensions_dict, start_time)
+
+    def _scale_plan(self, plan, time_scale):
+        # Stretches a plan in time without refitting its spline, fitted
+        # velocities and accelerations shrink by time_scale and its square
+        start = monotonic()
+        scaled = copy(plan)
+        scaled.trajectory_points = []
+        for pnt in plan.trajectory_points:
+            scaled_pnt = JointTrajectoryPoint()
+            scaled_pnt.positions = pnt.positions
+            scaled_pnt.velocities = [vel / time_scale
+                                     for vel in pnt.velocities]
+            scaled_pnt.accelerations = [acc / time_scale**2
+                                        for acc in pnt.accelerations]
+            scaled_pnt.time_from_start = rospy.Duration(
+                pnt.time_from_start.to_sec() * time_scale)
+            scaled.trajectory_points.append(scaled_pnt)
+        value_scale = [1.0]
+        if plan.fit_dimensions['velocities']:
+            value_scale.append(1.0 / time_scale)
+        if plan.fit_dimensions['accelerations']:
+            value_scale.append(1.0 / time_scale**2)
+        scaled.spline = plan.spline.scaled(time_scale, np.array(value_scale))
+        scaled.cmd_spline = self._get_command_spline(scaled.spline)
+        scaled.latency = monotonic() - start
+        return scaled
+
+    def _prepare_goal(self, goal):
+        # Validates and fits the goal without touching the state of the
+        # executing goal, so it can run on the preparation thread
+        start = monotonic()
+        plan = TrajectoryPlan(goal)
+        joint_names = goal.trajectory.joint_names
+        # A copy, the current position may be inserted
+        trajectory_points = list(goal.trajectory.points)
         # Create a new discretized joint trajectory
         num_points = len(trajectory_points)
         if num_points == 0:
-            rospy.logerr("%s: Empty Trajectory" % (self._action_name,))
-            self._server.set_aborted()
-            return
-        rospy.loginfo("%s: Executing requested joint trajectory" %
-                      (self._action_name,))
-        rospy.logdebug("Trajectory Points: {0}".format(trajectory_points))
-        control_rate = rospy.Rate(self._control_rate)
+            plan.error = "%s: Empty Trajectory" % (self._action_name,)
+            return plan
+        # Chosen on the goal as sent, reduced waypoints are fit the same way
+        mode = self._interpolation_mode(
+            [pnt.time_from_start.to_sec() for pnt in trajectory_points],
+            trajectory_points)
+        if self._waypoint_tolerance is not None and mode in REDUCIBLE_MODES:
+            trajectory_points = reduce_points(
+                trajectory_points, self._waypoint_tolerance,
+                lambda kept, times: self._fitted_positions(mode, kept, times))
+            num_points = len(trajectory_points)
+        # Only formatted when debug logging is enabled
+        rospy.logdebug("Trajectory Points: %s", trajectory_points)
 
         dimensions_dict = self._determine_dimensions(trajectory_points)
 
@@ -359,82 +1188,186 @@ class JointTrajectoryActionServer(object):
             first_trajectory_point.time_from_start = rospy.Duration(0)
             trajectory_points.insert(0, first_trajectory_point)
             num_points = len(trajectory_points)
+            plan.from_current_position = True
 
         # Force Velocites/Accelerations to zero at the final timestep
         # if they exist in the trajectory
-        # Remove this behavior if you are stringing together trajectories,
-        # and want continuous, non-zero velocities/accelerations between
-        # trajectories
+        # To string together trajectories with continuous, non-zero
+        # velocities/accelerations between them, enable blend: a goal
+        # received during execution replaces this final point
         if dimensions_dict['velocities']:
             trajectory_points[-1].velocities = [0.0] * len(joint_names)
         if dimensions_dict['accelerations']:
             trajectory_points[-1].accelerations = [0.0] * len(joint_names)
 
-        # Compute Full Bezier Curve Coefficients for all 7 joints
+        fit_dimensions = dimensions_dict
+        if self._analytic_derivatives:
+            # Only the positions are fit, every command still carries
+            # velocities and accelerations from the spline derivatives
+            fit_dimensions = {'positions': True,
+                              'velocities': False,
+                              'accelerations': False}
+            dimensions_dict = {'positions': True,
+                               'velocities': True,
+                               'accelerations': True}
+
+        # Compute Full Curve Coefficients for all 7 joints
         pnt_times = [pnt.time_from_start.to_sec() for pnt in trajectory_points]
         try:
-            b_matrix = self._compute_bezier_coeff(joint_names,
-                                                  trajectory_points,
-                                                  dimensions_dict)
+            spline = self._get_spline(joint_names, pnt_times,
+                                      trajectory_points, fit_dimensions, mode,
+                                      cache=not plan.from_current_position)
         except Exception as ex:
-            rospy.logerr(("{0}: Failed to compute a Bezier trajectory for {1}"
-                         " arm with error \"{2}: {3}\"").format(
+            plan.error = ("{0}: Failed to compute a {1} trajectory for {2}"
+                          " arm with error \"{3}: {4}\"").format(
                                                   self._action_name,
-                                                  self._name,
-                                                  type(ex).__name__, ex))
-            self._server.set_aborted()
-            return
-        # Wait for the specified execution time, if not provided use now
-        start_time = goal.trajectory.header.stamp.to_sec()
-        if start_time == 0.0:
-            start_time = rospy.get_time()
-        baxter_dataflow.wait_for(
-            lambda: rospy.get_time() >= start_time,
-            timeout=float('inf')
-        )
+                                                  mode, self._name,
+                                                  type(ex).__name__, ex)
+            return plan
+        plan.interpolation = mode
+        plan.trajectory_points = trajectory_points
+        plan.dimensions_dict = dimensions_dict
+        plan.fit_dimensions = fit_dimensions
+        plan.spline = spline
+        plan.cmd_spline = self._get_command_spline(spline)
+        plan.latency = monotonic() - start
+        return plan
+
+    def _execute_stream(self, joint_names):
+        # Commands the streamed setpoints until the stream ends, with the
+        # path tolerance checks of a goal, then holds the last setpoint.
+        # A cuff press ends the stream, the hold then releases the limb.
+        dimensions_dict = {'positions': True,
+                           'velocities': True,
+                           'accelerations': False}
+        point = JointTrajectoryPoint()
+        start_time = rospy.get_time()
+        while (not rospy.is_shutdown() and self.robot_is_enabled() and
+               not self._cuff_state):
+            tick = self._stats_tick()
+            now = rospy.get_time()
+            setpoint = self._stream.sample(now)
+            if setpoint is None:
+                break
+            point.positions = setpoint[0].tolist()
+            point.velocities = setpoint[1].tolist()
+            point.time_from_start = rospy.Duration(now - start_time)
+            tick = self._stats_add('spline', tick)
+            command_executed = self._command_joints(joint_names, point,
+                                                    start_time,
+                                                    dimensions_dict)
+            tick = self._stats_add('command', tick)
+            self._update_feedback(point, joint_names, now - start_time)
+            self._stats_add('feedback', tick)
+            if not command_executed:
+                rospy.loginfo("%s: %s arm control loop: %s" %
+                              (self._action_name, self._name,
+                               self._loop_summary()))
+                for _ in self._command_stop(joint_names,
+                                            self._limb.joint_angles(),
+                                            start_time, dimensions_dict):
+                    yield
+                return
+            yield
+        loop_summary = self._loop_summary()
+        if self._cuff_state or not self.robot_is_enabled():
+            rospy.logerr("%s: Streamed Setpoints Aborted for %s arm, %s "
+                         "(%s)" % (self._action_name, self._name,
+                                   'cuff pressed' if self._cuff_state
+                                   else 'robot disabled', loop_summary))
+            self._server.set_aborted(self._result)
+        else:
+            rospy.loginfo("%s: Streamed Setpoints Ended for %s arm (%s)" %
+                          (self._action_name, self._name, loop_summary))
+            self._result.error_code = self._result.SUCCESSFUL
+            self._server.set_succeeded(self._result)
+        hold_angles = (dict(zip(joint_names, point.positions))
+                       if point.positions else self._limb.joint_angles())
+        for _ in self._command_stop(joint_names, hold_angles, start_time,
+                                    dimensions_dict):
+            yield
+
+    def _execute_trajectory(self, joint_names, trajectory_points, spline,
+                            cmd_spline, fit_dimensions, dimensions_dict,
+                            start_time):
+        # Wait for the start time, still honouring preemption
+        while rospy.get_time() < start_time and not rospy.is_shutdown():
+            if self._preempt_requested():
+                rospy.loginfo("%s: Trajectory Preempted" % (self._action_name,))
+                self._server.set_preempted()
+                return
+            yield
+        if self._scheduler is not None:
+            # Anchor the monotonic clock to the trajectory start
+            offset = rospy.get_time() - start_time - monotonic()
+            get_time_from_start = lambda: offset + monotonic()
+        else:
+            get_time_from_start = lambda: rospy.get_time() - start_time
         # Loop until end of trajectory time.  Provide a single time step
         # of the control rate past the end to ensure we get to the end.
         # Keep track of current indices for spline segment generation
-        now_from_start = rospy.get_time() - start_time
+        now_from_start = get_time_from_start()
+        # Once a blended goal takes over, its points are offset by the
+        # time the previous goal ended
+        points_offset = 0.0
         end_time = trajectory_points[-1].time_from_start.to_sec()
-        while (now_from_start < end_time and not rospy.is_shutdown() and
-               self.robot_is_enabled()):
+        # Pending goal spliced onto the executing one, see _blend_goal
+        splice = None
+        self._blending = None
+        while ((now_from_start < end_time or splice is not None) and
+               not rospy.is_shutdown() and self.robot_is_enabled()):
             #Acquire Mutex
-            now = rospy.get_time()
-            now_from_start = now - start_time
-            idx = bisect.bisect(pnt_times, now_from_start)
-            #Calculate percentage of time passed in this interval
-            if idx >= num_points:
-                cmd_time = now_from_start - pnt_times[-1]
-                t = 1.0
-            elif idx >= 0:
-                cmd_time = (now_from_start - pnt_times[idx-1])
-                t = cmd_time / (pnt_times[idx] - pnt_times[idx-1])
-            else:
-                cmd_time = 0
-                t = 0
-
-	    point = self._get_bezier_point(b_matrix, idx,
-                                           t, cmd_time,
-				           dimensions_dict)
+            tick = self._stats_tick()
+            now_from_start = get_time_from_start()
+            if (self._blend and self._server.is_new_goal_available() and
+                    (splice is None or
+                     self._server.next_goal.get_goal() is not splice[0])):
+                splice = self._blend_goal(joint_names, trajectory_points,
+                                          points_offset, spline, cmd_spline,
+                                          fit_dimensions, now_from_start)
+            if (splice is not None and now_from_start >= end_time and
+                    self._finish_blended(joint_names, trajectory_points[-1],
+                                         now_from_start - end_time)):
+                (_, trajectory_points, points_offset, spline,
+                 cmd_spline) = splice
+                end_time = (trajectory_points[-1].time_from_start.to_sec() +
+                            points_offset)
+                splice = None
+            point = self._get_bezier_point(
+                cmd_spline if splice is None else splice[4], now_from_start,
+                dimensions_dict)
+            tick = self._stats_add('spline', tick)
 
             # Command Joint Position, Velocity, Acceleration
             command_executed = self._command_joints(joint_names, point, start_time, dimensions_dict)
-            self._update_feedback(deepcopy(point), joint_names, now_from_start)
+            tick = self._stats_add('command', tick)
+            self._update_feedback(point, joint_names, now_from_start)
+            self._stats_add('feedback', tick)
             # Release the Mutex
             if not command_executed:
+                self._blending = None
+                rospy.loginfo("%s: %s arm control loop: %s" %
+                              (self._action_name, self._name,
+                               self._loop_summary()))
+                for _ in self._command_stop(joint_names,
+                                            self._limb.joint_angles(),
+                                            start_time, dimensions_dict):
+                    yield
                 return
-            control_rate.sleep()
+            yield
+        # A goal still being blended preempts as usual
+        self._blending = None
         # Keep trying to meet goal until goal_time constraint expired
         last = trajectory_points[-1]
-        last_time = trajectory_points[-1].time_from_start.to_sec()
+        last_time = end_time
         end_angles = dict(zip(joint_names, last.positions))
 
         def check_goal_state():
-            for error in self._get_current_error(joint_names, last.positions):
-                if (self._goal_error[error[0]] > 0
-                        and self._goal_error[error[0]] < math.fabs(error[1])):
-                    return error[0]
+            errors = self._get_current_error(joint_names, last.positions)
+            exceeded = np.flatnonzero((self._goal_error_vec > 0)
+                                      & (self._goal_error_vec < np.fabs(errors)))
+            if len(exceeded):
+                return joint_names[exceeded[0]]
             if (self._stopped_velocity > 0.0 and
                 max([abs(cur_vel) for cur_vel in self._get_current_velocities(joint_names)]) >
                     self._stopped_velocity):
@@ -444,32 +1377,47 @@ class JointTrajectoryActionServer(object):
 
         while (now_from_start < (last_time + self._goal_time)
                and not rospy.is_shutdown() and self.robot_is_enabled()):
+            tick = self._stats_tick()
             if not self._command_joints(joint_names, last, start_time, dimensions_dict):
+                rospy.loginfo("%s: %s arm control loop: %s" %
+                              (self._action_name, self._name,
+                               self._loop_summary()))
+                for _ in self._command_stop(joint_names,
+                                            self._limb.joint_angles(),
+                                            start_time, dimensions_dict):
+                    yield
                 return
-            now_from_start = rospy.get_time() - start_time
-            self._update_feedback(deepcopy(last), joint_names,
-                                  now_from_start)
-            control_rate.sleep()
+            tick = self._stats_add('command', tick)
+            now_from_start = get_time_from_start()
+            self._update_feedback(last, joint_names, now_from_start)
+            self._stats_add('feedback', tick)
+            yield
 
-        now_from_start = rospy.get_time() - start_time
-        self._update_feedback(deepcopy(last), joint_names,
-                                  now_from_start)
+        now_from_start = get_time_from_start()
+        self._get_current_error(joint_names, last.positions)
+        self._update_feedback(last, joint_names, now_from_start, force=True)
 
         # Verify goal constraint
         result = check_goal_state()
+        loop_summary = self._loop_summary()
         if result is True:
-            rospy.loginfo("%s: Joint Trajectory Action Succeeded for %s arm" %
-                          (self._action_name, self._name))
+            rospy.loginfo("%s: Joint Trajectory Action Succeeded for %s arm "
+                          "(%s)" % (self._action_name, self._name, loop_summary))
             self._result.error_code = self._result.SUCCESSFUL
             self._server.set_succeeded(self._result)
         elif result is False:
-            rospy.logerr("%s: Exceeded Max Goal Velocity Threshold for %s arm" %
-                         (self._action_name, self._name))
+            rospy.logerr("%s: Exceeded Max Goal Velocity Threshold for %s arm "
+                         "(%s)" % (self._action_name, self._name, loop_summary))
             self._result.error_code = self._result.GOAL_TOLERANCE_VIOLATED
             self._server.set_aborted(self._result)
         else:
-            rospy.logerr("%s: Exceeded Goal Threshold Error %s for %s arm" %
-                         (self._action_name, result, self._name))
+            rospy.logerr("%s: Exceeded Goal Threshold Error %s for %s arm "
+                         "(%s)" % (self._action_name, result, self._name,
+                                   loop_summary))
             self._result.error_code = self._result.GOAL_TOLERANCE_VIOLATED
             self._server.set_aborted(self._result)
-        self._command_stop(goal.trajectory.joint_names, end_angles, start_time, dimensions_dict)
\ No newline at end of file
+        if result is True and not self._hold_on_success:
+            return
+        for _ in self._command_stop(joint_names, end_angles, start_time,
+                                    dimensions_dict):
+            yield
\ No newline at end of file
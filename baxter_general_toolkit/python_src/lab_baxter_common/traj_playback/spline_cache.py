@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def trajectory_key(joint_names, pnt_times, traj_array, *options):
+    """
+    Content hash identifying a trajectory for the spline cache
+
+    @param joint_names: joint names of the trajectory
+    @param pnt_times: time from start of every point in seconds
+    @param traj_array: numpy array of the fitted point values
+    @param options: any further settings the fit depends on
+
+    @return key: hex digest of the trajectory content
+    """
+    digest = hashlib.sha1()
+    digest.update(','.join(joint_names).encode('utf-8'))
+    digest.update(repr(options).encode('utf-8'))
+    digest.update(repr(traj_array.shape).encode('utf-8'))
+    digest.update(np.ascontiguousarray(pnt_times, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(traj_array, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class BoundedLRU(object):
+    def __init__(self, max_bytes):
+        """
+        Least recently used entries by key, bounded by the memory held
+        by the entries
+
+        @param max_bytes: memory cap of all entries, 0 stores nothing
+        """
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Looks up an entry, marking it as most recently used
+
+        @param key: key of the entry
+
+        @return entry: the entry, or None if the key is unknown
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+            return entry[0]
+
+    def put(self, key, entry, nbytes):
+        """
+        Adds an entry, evicting the least recently used entries to stay
+        under the memory cap. An entry already under key is replaced.
+
+        @param key: key of the entry
+        @param entry: the entry to store
+        @param nbytes: memory held by the entry
+
+        @return stored: False if the entry alone exceeds the memory cap
+        """
+        if nbytes > self._max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            while self._entries and self._bytes + nbytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[1]
+                self.evictions += 1
+            self._entries[key] = (entry, nbytes)
+            self._bytes += nbytes
+            return True
+
+    def stats(self):
+        """
+        @return stats: dictionary of entries, bytes and evictions
+        """
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'bytes': self._bytes,
+                    'evictions': self.evictions}
+
+
+class SplineCache(BoundedLRU):
+    def __init__(self, max_bytes):
+        """
+        Least recently used cache of fitted splines by trajectory_key(),
+        bounded by the memory held by the cached splines. Counts its
+        hits and misses.
+
+        @param max_bytes: memory cap of all cached splines, 0 disables
+        """
+        super(SplineCache, self).__init__(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        spline = super(SplineCache, self).get(key)
+        with self._lock:
+            if spline is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return spline
+
+    def stats(self):
+        """
+        @return stats: dictionary of hits, misses, entries, bytes and
+                       evictions
+        """
+        stats = super(SplineCache, self).stats()
+        with self._lock:
+            stats.update(hits=self.hits, misses=self.misses)
+        return stats
+
+
+class TrajectoryStore(BoundedLRU):
+    """
+    Uploaded trajectories by handle, bounded by the memory held by the
+    stored entries. The least recently used entries are evicted to make
+    room, a client executing an evicted handle is told that it is unknown
+    and uploads its trajectory again.
+    """
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import bisect
+import threading
+import numpy as np
+
+
+class SetpointStream(object):
+    def __init__(self, lookahead=0.02, timeout=0.2, publisher=None):
+        """
+        Timestamped joint setpoints streamed on a topic, played back a
+        fixed look-ahead behind their timestamps so the control loop can
+        interpolate between the two setpoints around every tick.
+
+        To the trajectory server's control loop a stream looks like an
+        action server whose goal is the stream: it starts with the first
+        setpoint, ends once no setpoint arrived for timeout seconds, and
+        takes its result and feedback. A stream that was aborted or
+        preempted ignores setpoints until the sender pauses for timeout
+        seconds, so a sender that keeps streaming does not take the limb
+        back right away.
+
+        @param lookahead: delay of the playback behind the setpoint
+                          timestamps in seconds, the setpoints arriving
+                          within it are interpolated
+        @param timeout: silence in seconds after which the stream ends
+        @param publisher: publishes the feedback of the control loop,
+                          None drops it
+        """
+        self._lookahead = lookahead
+        self._timeout = timeout
+        self._publisher = publisher
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._times = []
+        self._positions = []
+        self._last_received = float('-inf')
+        self._active = False
+        self._blocked = False
+        self.joint_names = None
+        # Final state of the last stream, like a goal's
+        self.state = None
+
+    def add(self, msg, now):
+        """
+        Buffers the points of a JointTrajectory message, each at the
+        header stamp plus its time_from_start. A zero stamp means now.
+        Points not later than the newest buffered one are dropped.
+
+        @param msg: trajectory_msgs/JointTrajectory
+        @param now: current time in seconds
+        @return: True if the message starts a new stream
+        @raise ValueError: if the joints differ from those of the
+                           running stream
+        """
+        stamp = msg.header.stamp.to_sec() or now
+        with self._lock:
+            if self._blocked:
+                if now - self._last_received < self._timeout:
+                    self._last_received = now
+                    return False
+                self._blocked = False
+            self._last_received = now
+            started = not (self._active or self._pending.is_set())
+            if started:
+                self.joint_names = list(msg.joint_names)
+                del self._times[:]
+                del self._positions[:]
+            elif list(msg.joint_names) != self.joint_names:
+                raise ValueError("setpoint joints %s differ from the "
+                                 "stream's %s" % (list(msg.joint_names),
+                                                  self.joint_names))
+            for point in msg.points:
+                point_time = stamp + point.time_from_start.to_sec()
+                if self._times and point_time <= self._times[-1]:
+                    continue
+                self._times.append(point_time)
+                self._positions.append(np.array(point.positions,
+                                                dtype=float))
+            if started and self._times:
+                self._pending.set()
+            return started and bool(self._times)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until a new stream is waiting to be started
+
+        @param timeout: maximum wait in seconds, None waits forever
+        @return: True if a stream is waiting
+        """
+        return self._pending.wait(timeout)
+
+    def start(self):
+        """
+        Starts the waiting stream
+
+        @return: joint names of the stream
+        """
+        with self._lock:
+            self._pending.clear()
+            self._active = True
+            self.state = 'active'
+            return self.joint_names
+
+    def sample(self, now):
+        """
+        Setpoint of the playback time, now minus the look-ahead, linearly
+        interpolated between the buffered setpoints around it. Before the
+        first setpoint that one is held, and past the last one the last
+        is held until the stream times out.
+
+        @param now: current time in seconds
+        @return: positions and velocities, or None once the stream ended
+        """
+        playback = now - self._lookahead
+        with self._lock:
+            times = self._times
+            # Setpoints before the one at or before playback are done
+            done = bisect.bisect_right(times, playback) - 1
+            if done > 0:
+                del times[:done]
+                del self._positions[:done]
+            if len(times) > 1 and times[0] < playback:
+                fraction = (playback - times[0]) / (times[1] - times[0])
+                step = self._positions[1] - self._positions[0]
+                return (self._positions[0] + fraction * step,
+                        step / (times[1] - times[0]))
+            if (playback > times[-1] and
+                    now - self._last_received > self._timeout):
+                return None
+            return (self._positions[0], np.zeros(len(self._positions[0])))
+
+    def _finish(self, state, block):
+        with self._lock:
+            self._active = False
+            self._blocked = block
+            self.state = state
+
+    # Action server calls of the trajectory server's control loop
+
+    def is_new_goal_available(self):
+        return self._pending.is_set()
+
+    def is_preempt_requested(self):
+        return False
+
+    def set_succeeded(self, result=None, text=''):
+        self._finish('succeeded', False)
+
+    def set_aborted(self, result=None, text=''):
+        self._finish('aborted', True)
+
+    def set_preempted(self, result=None, text=''):
+        self._finish('preempted', True)
+
+    def publish_feedback(self, feedback):
+        if self._publisher is not None:
+            self._publisher.publish(feedback)
@@ -1,19 +1,30 @@
 
 import rospy
 import actionlib
-from copy import deepcopy, copy
+from copy import copy
 import threading
 import operator
 import bisect
+import numpy as np
 import baxter_interface
+from waypoints import reduce_points, fitted_positions
+from parse_cache import load_csv
+from retime import segment_durations
 from baxter_interface import CHECK_VERSION
-from trajectory_msgs.msg import JointTrajectoryPoint
+from trajectory_msgs.msg import (
+    JointTrajectory,
+    JointTrajectoryPoint,
+)
 from control_msgs.msg import (
     FollowJointTrajectoryAction,
-    FollowJointTrajectoryFeedback,
-    FollowJointTrajectoryResult,
     FollowJointTrajectoryGoal,
 )
+from baxter_general_toolkit.msg import (
+    ExecuteTrajectoryAction,
+    ExecuteTrajectoryGoal,
+    ExecuteTrajectoryResult,
+)
+from baxter_general_toolkit.srv import UploadTrajectory
 
 class Trajectory(object):
     def __init__(self):
@@ -39,6 +50,22 @@ class Trajectory(object):
         #create our goal request
         self._l_goal = FollowJointTrajectoryGoal()
         self._r_goal = FollowJointTrajectoryGoal()
+        #goals executing uploaded trajectories by handle, see upload()
+        self._l_exec_goal = None
+        self._r_exec_goal = None
+        self._left_exec_client = None
+        self._right_exec_client = None
+        #moves to the start of the uploaded trajectories, sent before them
+        self._l_start_goal = None
+        self._r_start_goal = None
+        #time of the first recorded point, where uploaded trajectories
+        #start
+        self._upload_offset = rospy.Duration(0.0)
+        #added to the time from start of execution feedback
+        self._feedback_offset = rospy.Duration(0.0)
+        #whether the trajectory servers offer trajectory upload, checked
+        #once by the first upload()
+        self._upload_available = None
 
         #limb interface - current angles needed for start move
         self._l_arm = baxter_interface.Limb('left')
@@ -100,30 +127,17 @@ class Trajectory(object):
             rate.sleep()
             now_from_start = rospy.get_time() - start_time
 
-    def _clean_line(self, line, joint_names):
+    def _points(self, positions, stamps):
         """
-        Cleans a single line of recorded joint positions
+        Creates trajectory points in bulk
 
-        @param line: the line described in a list to process
-        @param joint_names: joint name keys
+        @param positions: points x joints array of joint positions
+        @param stamps: time from start of each point as rospy.Duration
 
-        @return command: returns dictionary {joint: value} of valid commands
-        @return line: returns list of current line values stripped of commas
+        @return points: list of JointTrajectoryPoint
         """
-        def try_float(x):
-            try:
-                return float(x)
-            except ValueError:
-                return None
-        #convert the line of strings to a float or None
-        line = [try_float(x) for x in line.rstrip().split(',')]
-        #zip the values with the joint names
-        combined = zip(joint_names[1:], line[1:])
-        #take out any tuples that have a none value
-        cleaned = [x for x in combined if x[1] is not None]
-        #convert it to a dictionary with only valid commands
-        command = dict(cleaned)
-        return (command, line,)
+        return [JointTrajectoryPoint(positions=pos, time_from_start=stamp)
+                for (pos, stamp) in zip(positions.tolist(), stamps)]
 
     def _add_point(self, positions, side, time):
         """
@@ -146,17 +160,83 @@ class Trajectory(object):
         elif side == 'right_gripper':
             self._r_grip.trajectory.points.append(point)
 
-    def parse_file(self, filename):
+    def _retime(self, speed_scale):
+        """
+        Replaces the recorded timing of the arm and gripper trajectories
+        with the fastest one within the default joint velocities and
+        accelerations. Pauses are dropped except while a gripper moves.
+
+        @param speed_scale: fraction of the default joint velocities
+        """
+        l_points = self._l_goal.trajectory.points
+        r_points = self._r_goal.trajectory.points
+        names = (self._l_goal.trajectory.joint_names +
+                 self._r_goal.trajectory.joint_names)
+        #both arms share one timeline, so they are retimed together
+        positions = np.array([list(l_pnt.positions) + list(r_pnt.positions)
+                              for l_pnt, r_pnt in zip(l_points, r_points)])
+        times = np.array([pnt.time_from_start.to_sec() for pnt in l_points])
+        vel_param = self._param_ns + "%s_default_velocity"
+        acc_param = self._param_ns + "%s_default_acceleration"
+        max_vel = [rospy.get_param(vel_param % name, 0.25) for name in names]
+        max_acc = [rospy.get_param(acc_param % name, 1.0) for name in names]
+        #gripper points start at the first recorded row, the arm points
+        #at the current pose before it; a gripper command change keeps
+        #the recorded duration of its arm segment and of the pause after
+        #it, so the gripper has time to act before the arm moves on
+        grips = [[l_pnt.positions[0], r_pnt.positions[0]]
+                 for l_pnt, r_pnt in zip(self._l_grip.trajectory.points,
+                                         self._r_grip.trajectory.points)]
+        min_durations = np.zeros(len(times) - 1)
+        if len(grips) > 1:
+            still = ~np.any(np.diff(positions, axis=0) != 0.0, axis=1)
+            changed = np.flatnonzero(
+                np.any(np.diff(grips, axis=0) != 0.0, axis=1)) + 1
+            for start in changed:
+                end = start + 1
+                while end < len(still) and still[end]:
+                    end += 1
+                min_durations[start:end] = np.diff(times)[start:end]
+        durations = segment_durations(positions, max_vel, max_acc,
+                                      speed_scale, min_durations)
+        new_times = np.concatenate(([0.0], np.cumsum(durations)))
+        #repeated points would share a time with the one before them
+        keep = np.concatenate(([True], durations > 0.0))
+        for points in (l_points, r_points):
+            for pnt, new_time in zip(points, new_times):
+                pnt.time_from_start = rospy.Duration(new_time)
+        self._l_goal.trajectory.points = [pnt for pnt, kept in zip(l_points, keep) if kept]
+        self._r_goal.trajectory.points = [pnt for pnt, kept in zip(r_points, keep) if kept]
+        for goal in (self._l_grip, self._r_grip):
+            for pnt in goal.trajectory.points:
+                pnt.time_from_start = rospy.Duration(float(np.interp(
+                    pnt.time_from_start.to_sec(), times, new_times)))
+        self._slow_move_offset = new_times[1]
+        self._trajectory_start_offset = rospy.Duration(new_times[1])
+
+    def parse_file(self, filename, tolerance=None, speed_scale=None,
+                   use_cache=True):
         """
         Parses input file into FollowJointTrajectoryGoal format
 
         @param filename: input filename
+        @param tolerance: drop arm waypoints that the trajectory server's
+                          interpolation reproduces within this many
+                          radians, scalar or per joint in goal order;
+                          None keeps every row. Only reduced when the
+                          server interpolates linearly or with cubic
+                          Hermite segments.
+        @param speed_scale: replace the recorded timing with the fastest
+                            one at this fraction of the default joint
+                            velocities; None keeps the recorded timing
+        @param use_cache: read the file through its parse cache, see
+                          parse_cache.load_csv
         """
-        #open recorded file
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-        #read joint names specified in file
-        joint_names = lines[0].rstrip().split(',')
+        #uploaded trajectories no longer match
+        self._l_exec_goal = None
+        self._r_exec_goal = None
+        #read the recorded file into columns
+        (joint_names, values, valid) = load_csv(filename, use_cache)
         #parse joint names for the left and right limbs
         for name in joint_names:
             if 'left' == name[:-3]:
@@ -164,66 +244,123 @@ class Trajectory(object):
             elif 'right' == name[:-3]:
                 self._r_goal.trajectory.joint_names.append(name)
 
-        def find_start_offset(pos):
-            #create empty lists
-            cur = []
-            cmd = []
-            dflt_vel = []
-            vel_param = self._param_ns + "%s_default_velocity"
-            #for all joints find our current and first commanded position
-            #reading default velocities from the parameter server if specified
-            for name in joint_names:
-                if 'left' == name[:-3]:
-                    cmd.append(pos[name])
-                    cur.append(self._l_arm.joint_angle(name))
-                    prm = rospy.get_param(vel_param % name, 0.25)
-                    dflt_vel.append(prm)
-                elif 'right' == name[:-3]:
-                    cmd.append(pos[name])
-                    cur.append(self._r_arm.joint_angle(name))
-                    prm = rospy.get_param(vel_param % name, 0.25)
-                    dflt_vel.append(prm)
-            diffs = map(operator.sub, cmd, cur)
-            diffs = map(operator.abs, diffs)
-            #determine the largest time offset necessary across all joints
-            offset = max(map(operator.div, diffs, dflt_vel))
-            return offset
-
-        for idx, values in enumerate(lines[1:]):
-            #clean each line of file
-            cmd, values = self._clean_line(values, joint_names)
-            #find allowable time offset for move to start position
-            if idx == 0:
-                # Set the initial position to be the current pose.
-                # This ensures we move slowly to the starting point of the
-                # trajectory from the current pose - The user may have moved
-                # arm since recording
-                cur_cmd = [self._l_arm.joint_angle(jnt) for jnt in self._l_goal.trajectory.joint_names]
-                self._add_point(cur_cmd, 'left', 0.0)
-                cur_cmd = [self._r_arm.joint_angle(jnt) for jnt in self._r_goal.trajectory.joint_names]
-                self._add_point(cur_cmd, 'right', 0.0)
-                start_offset = find_start_offset(cmd)
-                # Gripper playback won't start until the starting movement's
-                # duration has passed, and the actual trajectory playback begins
-                self._slow_move_offset = start_offset
-                self._trajectory_start_offset = rospy.Duration(start_offset + values[0])
-            #add a point for this set of commands with recorded time
-            cur_cmd = [cmd[jnt] for jnt in self._l_goal.trajectory.joint_names]
-            self._add_point(cur_cmd, 'left', values[0] + start_offset)
-            cur_cmd = [cmd[jnt] for jnt in self._r_goal.trajectory.joint_names]
-            self._add_point(cur_cmd, 'right', values[0] + start_offset)
-            cur_cmd = [cmd['left_gripper']]
-            self._add_point(cur_cmd, 'left_gripper', values[0] + start_offset)
-            cur_cmd = [cmd['right_gripper']]
-            self._add_point(cur_cmd, 'right_gripper', values[0] + start_offset)
+        if not len(values):
+            return
+        #columns of the joints in goal order and of the grippers
+        column = dict((name, idx) for idx, name in enumerate(joint_names))
+        l_cols = [column[jnt] for jnt in self._l_goal.trajectory.joint_names]
+        r_cols = [column[jnt] for jnt in self._r_goal.trajectory.joint_names]
+        l_grip_cols = [column['left_gripper']]
+        r_grip_cols = [column['right_gripper']]
+        #a blank or invalid cell is missing from its row, which fails for
+        #the time and every commanded joint
+        used = [0] + l_cols + r_cols + l_grip_cols + r_grip_cols
+        missing = np.argwhere(~valid[:, used])
+        if len(missing):
+            raise KeyError(joint_names[used[missing[0][1]]])
+        #find allowable time offset for move to start position
+        start_offset = float(self._start_offset(joint_names,
+                                                dict(zip(joint_names,
+                                                         values[0]))))
+        # Set the initial position to be the current pose.
+        # This ensures we move slowly to the starting point of the
+        # trajectory from the current pose - The user may have moved
+        # arm since recording
+        cur_cmd = [self._l_arm.joint_angle(jnt) for jnt in self._l_goal.trajectory.joint_names]
+        self._add_point(cur_cmd, 'left', 0.0)
+        cur_cmd = [self._r_arm.joint_angle(jnt) for jnt in self._r_goal.trajectory.joint_names]
+        self._add_point(cur_cmd, 'right', 0.0)
+        # Gripper playback won't start until the starting movement's
+        # duration has passed, and the actual trajectory playback begins
+        self._slow_move_offset = start_offset
+        self._trajectory_start_offset = rospy.Duration(
+            start_offset + float(values[0, 0]))
+        #add the points of all rows with their recorded times, the rows
+        #of the four trajectories share their time stamps
+        stamps = [rospy.Duration(secs) for secs in
+                  (values[:, 0] + start_offset).tolist()]
+        self._l_goal.trajectory.points.extend(
+            self._points(values[:, l_cols], stamps))
+        self._r_goal.trajectory.points.extend(
+            self._points(values[:, r_cols], stamps))
+        self._l_grip.trajectory.points.extend(
+            self._points(values[:, l_grip_cols], stamps))
+        self._r_grip.trajectory.points.extend(
+            self._points(values[:, r_grip_cols], stamps))
+        if speed_scale is not None:
+            self._retime(speed_scale)
+        #thin out densely recorded arm waypoints, gripper commands are kept;
+        #the first recorded row stays, it is where an uploaded trajectory
+        #of either arm starts
+        if tolerance is not None:
+            for (side, goal) in (('left', self._l_goal),
+                                 ('right', self._r_goal)):
+                mode = self._interpolation(side)
+                if mode not in ('linear', 'cubic_hermite'):
+                    rospy.logwarn("Keeping every %s arm waypoint, the "
+                                  "trajectory server interpolates them with "
+                                  "%s instead of linear or cubic_hermite" %
+                                  (side, mode))
+                    continue
+                goal.trajectory.points = reduce_points(
+                    goal.trajectory.points, tolerance,
+                    lambda kept, times: fitted_positions(
+                        mode,
+                        [pnt.time_from_start.to_sec() for pnt in kept],
+                        [pnt.positions for pnt in kept], times),
+                    pinned=[1])
+
+    def _start_offset(self, joint_names, pos):
+        """
+        @param joint_names: joints of both arms
+        @param pos: dictionary of joint positions to move to
+
+        @return offset: time to move there from the current pose at the
+                        default joint velocities
+        """
+        #create empty lists
+        cur = []
+        cmd = []
+        dflt_vel = []
+        vel_param = self._param_ns + "%s_default_velocity"
+        #for all joints find our current and first commanded position
+        #reading default velocities from the parameter server if specified
+        for name in joint_names:
+            if 'left' == name[:-3]:
+                cmd.append(pos[name])
+                cur.append(self._l_arm.joint_angle(name))
+                prm = rospy.get_param(vel_param % name, 0.25)
+                dflt_vel.append(prm)
+            elif 'right' == name[:-3]:
+                cmd.append(pos[name])
+                cur.append(self._r_arm.joint_angle(name))
+                prm = rospy.get_param(vel_param % name, 0.25)
+                dflt_vel.append(prm)
+        diffs = map(operator.sub, cmd, cur)
+        diffs = map(operator.abs, diffs)
+        #determine the largest time offset necessary across all joints
+        offset = max(map(operator.div, diffs, dflt_vel))
+        return offset
+
+    def _interpolation(self, side):
+        """
+        @return mode: interpolation mode of the side's trajectory server,
+                      set by dynamic reconfigure or else by the server
+        """
+        mode = rospy.get_param(self._param_ns + 'interpolation', 'server')
+        if mode == 'server':
+            mode = rospy.get_param('robot/limb/%s/interpolation' % (side,),
+                                   'bezier')
+        return mode
 
     def _feedback(self, data):
         # Test to see if the actual playback time has exceeded
         # the move-to-start-pose timing offset
+        time_from_start = data.actual.time_from_start + self._feedback_offset
         if (not self._get_trajectory_flag() and
-              data.actual.time_from_start >= self._trajectory_start_offset):
+              time_from_start >= self._trajectory_start_offset):
             self._set_trajectory_flag(value=True)
-            self._trajectory_actual_offset = data.actual.time_from_start
+            self._trajectory_actual_offset = time_from_start
 
     def _set_trajectory_flag(self, value=False):
         with self._lock:
@@ -237,12 +374,147 @@ class Trajectory(object):
             temp_flag = self._arm_trajectory_started
         return temp_flag
 
+    def _recorded_trajectory(self, goal):
+        """
+        @param goal: parsed arm goal
+
+        @return trajectory: the goal's trajectory without its first point,
+                            the pose at parse time, and starting at zero,
+                            so that the same recording uploads the same
+                            trajectory on every playback
+        """
+        points = goal.trajectory.points[1:]
+        trajectory = JointTrajectory()
+        trajectory.joint_names = goal.trajectory.joint_names
+        trajectory.points = [
+            JointTrajectoryPoint(positions=pnt.positions,
+                                 time_from_start=(pnt.time_from_start -
+                                                  self._upload_offset))
+            for pnt in points]
+        return trajectory
+
+    def upload(self):
+        """
+        Uploads the recorded arm trajectories to the trajectory servers,
+        so that start() only has to move the arms to their start and
+        send their handles. Worth it for trajectories played more than
+        once.
+
+        @return True if both trajectories were stored, otherwise start()
+                sends the full trajectories
+        """
+        self._l_exec_goal = None
+        self._r_exec_goal = None
+        if len(self._l_goal.trajectory.points) < 2:
+            return False
+        #time of the first recorded row, shared by both arms
+        self._upload_offset = self._trajectory_start_offset
+        trajectories = [self._recorded_trajectory(goal)
+                        for goal in (self._l_goal, self._r_goal)]
+        names = ['robot/limb/%s/upload_trajectory' % (side,)
+                 for side in ('left', 'right')]
+        if self._upload_available is None:
+            try:
+                for name in names:
+                    rospy.wait_for_service(name, 1.0)
+                self._upload_available = True
+            except rospy.ROSException:
+                rospy.logwarn("Trajectory servers do not offer trajectory "
+                              "upload, sending full trajectories instead")
+                self._upload_available = False
+        if not self._upload_available:
+            return False
+        handles = []
+        for name, trajectory in zip(names, trajectories):
+            try:
+                upload = rospy.ServiceProxy(name, UploadTrajectory)
+                handles.append(upload(trajectory).handle)
+            except (rospy.ROSException, rospy.ServiceException) as ex:
+                rospy.logwarn("Trajectory upload failed, sending full "
+                              "trajectories instead: %s" % (ex,))
+                return False
+        if not all(handles):
+            rospy.logwarn("Trajectory upload rejected, sending full "
+                          "trajectories instead")
+            return False
+        if self._left_exec_client is None:
+            self._left_exec_client = actionlib.SimpleActionClient(
+                'robot/limb/left/execute_trajectory',
+                ExecuteTrajectoryAction,
+            )
+            self._right_exec_client = actionlib.SimpleActionClient(
+                'robot/limb/right/execute_trajectory',
+                ExecuteTrajectoryAction,
+            )
+        if not (self._left_exec_client.wait_for_server(rospy.Duration(10.0))
+                and self._right_exec_client.wait_for_server(
+                    rospy.Duration(10.0))):
+            rospy.logwarn("Execute trajectory action server not available, "
+                          "sending full trajectories instead")
+            return False
+        self._l_start_goal = FollowJointTrajectoryGoal()
+        self._r_start_goal = FollowJointTrajectoryGoal()
+        for start_goal, trajectory in zip((self._l_start_goal,
+                                           self._r_start_goal), trajectories):
+            #a single point, the server moves there from the current pose
+            start_goal.trajectory.joint_names = trajectory.joint_names
+            start_goal.trajectory.points = [
+                JointTrajectoryPoint(positions=trajectory.points[0].positions)]
+        self._l_exec_goal = ExecuteTrajectoryGoal(handle=handles[0])
+        self._r_exec_goal = ExecuteTrajectoryGoal(handle=handles[1])
+        return True
+
+    def _move_to_start(self):
+        """
+        Moves both arms from their current pose to the start of the
+        uploaded trajectories at the default joint velocities
+
+        @return True if both arms got there
+        """
+        names = (self._l_start_goal.trajectory.joint_names +
+                 self._r_start_goal.trajectory.joint_names)
+        positions = (list(self._l_start_goal.trajectory.points[0].positions) +
+                     list(self._r_start_goal.trajectory.points[0].positions))
+        #points at the same time cannot be fit
+        offset = max(float(self._start_offset(names,
+                                              dict(zip(names, positions)))),
+                     0.1)
+        for goal in (self._l_start_goal, self._r_start_goal):
+            goal.trajectory.points[0].time_from_start = rospy.Duration(offset)
+        self._left_client.send_goal(self._l_start_goal)
+        self._right_client.send_goal(self._r_start_goal)
+        time_buffer = rospy.get_param(self._param_ns + 'goal_time', 0.0) + 1.5
+        timeout = rospy.Duration(offset + time_buffer)
+        finished = [client.wait_for_result(timeout)
+                    for client in (self._left_client, self._right_client)]
+        return all(finished) and all(
+            client.get_state() == actionlib.GoalStatus.SUCCEEDED
+            for client in (self._left_client, self._right_client))
+
+    def _active_clients(self):
+        # Clients of the action the trajectories are executed with
+        if self._l_exec_goal is not None:
+            return (self._left_exec_client, self._right_exec_client)
+        return (self._left_client, self._right_client)
+
     def start(self):
         """
-        Sends FollowJointTrajectoryAction request
+        Sends FollowJointTrajectoryAction request, or if the trajectories
+        were uploaded, moves the arms to their start and sends their handles
         """
-        self._left_client.send_goal(self._l_goal, feedback_cb=self._feedback)
-        self._right_client.send_goal(self._r_goal, feedback_cb=self._feedback)
+        (left_client, right_client) = self._active_clients()
+        if self._l_exec_goal is not None:
+            if not self._move_to_start():
+                rospy.logwarn("Arms did not reach the start of the uploaded "
+                              "trajectories")
+            #uploaded trajectories start at the first recorded point
+            self._feedback_offset = self._upload_offset
+            left_client.send_goal(self._l_exec_goal, feedback_cb=self._feedback)
+            right_client.send_goal(self._r_exec_goal, feedback_cb=self._feedback)
+        else:
+            self._feedback_offset = rospy.Duration(0.0)
+            left_client.send_goal(self._l_goal, feedback_cb=self._feedback)
+            right_client.send_goal(self._r_goal, feedback_cb=self._feedback)
         # Syncronize playback by waiting for the trajectories to start
         while not rospy.is_shutdown() and not self._get_trajectory_flag():
             rospy.sleep(0.05)     
@@ -250,23 +522,23 @@ class Trajectory(object):
 
     def stop(self):
         """
-        Preempts trajectory execution by sending cancel goals
+        Preempts trajectory execution by sending cancel goals, also to
+        a move to the start of uploaded trajectories
         """
-        if (self._left_client.gh is not None and
-            self._left_client.get_state() == actionlib.GoalStatus.ACTIVE):
-            self._left_client.cancel_goal()
-
-        if (self._right_client.gh is not None and
-            self._right_client.get_state() == actionlib.GoalStatus.ACTIVE):
-            self._right_client.cancel_goal()
+        clients = [self._left_client, self._right_client]
+        if self._left_exec_client is not None:
+            clients.extend([self._left_exec_client, self._right_exec_client])
+        for client in clients:
+            if (client.gh is not None and
+                client.get_state() == actionlib.GoalStatus.ACTIVE):
+                client.cancel_goal()
 
         #delay to allow for terminating handshake
         rospy.sleep(0.1)
 
-    def wait(self):
-        """
-        Waits for and verifies trajectory execution result
-        """
+    def _wait_results(self):
+        # Waits for both arms, returns whether they finished and their
+        # error codes, None for an arm without a result
         #create a timeout for our trajectory execution
         #total time trajectory expected for trajectory execution plus a buffer
         last_time = self._r_goal.trajectory.points[-1].time_from_start.to_sec()
@@ -275,13 +547,31 @@ class Trajectory(object):
                                  last_time +
                                  time_buffer)
 
-        l_finish = self._left_client.wait_for_result(timeout)
-        r_finish = self._right_client.wait_for_result(timeout)
-        l_result = (self._left_client.get_result().error_code == 0)
-        r_result = (self._right_client.get_result().error_code == 0)
+        (left_client, right_client) = self._active_clients()
+        finished = [left_client.wait_for_result(timeout),
+                    right_client.wait_for_result(timeout)]
+        codes = [getattr(client.get_result(), 'error_code', None)
+                 for client in (left_client, right_client)]
+        return (finished, codes)
+
+    def wait(self):
+        """
+        Waits for and verifies trajectory execution result. If a trajectory
+        server no longer knows an uploaded trajectory, e.g. after a restart,
+        the trajectories are uploaded again, or sent in full if that fails,
+        and started once more.
+        """
+        (finished, codes) = self._wait_results()
+        if (self._l_exec_goal is not None and
+                ExecuteTrajectoryResult.INVALID_GOAL in codes):
+            rospy.logwarn("Uploaded trajectory unknown to the trajectory "
+                          "server, uploading the trajectories again")
+            self.upload()
+            self.start()
+            (finished, codes) = self._wait_results()
 
         #verify result
-        if all([l_finish, r_finish, l_result, r_result]):
+        if all(finished) and codes == [0, 0]:
             return True
         else:
             msg = ("Trajectory action failed or did not finish before "
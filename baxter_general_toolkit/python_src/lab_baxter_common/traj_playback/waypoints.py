@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+import numpy as np
+import bezier
+
+
+def _joint_tolerance(tolerance, num_joints):
+    # Tolerance of every joint from a scalar or per joint tolerance
+    return np.asarray(tolerance, dtype=float) * np.ones(num_joints)
+
+
+def _deviation_ratio(positions, fitted, tolerance):
+    # Largest deviation of each waypoint over its joints, in units of each
+    # joint's tolerance. A zero tolerance only accepts exact positions.
+    deviation = np.fabs(positions - fitted)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = deviation / tolerance
+    ratio[deviation == 0.0] = 0.0
+    return ratio.max(axis=-1)
+
+
+def reduce_waypoints(times, positions, tolerance, pinned=()):
+    """
+    Ramer-Douglas-Peucker reduction of a trajectory in joint space. A
+    waypoint is dropped when interpolating linearly in time between the
+    kept waypoints around it stays within tolerance on every joint, so
+    repeated positions and straight stretches collapse to their ends
+    while pauses keep their start and end.
+
+    @param times: waypoint times, increasing
+    @param positions: waypoints x joints positions
+    @param tolerance: largest allowed deviation, scalar or one per joint
+    @param pinned: indices of waypoints that are always kept
+    @return: sorted indices of the kept waypoints, always including the
+             first, the last and the pinned ones
+    """
+    times = np.asarray(times, dtype=float)
+    positions = np.asarray(positions, dtype=float).reshape(len(times), -1)
+    num_points = len(times)
+    if num_points <= 2:
+        return list(range(num_points))
+    # Deviations are compared in units of each joint's tolerance, a zero
+    # tolerance only drops exactly interpolated waypoints
+    tolerance = _joint_tolerance(tolerance, positions.shape[1])
+    keep = np.zeros(num_points, dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[list(pinned)] = True
+    # Segments still to split, as an explicit stack since recordings are
+    # too long for recursion
+    ends = np.flatnonzero(keep).tolist()
+    segments = list(zip(ends[:-1], ends[1:]))
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        inner = slice(first + 1, last)
+        duration = times[last] - times[first]
+        if duration > 0.0:
+            fraction = (times[inner] - times[first]) / duration
+        else:
+            fraction = np.zeros(last - first - 1)
+        line = (positions[first] + fraction[:, np.newaxis] *
+                (positions[last] - positions[first]))
+        worst = _deviation_ratio(positions[inner], line, tolerance)
+        split = int(np.argmax(worst))
+        if worst[split] > 1.0:
+            split += first + 1
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+    return np.flatnonzero(keep).tolist()
+
+
+def refine_waypoints(times, positions, kept, tolerance, evaluate):
+    """
+    Adds waypoints to a reduction until the trajectory actually executed
+    through the kept waypoints, e.g. a spline fitted to them, is within
+    tolerance of every waypoint. Each round keeps the worst waypoint
+    between every two kept ones that still deviate.
+
+    @param times: waypoint times, increasing
+    @param positions: waypoints x joints positions
+    @param kept: sorted indices of the kept waypoints, e.g. from
+                 reduce_waypoints
+    @param tolerance: largest allowed deviation, scalar or one per joint
+    @param evaluate: called with the kept indices, returns the executed
+                     positions at all waypoint times, waypoints x joints,
+                     or fits x waypoints x joints to meet every fit
+    @return: sorted indices of the kept waypoints
+    """
+    positions = np.asarray(positions, dtype=float).reshape(len(times), -1)
+    tolerance = _joint_tolerance(tolerance, positions.shape[1])
+    keep = np.zeros(len(times), dtype=bool)
+    keep[kept] = True
+    while True:
+        kept = np.flatnonzero(keep)
+        fitted = np.asarray(evaluate(kept.tolist()), dtype=float)
+        worst = _deviation_ratio(positions, fitted, tolerance)
+        if worst.ndim > 1:
+            worst = worst.max(axis=0)
+        # Kept waypoints are met up to rounding
+        worst[keep] = 0.0
+        deviating = np.flatnonzero(worst > 1.0)
+        if not len(deviating):
+            return kept.tolist()
+        # Kept waypoint before each deviating one, the worst waypoint
+        # after every such kept waypoint is added
+        before = np.searchsorted(kept, deviating) - 1
+        for interval in np.unique(before):
+            inner = deviating[before == interval]
+            keep[inner[np.argmax(worst[inner])]] = True
+
+
+def fitted_positions(mode, times, positions, at):
+    """
+    Positions of a trajectory server interpolation mode through
+    waypoints without velocities
+
+    @param mode: 'linear' or 'cubic_hermite'
+    @param times: waypoint times, increasing
+    @param positions: waypoints x joints positions
+    @param at: times to evaluate the interpolation at
+    @return: times x joints positions
+    """
+    positions = np.asarray(positions, dtype=float).reshape(len(times), -1)
+    if mode == 'linear':
+        b_coeffs = bezier.linear_coefficients(positions)
+    elif mode == 'cubic_hermite':
+        b_coeffs = bezier.hermite_coefficients(
+            positions, times, bezier.hermite_tangents(positions, times))
+    else:
+        raise ValueError("no waypoint reduction for %s interpolation" %
+                         (mode,))
+    return bezier.CompiledSpline(b_coeffs, times).evaluate_many(at)
+
+
+def reduce_points(points, tolerance, evaluate=None, pinned=()):
+    """
+    Waypoint reduction of JointTrajectoryPoints on their positions, the
+    kept points are returned unchanged. Unless they are interpolated
+    linearly, the reduction is refined until the interpolation executing
+    the kept points stays within tolerance.
+
+    @param points: list of JointTrajectoryPoint
+    @param tolerance: largest allowed position deviation in radians,
+                      scalar or one per joint
+    @param evaluate: called with the kept points and the times of all
+                     points, returns the executed positions at those
+                     times as for refine_waypoints, None for linear
+                     interpolation
+    @param pinned: indices of points that are always kept
+    @return: list of the kept JointTrajectoryPoints
+    """
+    if len(points) <= 2:
+        return list(points)
+    times = [point.time_from_start.to_sec() for point in points]
+    positions = [point.positions for point in points]
+    kept = reduce_waypoints(times, positions, tolerance, pinned)
+    if evaluate is not None:
+        kept = refine_waypoints(
+            times, positions, kept, tolerance,
+            lambda kept: evaluate([points[idx] for idx in kept], times))
+    return [points[idx] for idx in kept]
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import argparse
+import timeit
+
+import numpy as np
+import rospy
+import baxter_control
+from lab_baxter_common.traj_playback.array_pid import ArrayPID
+
+
+def per_object(pids, joints, errors):
+    cmd = dict()
+    for jnt, delta in zip(joints, errors):
+        cmd[jnt] = pids[jnt].compute_output(delta)
+    return cmd
+
+
+def array_backed(pid, joints, errors):
+    cmd = dict.fromkeys(joints, 0.0)
+    cmd.update(zip(joints, pid.compute_output(errors).tolist()))
+    return cmd
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares per joint baxter_control.PID updates with a "
+                    "single ArrayPID update of the whole limb")
+    parser.add_argument('-j', '--joints', type=int, default=7,
+                        help="number of joints per update")
+    parser.add_argument('-n', '--iterations', type=int, default=10000,
+                        help="number of control updates to time")
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node('pid_benchmark', anonymous=True)
+
+    joints = ['j%d' % i for i in range(args.joints)]
+    errors = np.random.uniform(-0.1, 0.1, args.joints)
+    pids = dict()
+    for jnt in joints:
+        pids[jnt] = baxter_control.PID(kp=2.0, ki=0.1, kd=0.05)
+        pids[jnt].initialize()
+    pid = ArrayPID(kp=2.0, ki=0.1, kd=0.05)
+    pid.initialize()
+
+    for name, update in (
+            ('baxter_control.PID', lambda: per_object(pids, joints, errors)),
+            ('ArrayPID', lambda: array_backed(pid, joints, errors))):
+        elapsed = min(timeit.repeat(update, repeat=3,
+                                    number=args.iterations))
+        print("%-20s %8.2f us per update (%d joints)" %
+              (name, 1e6 * elapsed / args.iterations, args.joints))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/python
+
+import argparse
+
+import rospy
+from lab_baxter_common.traj_playback.playback import warm_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parses all recordings of the playback library into "
+                    "the caches beside them, e.g. at deploy time, so that "
+                    "playback does not parse them")
+    parser.add_argument('directory', nargs='?', default=None,
+                        help="directory of the recordings, the playback "
+                             "library by default")
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node('warm_playback_cache', anonymous=True)
+
+    (cached, current, failed) = warm_cache(args.directory)
+    for name in cached:
+        print("cached   %s" % (name,))
+    for name in failed:
+        print("failed   %s" % (name,))
+    print("%d cached, %d up to date, %d failed" %
+          (len(cached), len(current), len(failed)))
+
+
+if __name__ == '__main__':
+    main()
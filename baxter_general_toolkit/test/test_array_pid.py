@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+from lab_baxter_common.traj_playback import array_pid
+from lab_baxter_common.traj_playback.array_pid import ArrayPID
+
+
+class TestArrayPID(unittest.TestCase):
+    def setUp(self):
+        # Steps of 10 ms on a clock driven by the test
+        self._now = [0.0]
+        self._get_time = array_pid.get_time
+        array_pid.get_time = lambda: self._now[0]
+
+    def tearDown(self):
+        array_pid.get_time = self._get_time
+
+    def _run(self, pid, errors, reuse_buffer):
+        pid.initialize()
+        buf = np.zeros(errors.shape[1])
+        outputs = []
+        for error in errors:
+            self._now[0] += 0.01
+            if reuse_buffer:
+                # As the trajectory server refills its error buffer per tick
+                buf[:] = error
+                outputs.append(pid.compute_output(buf))
+            else:
+                outputs.append(pid.compute_output(error.copy()))
+        return np.array(outputs)
+
+    def test_derivative_with_reused_error_buffer(self):
+        errors = np.outer(np.linspace(0.0, 1.0, 20), [1.0, -0.5, 0.25])
+        pid = ArrayPID(kd=1.0)
+        reused = self._run(pid, errors, True)
+        np.testing.assert_allclose(reused, self._run(pid, errors, False))
+        # Rising error, constant derivative after the first update
+        np.testing.assert_allclose(reused[1:], np.diff(errors, axis=0) / 0.01)
+
+    def test_first_derivative_from_zero(self):
+        pid = ArrayPID(kd=1.0)
+        self._now[0] += 0.01
+        np.testing.assert_allclose(pid.compute_output([0.1, -0.2]),
+                                   [10.0, -20.0])
+
+    def test_integral(self):
+        errors = np.ones((10, 2))
+        outputs = self._run(ArrayPID(ki=[1.0, 2.0]), errors, True)
+        np.testing.assert_allclose(outputs[-1], [0.1, 0.2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+import bisect
+import unittest
+
+import numpy as np
+from lab_baxter_common.traj_playback import bezier
+
+
+def dense_de_boor_control_pts(points_array, d0=None, dN=None, natural=True):
+    """
+    Reference de Boor control points from the dense solve that
+    de_boor_control_pts replaced, for N > 2
+    """
+    (rows, k) = np.shape(points_array)
+    N = rows - 1
+    A = np.zeros((N-1, N-1))
+    if natural:
+        A[np.ix_([0], [0, 1])] = [4, 1]
+        A[np.ix_([N-2], [N-3, N-2])] = [1, 4]
+    else:
+        A[np.ix_([0], [0, 1])] = [3.5, 1]
+        A[np.ix_([N-2], [N-3, N-2])] = [1, 3.5]
+    for i in range(1, N-2):
+        A[np.ix_([i], [i-1, i, i+1])] = [1, 4, 1]
+    d_pts = np.zeros((N+3, k))
+    for col in range(0, k):
+        x = np.zeros((N-1, 1))
+        if natural:
+            x[N-2, 0] = 6*points_array[-2, col] - points_array[-1, col]
+            x[0, 0] = 6*points_array[1, col] - points_array[0, col]
+        else:
+            x[N-2, 0] = 6*points_array[-2, col] - 1.5*dN[0, col]
+            x[0, 0] = 6*points_array[1, col] - 1.5*d0[0, col]
+        x[range(1, N-3+1), 0] = 6*points_array[range(2, N-2+1), col]
+        d_pts[2:N+1, col] = np.linalg.solve(A, x).T
+    d_pts[0, :] = points_array[0, :]
+    d_pts[-1, :] = points_array[-1, :]
+    if natural:
+        d_pts[1, :] = (2.0/3.0)*points_array[0, :] + (1.0/3.0)*d_pts[2, :]
+        d_pts[N+1, :] = (1.0/3.0)*d_pts[-3, :] + (2.0/3.0)*points_array[-1, :]
+    else:
+        d_pts[1, :] = d0
+        d_pts[N+1, :] = dN
+    return d_pts
+
+
+class TestDeBoorControlPoints(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+
+    def test_natural_matches_dense_solve(self):
+        for rows in range(4, 201):
+            points = self._random.uniform(-1.0, 1.0, (rows, 7))
+            np.testing.assert_allclose(
+                bezier.de_boor_control_pts(points),
+                dense_de_boor_control_pts(points), rtol=0, atol=1e-12)
+
+    def test_clamped_matches_dense_solve(self):
+        for rows in range(4, 201):
+            points = self._random.uniform(-1.0, 1.0, (rows, 7))
+            d0 = self._random.uniform(-1.0, 1.0, (1, 7))
+            dN = self._random.uniform(-1.0, 1.0, (1, 7))
+            np.testing.assert_allclose(
+                bezier.de_boor_control_pts(points, d0, dN, natural=False),
+                dense_de_boor_control_pts(points, d0, dN, natural=False),
+                rtol=0, atol=1e-12)
+
+    def test_clamped_short(self):
+        # Too few points for the banded solve, the spline still starts
+        # and ends with the given control points
+        for rows in (2, 3):
+            points = self._random.uniform(-1.0, 1.0, (rows, 7))
+            d0 = self._random.uniform(-1.0, 1.0, (1, 7))
+            dN = self._random.uniform(-1.0, 1.0, (1, 7))
+            d_pts = bezier.de_boor_control_pts(points, d0, dN, natural=False)
+            self.assertEqual(d_pts.shape, (rows + 2, 7))
+            np.testing.assert_array_equal(d_pts[1], d0[0])
+            np.testing.assert_array_equal(d_pts[-2], dN[0])
+            b_coeffs = bezier.bezier_coefficients(points, d_pts)
+            np.testing.assert_allclose(b_coeffs[:, 0, 0], points[0],
+                                       rtol=0, atol=1e-12)
+            np.testing.assert_allclose(b_coeffs[:, -1, 3], points[-1],
+                                       rtol=0, atol=1e-12)
+
+
+def continuity_errors(b_coeffs):
+    """
+    Largest mismatch of the value, first and second derivative with
+    respect to u where neighbouring segments meet
+    """
+    (b0, b1, b2, b3) = [b_coeffs[:, :, i] for i in range(4)]
+    c0 = b3[:, :-1] - b0[:, 1:]
+    c1 = (b3 - b2)[:, :-1] - (b1 - b0)[:, 1:]
+    c2 = (b3 - 2*b2 + b1)[:, :-1] - (b2 - 2*b1 + b0)[:, 1:]
+    return [np.fabs(c).max() for c in (c0, c1, c2)]
+
+
+class TestExtendBezierCoefficients(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+
+    def _extend(self, points, new_points, window):
+        d_pts = bezier.de_boor_control_pts(points)
+        b_coeffs = bezier.bezier_coefficients(points, d_pts)
+        return (b_coeffs, bezier.extend_bezier_coefficients(
+            points, d_pts, b_coeffs, new_points, window))
+
+    def _refit(self, points):
+        return bezier.bezier_coefficients(
+            points, bezier.de_boor_control_pts(points))
+
+    def test_matches_full_refit(self):
+        for window in (4, 8, 12, 20):
+            for num_new in (1, 5, 30):
+                points = self._random.uniform(-1.0, 1.0, (60, 7))
+                new_points = self._random.uniform(-1.0, 1.0, (num_new, 7))
+                (b_coeffs, extended) = self._extend(points, new_points,
+                                                    window)
+                all_points = np.vstack((points, new_points))
+                np.testing.assert_array_equal(extended[0], all_points)
+                np.testing.assert_allclose(
+                    extended[1], bezier.de_boor_control_pts(all_points),
+                    rtol=0, atol=0.3**window)
+                np.testing.assert_allclose(extended[2],
+                                           self._refit(all_points),
+                                           rtol=0, atol=0.3**window)
+                # Only the tail window is re-solved
+                kept = len(points) - window - 3
+                np.testing.assert_array_equal(extended[2][:, :kept],
+                                              b_coeffs[:, :kept])
+
+    def test_join_is_c2(self):
+        points = self._random.uniform(-1.0, 1.0, (60, 7))
+        new_points = self._random.uniform(-1.0, 1.0, (10, 7))
+        (_, extended) = self._extend(points, new_points, 12)
+        for error in continuity_errors(extended[2]):
+            self.assertLess(error, 1e-12)
+
+    def test_short_spline_is_refit(self):
+        points = self._random.uniform(-1.0, 1.0, (10, 3))
+        new_points = self._random.uniform(-1.0, 1.0, (5, 3))
+        (_, extended) = self._extend(points, new_points, 12)
+        np.testing.assert_allclose(
+            extended[2], self._refit(np.vstack((points, new_points))),
+            rtol=0, atol=1e-12)
+
+    def test_chunks(self):
+        # A stream appended in chunks stays C2 and close to a full fit
+        points = self._random.uniform(-1.0, 1.0, (20, 7))
+        d_pts = bezier.de_boor_control_pts(points)
+        b_coeffs = bezier.bezier_coefficients(points, d_pts)
+        for _ in range(20):
+            new_points = self._random.uniform(-1.0, 1.0, (5, 7))
+            (points, d_pts, b_coeffs) = bezier.extend_bezier_coefficients(
+                points, d_pts, b_coeffs, new_points)
+        self.assertEqual(b_coeffs.shape, (7, 119, 4))
+        for error in continuity_errors(b_coeffs):
+            self.assertLess(error, 1e-12)
+        np.testing.assert_allclose(b_coeffs, self._refit(points),
+                                   rtol=0, atol=1e-5)
+
+
+class TestSpliceSplines(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+
+    def _spline(self, num_points):
+        points = self._random.uniform(-1.0, 1.0, (num_points, 3))
+        b_coeffs = bezier.bezier_coefficients(
+            points, bezier.de_boor_control_pts(points))
+        return bezier.CompiledSpline(b_coeffs,
+                                     np.arange(num_points, dtype=float))
+
+    def test_tail_takes_over(self):
+        (head, tail) = (self._spline(8), self._spline(6))
+        spliced = bezier.splice_splines(head, 2.5, tail, 1.0)
+        self.assertEqual(spliced.shape, (3,))
+        self.assertEqual(spliced.end_time, 6.0)
+        times = np.linspace(0.0, 6.0, 25)
+        for order in (0, 1, 2):
+            expected = [head.evaluate(time, order) if time < 2.5 else
+                        tail.evaluate(time - 1.0, order) for time in times]
+            np.testing.assert_array_equal(
+                [spliced.evaluate(time, order) for time in times], expected)
+            np.testing.assert_allclose(spliced.evaluate_many(times, order),
+                                       expected, rtol=0, atol=1e-12)
+
+    def test_earlier_splice_drops_later_pieces(self):
+        (head, first, second) = (self._spline(8), self._spline(6),
+                                 self._spline(6))
+        spliced = bezier.splice_splines(head, 4.0, first, 3.0)
+        spliced = bezier.splice_splines(spliced, 2.0, second, 1.0)
+        np.testing.assert_array_equal(spliced.evaluate(1.5),
+                                      head.evaluate(1.5))
+        np.testing.assert_array_equal(spliced.evaluate(4.5),
+                                      second.evaluate(3.5))
+
+
+def reference_values(b_coeffs, pnt_times, times):
+    """
+    Values of a spline at times from bezier_point, with the segment and
+    its elapsed fraction looked up from the control point times
+    """
+    values = []
+    for time in times:
+        b_index = bisect.bisect(pnt_times, time)
+        if 0 < b_index < len(pnt_times):
+            t = ((time - pnt_times[b_index-1]) /
+                 (pnt_times[b_index] - pnt_times[b_index-1]))
+        else:
+            t = 0.0
+        values.append(bezier.bezier_point(b_coeffs, b_index, t))
+    return np.array(values)
+
+
+class TestCompiledSpline(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+        # Joints x dimensions x segments x 4, unevenly timed segments
+        self._b_coeffs = self._random.uniform(-1.0, 1.0, (7, 2, 12, 4))
+        self._pnt_times = np.concatenate(
+            ([0.5], 0.5 + np.cumsum(self._random.uniform(0.1, 1.0, 12))))
+        self._spline = bezier.CompiledSpline(self._b_coeffs, self._pnt_times)
+        # Before, within and past the spline, and on every control point
+        self._times = np.concatenate((
+            [0.0, 0.4], self._pnt_times,
+            self._random.uniform(0.5, self._pnt_times[-1], 200),
+            [self._pnt_times[-1] + 0.5]))
+
+    def test_evaluate_matches_bezier_point(self):
+        self.assertEqual(self._spline.shape, (7, 2))
+        expected = reference_values(self._b_coeffs, self._pnt_times,
+                                    self._times)
+        np.testing.assert_allclose(
+            [self._spline.evaluate(time) for time in self._times], expected,
+            rtol=0, atol=1e-12)
+        np.testing.assert_allclose(self._spline.evaluate_many(self._times),
+                                   expected, rtol=0, atol=1e-12)
+
+    def test_derivatives(self):
+        # Central differences within the segments, away from the control
+        # points where the derivatives step
+        step = 1e-6
+        durations = np.diff(self._pnt_times)
+        times = (self._pnt_times[:-1, np.newaxis] +
+                 np.outer(durations, [0.25, 0.5, 0.75])).ravel()
+        for order in (1, 2):
+            for time in times:
+                difference = (
+                    self._spline.evaluate(time + step, order - 1) -
+                    self._spline.evaluate(time - step, order - 1)) / (2*step)
+                np.testing.assert_allclose(
+                    self._spline.evaluate(time, order), difference,
+                    rtol=0, atol=1e-5 * 10**order)
+            np.testing.assert_allclose(
+                self._spline.evaluate_many(self._times, order),
+                [self._spline.evaluate(time, order) for time in self._times],
+                rtol=0, atol=1e-12)
+            # Held start and end positions are stationary
+            for time in (0.0, self._pnt_times[-1] + 0.5):
+                np.testing.assert_array_equal(
+                    self._spline.evaluate(time, order), np.zeros((7, 2)))
+
+    def test_scaled(self):
+        value_scale = self._random.uniform(0.5, 2.0, (7, 1))
+        scaled = self._spline.scaled(2.5, value_scale)
+        self.assertEqual(scaled.start_time, 2.5 * self._spline.start_time)
+        self.assertEqual(scaled.end_time, 2.5 * self._spline.end_time)
+        for order in (0, 1, 2):
+            expected = (value_scale / 2.5**order *
+                        self._spline.evaluate_many(self._times, order))
+            np.testing.assert_allclose(
+                scaled.evaluate_many(2.5 * self._times, order), expected,
+                rtol=1e-12, atol=1e-12)
+            np.testing.assert_allclose(
+                [scaled.evaluate(2.5 * time, order) for time in self._times],
+                expected, rtol=1e-12, atol=1e-12)
+        # The original spline is left as it was
+        np.testing.assert_allclose(
+            self._spline.evaluate_many(self._times),
+            reference_values(self._b_coeffs, self._pnt_times, self._times),
+            rtol=0, atol=1e-12)
+
+
+class TestSampledSpline(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        points = random.uniform(-1.0, 1.0, (10, 3))
+        b_coeffs = bezier.bezier_coefficients(
+            points, bezier.de_boor_control_pts(points))
+        self._spline = bezier.CompiledSpline(b_coeffs,
+                                             np.linspace(1.0, 5.5, 10))
+        self._rate = 100.0
+        self._sampled = bezier.SampledSpline(self._spline, self._rate,
+                                             orders=(0, 1))
+
+    def test_samples_match(self):
+        self.assertEqual(self._sampled.shape, (3,))
+        self.assertEqual(self._sampled.start_time, 1.0)
+        self.assertEqual(self._sampled.end_time, 5.5)
+        sample_times = 1.0 + np.arange(451) / self._rate
+        for order in (0, 1):
+            np.testing.assert_allclose(
+                [self._sampled.evaluate(time, order)
+                 for time in sample_times],
+                self._spline.evaluate_many(sample_times, order),
+                rtol=0, atol=1e-12)
+
+    def test_interpolates_between_samples(self):
+        times = np.linspace(1.0, 5.5, 1001)
+        for order in (0, 1):
+            rows = np.floor((times - 1.0) * self._rate)
+            (before, after) = (1.0 + rows / self._rate,
+                               1.0 + (rows + 1) / self._rate)
+            fraction = ((times - before) * self._rate)[:, np.newaxis]
+            expected = ((1.0 - fraction) *
+                        self._spline.evaluate_many(before, order) +
+                        fraction * self._spline.evaluate_many(after, order))
+            # The last sample is the end of the spline
+            expected[-1] = self._spline.evaluate(5.5, order)
+            np.testing.assert_allclose(
+                [self._sampled.evaluate(time, order) for time in times],
+                expected, rtol=0, atol=1e-12)
+            # And close to the spline itself at this rate
+            np.testing.assert_allclose(
+                [self._sampled.evaluate(time, order) for time in times],
+                self._spline.evaluate_many(times, order),
+                rtol=0, atol=1e-3 * 10**order)
+
+    def test_holds_outside(self):
+        np.testing.assert_array_equal(self._sampled.evaluate(0.0),
+                                      self._spline.evaluate(1.0))
+        np.testing.assert_array_equal(self._sampled.evaluate(9.0),
+                                      self._spline.evaluate(5.5))
+        for time in (0.0, 9.0):
+            np.testing.assert_array_equal(self._sampled.evaluate(time, 1),
+                                          np.zeros(3))
+        # Only the sampled orders are available
+        self.assertRaises(KeyError, self._sampled.evaluate, 2.0, 2)
+
+
+class TestDirectSegments(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self._points = random.uniform(-1.0, 1.0, (8, 4))
+        self._pnt_times = np.cumsum(random.uniform(0.1, 1.0, 8))
+
+    def test_linear(self):
+        spline = bezier.CompiledSpline(
+            bezier.linear_coefficients(self._points), self._pnt_times)
+        np.testing.assert_allclose(spline.evaluate_many(self._pnt_times),
+                                   self._points, rtol=0, atol=1e-12)
+        # Straight between the points, at the slope of each segment
+        middles = 0.5 * (self._pnt_times[:-1] + self._pnt_times[1:])
+        np.testing.assert_allclose(
+            spline.evaluate_many(middles),
+            0.5 * (self._points[:-1] + self._points[1:]),
+            rtol=0, atol=1e-12)
+        np.testing.assert_allclose(
+            spline.evaluate_many(middles, 1),
+            np.diff(self._points, axis=0) /
+            np.diff(self._pnt_times)[:, np.newaxis], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(spline.evaluate_many(middles, 2),
+                                   np.zeros((7, 4)), rtol=0, atol=1e-9)
+
+    def test_hermite(self):
+        velocities = np.random.RandomState(1).uniform(-1.0, 1.0, (8, 4))
+        spline = bezier.CompiledSpline(
+            bezier.hermite_coefficients(self._points, self._pnt_times,
+                                        velocities), self._pnt_times)
+        np.testing.assert_allclose(spline.evaluate_many(self._pnt_times),
+                                   self._points, rtol=0, atol=1e-12)
+        # Leaving every point and reaching the last one at its velocity
+        np.testing.assert_allclose(
+            spline.evaluate_many(self._pnt_times[:-1], 1), velocities[:-1],
+            rtol=0, atol=1e-12)
+        np.testing.assert_allclose(
+            spline.evaluate(self._pnt_times[-1], 1), velocities[-1],
+            rtol=0, atol=1e-12)
+        # Reaching the inner points at their velocity too, so C1
+        before = self._pnt_times[1:-1] - 1e-9
+        np.testing.assert_allclose(spline.evaluate_many(before, 1),
+                                   velocities[1:-1], rtol=0, atol=1e-6)
+
+    def test_hermite_tangents(self):
+        # Exact on straight lines whatever the spacing, zero slopes for
+        # points at the same time
+        slope = np.array([0.5, -2.0])
+        points = np.outer(self._pnt_times, slope)
+        np.testing.assert_allclose(
+            bezier.hermite_tangents(points, self._pnt_times),
+            np.tile(slope, (8, 1)), rtol=0, atol=1e-12)
+        tangents = bezier.hermite_tangents([[0.0], [1.0], [1.0], [2.0]],
+                                           [0.0, 1.0, 1.0, 2.0])
+        self.assertTrue(np.all(np.isfinite(tangents)))
+        np.testing.assert_allclose(tangents[[0, 3], 0], [1.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+
+import numpy as np
+
+try:
+    import rospy
+    from lab_baxter_common.traj_playback import sim_harness
+    from lab_baxter_common.traj_playback.limb_backend import SimulatedBackend
+except ImportError:
+    # The server needs rospy and the built messages of the workspace
+    sim_harness = None
+
+RATE = 100.0
+
+
+def ramp_goal(joint_names, start, end, duration, num_points,
+              skip_first=False):
+    """
+    Goal moving every joint at constant velocity from start to end over
+    duration seconds, without its point at start if skip_first
+    """
+    goal = sim_harness.FollowJointTrajectoryGoal()
+    goal.trajectory.joint_names = list(joint_names)
+    for idx in range(1 if skip_first else 0, num_points):
+        fraction = float(idx) / (num_points - 1)
+        point = sim_harness.JointTrajectoryPoint()
+        point.positions = (start + fraction * (end - start)).tolist()
+        point.time_from_start = rospy.Duration.from_sec(fraction * duration)
+        goal.trajectory.points.append(point)
+    return goal
+
+
+@unittest.skipIf(sim_harness is None,
+                 "needs rospy and the built messages of the workspace")
+class TestBlend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Wall clock time without a ROS master
+        rospy.rostime.set_rostime_initialized(True)
+
+    def setUp(self):
+        self._servers = []
+
+    def tearDown(self):
+        for server in self._servers:
+            server.clean_shutdown()
+
+    def _start(self, blend):
+        # Joints follow their commands without lag, so only the commanded
+        # trajectory is seen
+        backend = SimulatedBackend('left', lag=0.0)
+        server = sim_harness.source_code.JointTrajectoryActionServer(
+            'left', sim_harness.DefaultConfig('position_w_id'), RATE,
+            'position_w_id', analytic_derivatives=True, feedback_rate=0.0,
+            blend=blend, backend=backend)
+        self._servers.append(server)
+        action_server = backend.action_servers[
+            'robot/limb/left/follow_joint_trajectory']
+        joints = backend.limb.joint_names()
+        return (action_server, joints)
+
+    def _send_pair(self, action_server, first, second, delay, cancel=False):
+        # Sends second delay seconds after first, returns the final
+        # states and the desired velocities of every tick
+        velocities = []
+        action_server.feedback_cb = (
+            lambda fdbk: velocities.append(list(fdbk.desired.velocities)))
+        first_handle = action_server.send_goal(first)
+        time.sleep(delay)
+        second_handle = action_server.send_goal(second)
+        if cancel:
+            time.sleep(0.1)
+            action_server.cancel(second_handle)
+        states = (first_handle.wait(10.0)[0], second_handle.wait(10.0)[0])
+        action_server.feedback_cb = None
+        # Ticks holding the last point of a goal have no velocities
+        return (states, np.array([vel for vel in velocities if vel]))
+
+    def test_contiguous(self):
+        (action_server, joints) = self._start(blend=True)
+        zero = np.zeros(len(joints))
+        mid = np.full(len(joints), 0.5)
+        first = ramp_goal(joints, zero, mid, 2.0, 21)
+        # Continues from the end of the first goal at the same velocity
+        second = ramp_goal(joints, mid, 2.0 * mid, 2.0, 21, skip_first=True)
+        (states, velocities) = self._send_pair(action_server, first, second,
+                                               1.0)
+        self.assertEqual(states, ('succeeded', 'succeeded'))
+        # Away from the start and end of the pair, the limb keeps moving
+        # at 0.25 rad/s through the join without a jump
+        moving = velocities[int(0.3 * RATE):-int(0.5 * RATE), 0]
+        self.assertGreater(moving.min(), 0.15)
+        self.assertLess(moving.max(), 0.35)
+        self.assertLess(np.fabs(np.diff(moving)).max(), 0.05)
+
+    def test_not_contiguous(self):
+        # A second goal starting off the end of the first is handled as a
+        # preempt, as by a server without blend
+        runs = []
+        for blend in (False, True):
+            (action_server, joints) = self._start(blend)
+            zero = np.zeros(len(joints))
+            mid = np.full(len(joints), 0.5)
+            first = ramp_goal(joints, zero, mid, 2.0, 21)
+            second = ramp_goal(joints, mid - 0.5, mid, 2.0, 21)
+            runs.append(self._send_pair(action_server, first, second,
+                                        1.0)[0])
+        self.assertEqual(runs[1][0], 'preempted')
+        self.assertEqual(runs[1], runs[0])
+
+    def test_cancel_pending(self):
+        (action_server, joints) = self._start(blend=True)
+        zero = np.zeros(len(joints))
+        mid = np.full(len(joints), 0.5)
+        first = ramp_goal(joints, zero, mid, 2.0, 21)
+        second = ramp_goal(joints, mid, 2.0 * mid, 2.0, 21, skip_first=True)
+        # Cancelled while it is being blended, the first goal still
+        # finishes and the second one is preempted once it takes over
+        (states, _) = self._send_pair(action_server, first, second, 1.0,
+                                      cancel=True)
+        self.assertEqual(states, ('succeeded', 'preempted'))
+        # The limb is held and takes the next goal
+        third = ramp_goal(joints, mid, zero, 1.0, 11)
+        handle = action_server.send_goal(third)
+        self.assertEqual(handle.wait(5.0)[0], 'succeeded')
+
+
+if __name__ == '__main__':
+    unittest.main()
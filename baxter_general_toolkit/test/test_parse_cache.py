@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from lab_baxter_common.traj_playback import parse_cache
+
+
+def parse_rows(filename):
+    """
+    Reference parse of the row by row reader that read_csv replaced: the
+    header and, for each row, a dictionary of the cells that are numbers
+    """
+    def try_float(x):
+        try:
+            return float(x)
+        except ValueError:
+            return None
+    with open(filename, 'r') as f:
+        lines = f.readlines()
+    header = lines[0].rstrip().split(',')
+    rows = []
+    for line in lines[1:]:
+        cells = [try_float(x) for x in line.rstrip().split(',')]
+        rows.append(dict((col, value) for col, value in
+                         enumerate(cells[:len(header)])
+                         if value is not None))
+    return (header, rows)
+
+
+class TestReadCsv(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _write(self, text, name='recording'):
+        filename = os.path.join(self._dir, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def assertParsedAsRows(self, filename):
+        (header, values, valid) = parse_cache.read_csv(filename)
+        (ref_header, ref_rows) = parse_rows(filename)
+        self.assertEqual(header, ref_header)
+        self.assertEqual(values.shape, (len(ref_rows), len(header)))
+        self.assertEqual(valid.shape, values.shape)
+        for row, cells in enumerate(ref_rows):
+            self.assertEqual(np.flatnonzero(valid[row]).tolist(),
+                             sorted(cells))
+            for col, value in cells.items():
+                self.assertEqual(values[row, col], value)
+        return (header, values, valid)
+
+    def test_valid(self):
+        filename = self._write("time,left_s0,left_gripper\n"
+                               "0.0,0.5,100.0\n"
+                               "0.1,-0.25,0\n"
+                               "0.2,1e-3,100.0\n")
+        (_, _, valid) = self.assertParsedAsRows(filename)
+        self.assertTrue(valid.all())
+
+    def test_blank_and_invalid_cells(self):
+        filename = self._write("time,left_s0,left_gripper\n"
+                               "0.0,,100.0\n"
+                               "0.1,x,0\n"
+                               "0.2,0.5\n"
+                               "0.3,0.5,100.0,7.0\n")
+        (_, values, valid) = self.assertParsedAsRows(filename)
+        self.assertEqual(valid.tolist(), [[True, False, True],
+                                          [True, False, True],
+                                          [True, True, False],
+                                          [True, True, True]])
+        # Cells past the header are left out
+        self.assertEqual(values[3].tolist(), [0.3, 0.5, 100.0])
+
+    def test_trailing_blank_lines(self):
+        # Rows without any valid cell, so parsing them fails as before
+        filename = self._write("time,left_s0\n"
+                               "0.0,0.5\n"
+                               "\n"
+                               "\n")
+        (_, _, valid) = self.assertParsedAsRows(filename)
+        self.assertEqual(valid.tolist(), [[True, True], [False, False],
+                                          [False, False]])
+
+    def test_header_only(self):
+        for text in ("time,left_s0\n", "time,left_s0"):
+            (header, values, valid) = self.assertParsedAsRows(
+                self._write(text))
+            self.assertEqual(header, ['time', 'left_s0'])
+            self.assertEqual(values.shape, (0, 2))
+
+
+class TestLoadCsv(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._filename = os.path.join(self._dir, 'recording')
+        self._version = parse_cache._CACHE_VERSION
+
+    def tearDown(self):
+        parse_cache._CACHE_VERSION = self._version
+        shutil.rmtree(self._dir)
+
+    def _write(self, text, mtime):
+        with open(self._filename, 'w') as f:
+            f.write(text)
+        os.utime(self._filename, (mtime, mtime))
+
+    def _cached(self):
+        # Loads the recording, fails unless the cache is then up to date
+        parsed = parse_cache.load_csv(self._filename)
+        key = parse_cache._source_key(self._filename)
+        self.assertIsNotNone(parse_cache._load_cache(self._filename, key))
+        return parsed[1].tolist()
+
+    def test_unchanged_file_is_read_from_cache(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        self.assertEqual(self._cached(), [[0.0, 0.5]])
+        # Same size and modification time, so the cache is not rebuilt
+        self._write("time,left_s0\n0.0,0.7\n", 1000.0)
+        self.assertEqual(self._cached(), [[0.0, 0.5]])
+        # Unless the cache is bypassed
+        self.assertEqual(
+            parse_cache.load_csv(self._filename, False)[1].tolist(),
+            [[0.0, 0.7]])
+
+    def test_changed_mtime(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        self._cached()
+        self._write("time,left_s0\n0.0,0.7\n", 1001.0)
+        self.assertEqual(self._cached(), [[0.0, 0.7]])
+
+    def test_changed_size(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        self._cached()
+        self._write("time,left_s0\n0.0,0.75\n", 1000.0)
+        self.assertEqual(self._cached(), [[0.0, 0.75]])
+
+    def test_version_bump(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        self._cached()
+        self._write("time,left_s0\n0.0,0.7\n", 1000.0)
+        parse_cache._CACHE_VERSION = self._version + 1
+        self.assertEqual(self._cached(), [[0.0, 0.7]])
+
+    def test_corrupt_cache(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        self._cached()
+        with open(parse_cache.cache_path(self._filename), 'wb') as f:
+            f.write(b'PK\x03\x04 not a cache')
+        self.assertEqual(self._cached(), [[0.0, 0.5]])
+
+    def test_unwritable_cache(self):
+        # A directory in place of the cache can be neither read nor
+        # replaced, the file is parsed on every load
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        os.mkdir(parse_cache.cache_path(self._filename))
+        warnings = []
+        handler = logging.Handler()
+        handler.emit = warnings.append
+        logging.getLogger('rosout').addHandler(handler)
+        try:
+            for _ in range(2):
+                self.assertEqual(
+                    parse_cache.load_csv(self._filename)[1].tolist(),
+                    [[0.0, 0.5]])
+        finally:
+            logging.getLogger('rosout').removeHandler(handler)
+        self.assertEqual([record.levelno for record in warnings],
+                         [logging.WARNING] * 2)
+        # Without leaving temporary files behind
+        self.assertEqual(sorted(os.listdir(self._dir)),
+                         ['.recording.npz', 'recording'])
+
+    def test_warm(self):
+        self._write("time,left_s0\n0.0,0.5\n", 1000.0)
+        with open(os.path.join(self._dir, 'notes'), 'w') as f:
+            f.write("not a recording\n")
+        self.assertEqual(parse_cache.warm(self._dir),
+                         (['recording'], [], []))
+        self.assertEqual(parse_cache.warm(self._dir),
+                         ([], ['recording'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
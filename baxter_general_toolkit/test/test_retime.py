@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+from lab_baxter_common.traj_playback import retime
+
+
+def finite_differences(positions, durations):
+    """
+    Velocities of the segments and accelerations at the waypoints of a
+    retimed path that starts and ends at rest, repeated waypoints left out
+    """
+    positions = np.asarray(positions, dtype=float)
+    positions = positions.reshape(len(positions), -1)
+    keep = np.concatenate(([True], durations > 0.0))
+    positions = positions[keep]
+    durations = durations[durations > 0.0]
+    rest = np.zeros((1, positions.shape[1]))
+    velocities = np.vstack((rest, np.diff(positions, axis=0) /
+                            durations[:, np.newaxis], rest))
+    spans = np.concatenate(([0.0], durations, [0.0]))
+    spans = spans[1:] + spans[:-1]
+    accelerations = 2.0 * np.diff(velocities, axis=0) / spans[:, np.newaxis]
+    return (velocities, accelerations)
+
+
+class TestSegmentDurations(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+
+    def assertWithinLimits(self, positions, durations, max_velocity,
+                           max_acceleration):
+        (velocities, accelerations) = finite_differences(positions,
+                                                         durations)
+        self.assertTrue(np.all(np.fabs(velocities) <=
+                               max_velocity * (1.0 + 1e-6)))
+        self.assertTrue(np.all(np.fabs(accelerations) <=
+                               max_acceleration * (1.0 + 1e-6)))
+
+    def test_reversal(self):
+        times = np.arange(0.0, 6.0, 0.01)
+        positions = 0.3 * np.sin(times)
+        durations = retime.segment_durations(positions, 0.25, 1.0)
+        self.assertWithinLimits(positions, durations, 0.25, 1.0)
+        # The joint reverses at the extremes of the sine only, slowing
+        # down through zero velocity there
+        (velocities, _) = finite_differences(positions, durations)
+        segments = velocities[1:-1, 0]
+        reversals = np.flatnonzero(np.sign(segments[1:]) !=
+                                   np.sign(segments[:-1])) + 1
+        self.assertEqual(reversals.tolist(), [np.argmax(positions),
+                                              np.argmin(positions)])
+        for idx in reversals:
+            self.assertLess(np.fabs(segments[idx - 1:idx + 1]).max(), 0.01)
+        # Slower than the velocity limit alone, not much slower
+        length = np.fabs(np.diff(positions)).sum()
+        self.assertGreater(durations.sum(), length / 0.25)
+        self.assertLess(durations.sum(), 6.0)
+
+    def test_step_from_rest(self):
+        positions = np.concatenate((np.zeros(50), np.linspace(0.0, 0.5, 51)))
+        durations = retime.segment_durations(positions, 0.25, 1.0)
+        self.assertEqual(durations[:49].tolist(), [0.0] * 49)
+        self.assertWithinLimits(positions, durations, 0.25, 1.0)
+
+    def test_stiff_sparse_paths(self):
+        # Few waypoints with large steps, mixed limits and pauses
+        for _ in range(500):
+            num_points = self._random.randint(3, 12)
+            num_joints = self._random.randint(1, 8)
+            positions = np.cumsum(self._random.uniform(
+                -3.0, 3.0, (num_points, num_joints)), axis=0)
+            max_velocity = self._random.uniform(0.1, 2.0, num_joints)
+            max_acceleration = self._random.uniform(0.05, 5.0, num_joints)
+            min_durations = np.where(
+                self._random.uniform(size=num_points - 1) < 0.2,
+                self._random.uniform(0.0, 0.5, num_points - 1), 0.0)
+            durations = retime.segment_durations(
+                positions, max_velocity, max_acceleration, 1.0,
+                min_durations)
+            self.assertTrue(np.all(durations >= min_durations))
+            self.assertWithinLimits(positions, durations, max_velocity,
+                                    max_acceleration)
+
+    def test_unsettled_timing_is_slowed_down(self):
+        # Path speeds that ignore the repairs of the check never pass it,
+        # the whole path is slowed down instead
+        integrate = retime._integrate_path_speed
+        rounds = []
+
+        def ignoring_repairs(x_max, c, e):
+            if not rounds:
+                rounds.append(integrate(x_max, c, e))
+            rounds.append(None)
+            return rounds[0]
+        retime._integrate_path_speed = ignoring_repairs
+        try:
+            positions = 0.3 * np.sin(np.arange(0.0, 6.0, 0.01))
+            durations = retime.segment_durations(positions, 0.25, 1.0)
+        finally:
+            retime._integrate_path_speed = integrate
+        self.assertEqual(len(rounds), 101)
+        self.assertWithinLimits(positions, durations, 0.25, 1.0)
+        # Every segment of the unsettled timing is stretched by the same
+        # factor, just enough to bring the worst acceleration to its limit
+        speed = np.sqrt(rounds[0])
+        unsettled = 2.0 / (speed[:-1] + speed[1:])
+        stretch = durations / unsettled
+        self.assertGreater(stretch.min(), 1.0)
+        self.assertAlmostEqual(stretch.min(), stretch.max())
+        (_, accelerations) = finite_differences(positions, durations)
+        self.assertGreater(np.fabs(accelerations).max(), 1.0 - 1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import unittest
+
+from lab_baxter_common.traj_playback.spline_cache import (
+    BoundedLRU,
+    SplineCache,
+    TrajectoryStore,
+)
+
+
+class TestBoundedLRU(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = BoundedLRU(300)
+        for key in ('a', 'b', 'c'):
+            self.assertTrue(lru.put(key, key.upper(), 100))
+        # Looking up a marks it as used, so b is evicted for d
+        self.assertEqual(lru.get('a'), 'A')
+        self.assertTrue(lru.put('d', 'D', 100))
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual([lru.get(key) for key in ('a', 'c', 'd')],
+                         ['A', 'C', 'D'])
+        self.assertEqual(lru.stats(),
+                         {'entries': 3, 'bytes': 300, 'evictions': 1})
+
+    def test_evicts_until_it_fits(self):
+        lru = BoundedLRU(300)
+        for key in ('a', 'b', 'c'):
+            lru.put(key, key.upper(), 100)
+        self.assertTrue(lru.put('d', 'D', 250))
+        self.assertEqual([lru.get(key) for key in ('a', 'b', 'c', 'd')],
+                         [None, None, None, 'D'])
+        self.assertEqual(lru.stats(),
+                         {'entries': 1, 'bytes': 250, 'evictions': 3})
+
+    def test_replace_and_oversized(self):
+        lru = BoundedLRU(300)
+        lru.put('a', 'A', 100)
+        lru.put('a', 'A2', 200)
+        self.assertEqual(lru.get('a'), 'A2')
+        self.assertEqual(lru.stats()['bytes'], 200)
+        # Refused without evicting anything
+        self.assertFalse(lru.put('b', 'B', 400))
+        self.assertEqual(lru.get('a'), 'A2')
+        self.assertEqual(lru.stats()['evictions'], 0)
+
+    def test_disabled(self):
+        lru = BoundedLRU(0)
+        self.assertFalse(lru.put('a', 'A', 1))
+        self.assertIsNone(lru.get('a'))
+
+
+class TestSplineCache(unittest.TestCase):
+    def test_counts_hits_and_misses(self):
+        cache = SplineCache(200)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 'A', 100)
+        cache.put('b', 'B', 100)
+        self.assertEqual(cache.get('a'), 'A')
+        cache.put('c', 'C', 100)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 2, 'entries': 2, 'bytes': 200,
+                          'evictions': 1})
+
+
+class TestTrajectoryStore(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        store = TrajectoryStore(300)
+        for key in ('a', 'b', 'c'):
+            self.assertTrue(store.put(key, key.upper(), 100))
+        # Executing a marks it as used, so b is evicted for d
+        self.assertEqual(store.get('a'), 'A')
+        self.assertTrue(store.put('d', 'D', 100))
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.stats(),
+                         {'entries': 3, 'bytes': 300, 'evictions': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
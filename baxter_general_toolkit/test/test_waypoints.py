@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+from lab_baxter_common.traj_playback import waypoints
+
+
+def deviation(times, positions, kept, mode='linear'):
+    """
+    Largest deviation of each joint from the waypoints when interpolating
+    through the kept ones in the mode
+    """
+    times = np.asarray(times, dtype=float)
+    positions = np.asarray(positions, dtype=float).reshape(len(times), -1)
+    fitted = waypoints.fitted_positions(mode, times[kept], positions[kept],
+                                        times)
+    return np.fabs(fitted - positions).max(axis=0)
+
+
+class TestReduceWaypoints(unittest.TestCase):
+    def setUp(self):
+        self._random = np.random.RandomState(0)
+
+    def test_scalar_tolerance(self):
+        times = np.linspace(0.0, 4.0, 401)
+        positions = np.column_stack((np.sin(times), 0.5 * np.cos(times)))
+        for tolerance in (0.1, 0.01, 0.001):
+            kept = waypoints.reduce_waypoints(times, positions, tolerance)
+            self.assertEqual((kept[0], kept[-1]), (0, 400))
+            self.assertEqual(kept, sorted(set(kept)))
+            self.assertTrue(np.all(deviation(times, positions, kept) <=
+                                   tolerance))
+        # Tighter tolerances keep more waypoints
+        counts = [len(waypoints.reduce_waypoints(times, positions, tol))
+                  for tol in (0.1, 0.01, 0.001)]
+        self.assertEqual(counts, sorted(counts))
+        self.assertLess(counts[0], counts[-1])
+
+    def test_per_joint_tolerance(self):
+        times = np.linspace(0.0, 4.0, 401)
+        positions = np.column_stack((np.sin(times), np.sin(times)))
+        tolerance = np.array([0.001, 0.1])
+        kept = waypoints.reduce_waypoints(times, positions, tolerance)
+        self.assertTrue(np.all(deviation(times, positions, kept) <=
+                               tolerance))
+        # The tight joint decides, as if it were alone
+        self.assertEqual(kept, waypoints.reduce_waypoints(
+            times, positions[:, :1], 0.001))
+        self.assertLess(len(waypoints.reduce_waypoints(
+            times, positions[:, 1:], 0.1)), len(kept))
+
+    def test_repeated_rows(self):
+        # A pause keeps its start and end, its repeated rows are dropped
+        times = np.arange(10.0)
+        positions = np.array([0.0, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0, 3.0, 4.0,
+                              5.0])
+        self.assertEqual(waypoints.reduce_waypoints(times, positions, 1e-9),
+                         [0, 2, 6, 9])
+        # Standing still throughout keeps the endpoints only, also at
+        # zero tolerance
+        self.assertEqual(waypoints.reduce_waypoints(times, np.ones((10, 3)),
+                                                    0.0), [0, 9])
+
+    def test_endpoints(self):
+        for num_points in (1, 2):
+            self.assertEqual(waypoints.reduce_waypoints(
+                np.arange(float(num_points)), np.zeros((num_points, 2)), 1.0),
+                list(range(num_points)))
+        times = np.arange(50.0)
+        positions = self._random.uniform(-0.01, 0.01, (50, 7))
+        self.assertEqual(waypoints.reduce_waypoints(times, positions, 1.0),
+                         [0, 49])
+
+    def test_pinned(self):
+        # Index 0 is the pose before the recording, the first recorded
+        # row lies on the line to the second one in the left arm only
+        times = np.arange(5.0)
+        left = np.array([[0.0], [0.5], [1.0], [1.0], [1.0]])
+        right = np.array([[0.0], [0.2], [1.0], [1.0], [1.0]])
+        self.assertEqual(waypoints.reduce_waypoints(times, left, 0.01),
+                         [0, 2, 4])
+        self.assertEqual(waypoints.reduce_waypoints(times, right, 0.01),
+                         [0, 1, 2, 4])
+        # Pinned, both arms keep the first recorded row
+        for positions in (left, right):
+            kept = waypoints.reduce_waypoints(times, positions, 0.01,
+                                              pinned=[1])
+            self.assertEqual(kept[:2], [0, 1])
+            self.assertTrue(np.all(deviation(times, positions, kept) <=
+                                   0.01))
+
+
+class TestRefineWaypoints(unittest.TestCase):
+    def test_cubic_hermite_within_tolerance(self):
+        # A ramp into a pause, which the linear reduction keeps as its
+        # three corners
+        times = np.linspace(0.0, 2.0, 201)
+        ramp = np.minimum(times, 1.0)
+        positions = np.column_stack((ramp, 0.5 * ramp))
+        tolerance = 0.005
+        kept = waypoints.reduce_waypoints(times, positions, tolerance)
+        self.assertEqual(kept, [0, 100, 200])
+        # Cubic Hermite segments through them overshoot into the pause
+        self.assertTrue(np.any(deviation(times, positions, kept,
+                                         'cubic_hermite') > tolerance))
+        refined = waypoints.refine_waypoints(
+            times, positions, kept, tolerance,
+            lambda kept: waypoints.fitted_positions(
+                'cubic_hermite', times[kept], positions[kept], times))
+        self.assertTrue(set(kept) <= set(refined))
+        self.assertTrue(np.all(deviation(times, positions, refined,
+                                         'cubic_hermite') <= tolerance))
+        self.assertLess(len(refined), len(times) // 4)
+
+    def test_already_within_tolerance(self):
+        times = np.linspace(0.0, 1.0, 11)
+        positions = 2.0 * times
+        kept = waypoints.reduce_waypoints(times, positions, 0.001)
+        self.assertEqual(kept, [0, 10])
+        self.assertEqual(waypoints.refine_waypoints(
+            times, positions, kept, 0.001,
+            lambda kept: waypoints.fitted_positions(
+                'linear', times[kept], positions[kept], times)), kept)
+
+
+class TestFittedPositions(unittest.TestCase):
+    def test_linear(self):
+        times = np.array([0.0, 1.0, 3.0])
+        positions = np.array([[0.0, 1.0], [1.0, 1.0], [-1.0, 3.0]])
+        at = np.linspace(0.0, 3.0, 31)
+        fitted = waypoints.fitted_positions('linear', times, positions, at)
+        for joint in range(2):
+            np.testing.assert_allclose(
+                fitted[:, joint], np.interp(at, times, positions[:, joint]),
+                rtol=0, atol=1e-12)
+
+    def test_cubic_hermite_meets_waypoints(self):
+        times = np.array([0.0, 0.5, 1.5, 2.0])
+        positions = np.array([[0.0], [1.0], [0.0], [2.0]])
+        np.testing.assert_allclose(
+            waypoints.fitted_positions('cubic_hermite', times, positions,
+                                       times),
+            positions, rtol=0, atol=1e-12)
+
+    def test_bezier_refused(self):
+        self.assertRaises(ValueError, waypoints.fitted_positions, 'bezier',
+                          [0.0, 1.0], [[0.0], [1.0]], [0.5])
+
+
+if __name__ == '__main__':
+    unittest.main()